@@ -4,10 +4,33 @@ SEMAPA3 - Application Factory CORRECTED
 Configuração principal da aplicação Flask - CORRIGIDA
 """
 
+import importlib
+import threading
 from flask import Flask
-from core.database import db
+from core.database import db, init_unit_of_work, configure_engine, check_database
+from core.migrations import check_schema
 from core.security import login_manager, csrf
 from core.exceptions import register_error_handlers
+from core.templates import init_templates
+from core.metrics import init_metrics
+from core.cli import semapa_cli
+
+# (módulo, atributo) de cada blueprint, na ordem de registro
+BLUEPRINTS = [
+    # Controllers principais
+    ('controllers.auth_controller', 'auth_bp'),
+    ('controllers.dashboard_controller', 'dashboard_bp'),
+    # Controllers de entidades
+    ('controllers.requerente_controller', 'requerente_bp'),
+    ('controllers.arvore_controller', 'arvore_bp'),
+    ('controllers.especie_controller', 'especie_bp'),
+    ('controllers.requerimento_controller', 'requerimento_bp'),
+    ('controllers.ordem_servico_controller', 'ordem_servico_bp'),
+    ('controllers.vistoria_controller', 'vistoria_bp'),
+    # API Controller
+    ('controllers.api_controller', 'api_bp'),
+]
+_blueprints_lock = threading.Lock()
 
 def create_app(config_class):
     """Factory para criar instância da aplicação Flask - CORRIGIDA"""
@@ -16,6 +39,8 @@ def create_app(config_class):
 
     # Inicializar extensões
     db.init_app(app)
+    with app.app_context():
+        configure_engine(app)  # PRAGMAs do SQLite em cada conexão
     login_manager.init_app(app)
     csrf.init_app(app)
 
@@ -26,56 +51,57 @@ def create_app(config_class):
     # Registrar error handlers
     register_error_handlers(app)
 
-    # Registrar blueprints
-    try:
-        # Controllers principais
-        from controllers.auth_controller import auth_bp
-        from controllers.dashboard_controller import dashboard_bp
-
-        # Controllers de entidades
-        from controllers.requerente_controller import requerente_bp
-        from controllers.arvore_controller import arvore_bp
-        from controllers.especie_controller import especie_bp
-        from controllers.requerimento_controller import requerimento_bp
-        from controllers.ordem_servico_controller import ordem_servico_bp
-        from controllers.vistoria_controller import vistoria_bp
-
-        # API Controller
-        from controllers.api_controller import api_bp
-
-        # Registrar todos os blueprints
-        app.register_blueprint(auth_bp)
-        app.register_blueprint(dashboard_bp)
-        app.register_blueprint(requerente_bp)
-        app.register_blueprint(arvore_bp)
-        app.register_blueprint(especie_bp)
-        app.register_blueprint(requerimento_bp)
-        app.register_blueprint(ordem_servico_bp)
-        app.register_blueprint(vistoria_bp)
-        app.register_blueprint(api_bp)
+    # Uma transação por requisição (os commits dos serviços viram flush)
+    if app.config.get('UNIT_OF_WORK_PER_REQUEST'):
+        init_unit_of_work(app)
 
-        print("✅ Todos os blueprints registrados com sucesso!")
-    except ImportError as e:
-        print(f"❌ Erro ao importar blueprint: {e}")
-        raise
+    # Tempo, consultas e templates por requisição; log de consultas lentas
+    init_metrics(app)
+
+    # Templates: cache de bytecode, medição de render e aquecimento dos
+    # mais usados (antes de qualquer render)
+    init_templates(app)
+
+    # Helper de templates para miniaturas de uploads em static/ (URLs
+    # versionadas, servidas com cache imutável)
+    from utils.images import imagem_variante, cache_versionado
+    app.jinja_env.globals['imagem_variante'] = imagem_variante
+    app.after_request(cache_versionado)
 
-    # Criar tabelas do banco de dados e usuário admin padrão
+    # Cache de fragmentos: {% call cache_fragment('nome', models=[...]) %}
+    from core.cache import cache_fragment
+    app.jinja_env.globals['cache_fragment'] = cache_fragment
+
+    # Comandos de manutenção (flask semapa ...)
+    app.cli.add_command(semapa_cli)
+
+    # Listeners do ORM (índice de busca, contadores do dashboard e cache)
+    # precisam valer também em comandos que não passam pelos controllers
+    import models  # noqa: F401
+    import services.dashboard_service  # noqa: F401
+
+    # Blueprints: com LAZY_BLUEPRINTS os controllers só são importados (e as
+    # rotas compiladas) na primeira requisição; comandos de CLI não pagam isso
+    if app.config.get('LAZY_BLUEPRINTS'):
+        app.wsgi_app = _BlueprintsSobDemanda(app, app.wsgi_app)
+    else:
+        register_blueprints(app)
+
+    # Esquema: só confere a versão; as migrações rodam no deploy
+    # (flask semapa db upgrade), não em cada worker
     with app.app_context():
         try:
-            # Importar todos os models antes de criar as tabelas
-            from models import (
-                User, Especie, Requerente, Arvore,
-                Requerimento, OrdemServico, Vistoria, VistoriaFoto,
-                ordem_servico_requerimento
-            )
-            db.create_all()
-            print("✅ Tabelas do banco criadas com sucesso!")
+            versao = check_schema(app)
+            print(f"✅ Esquema do banco na versão {versao}")
+
+            # Loga as configurações efetivas (journal_mode, pool...)
+            check_database(app)
             
             # CORRIGIDO: Usar AuthService para criar admin padrão
             # create_default_admin()
             
         except Exception as e:
-            print(f"❌ Erro ao criar tabelas: {e}")
+            print(f"❌ Erro ao verificar o banco: {e}")
             raise
 
     return app
@@ -86,4 +112,33 @@ def create_app(config_class):
 #         from services.auth_service import AuthService
 #         AuthService.create_default_admin()
 #     except Exception as e:
-#         print(f"❌ Erro ao criar admin padrão: {e}")
\ No newline at end of file
+#         print(f"❌ Erro ao criar admin padrão: {e}")
+
+
+def register_blueprints(app):
+    """Importa os controllers e registra os blueprints (uma vez por app)"""
+    with _blueprints_lock:
+        if app.extensions.get('blueprints_registrados'):
+            return
+        try:
+            for modulo, nome in BLUEPRINTS:
+                app.register_blueprint(getattr(importlib.import_module(modulo), nome))
+        except ImportError as e:
+            print(f"❌ Erro ao importar blueprint: {e}")
+            raise
+        app.extensions['blueprints_registrados'] = True
+        print("✅ Todos os blueprints registrados com sucesso!")
+
+
+class _BlueprintsSobDemanda:
+    """Middleware WSGI que registra os blueprints antes da primeira requisição
+    (o Flask não aceita novas rotas depois que ela começa)"""
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not self.app.extensions.get('blueprints_registrados'):
+            register_blueprints(self.app)
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Configuração do Gunicorn
+
+    flask semapa db upgrade                  # uma vez por deploy
+    gunicorn -c config/gunicorn.py wsgi:app
+
+Com GUNICORN_PRELOAD=True (padrão) a app é criada e aquecida uma única vez
+no mestre (rotas, ORM, templates) e os workers nascem por fork
+compartilhando essa memória (copy-on-write). Cada worker então ocupa só o
+que ele mesmo altera, o que permite mais workers por nó. Código novo exige
+restart completo (o HUP não recarrega a app no modo preload).
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Recicla workers aos poucos (vazamentos, fragmentação do heap). No modo
+# preload o substituto nasce de novo do mestre, já aquecido.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = os.environ.get('GUNICORN_ERRORLOG', '-')
+
+
+def when_ready(server):
+    """Mestre pronto, antes do primeiro fork: aquece e congela a app"""
+    from config.settings import config
+
+    ambiente = config[os.environ.get('FLASK_CONFIG') or 'default']
+    if server.cfg.workers > 1 and ambiente.CACHE_BACKEND == 'memory':
+        server.log.warning(
+            "SEMAPA3: CACHE_BACKEND 'memory' com %s workers: cada um só vê as próprias "
+            "invalidações (valores antigos por até CACHE_DEFAULT_TTL); use 'redis'",
+            server.cfg.workers
+        )
+
+    if preload_app:
+        from core.preload import warm_up, before_fork
+
+        app = server.app.wsgi()
+        warm_up(app)
+        before_fork(app)
+        server.log.info("SEMAPA3: app pré-carregada no mestre")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from core.preload import after_fork
+
+        after_fork(server.app.wsgi())
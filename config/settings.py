@@ -6,12 +6,42 @@ Centralizando todas as configurações do sistema
 
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
 # === Carregar variáveis do .env (se existir) ===
 BASE_DIR = Path(__file__).resolve().parent.parent
 dotenv_path = BASE_DIR / '.env'
-load_dotenv(dotenv_path)
+if dotenv_path.exists():  # python-dotenv só é importado quando há .env
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path)
+
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS adequadas ao banco da URI"""
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}  # em memória: o Flask-SQLAlchemy usa StaticPool
+        # Cada worker mantém poucas conexões: o SQLite tem um único escritor e
+        # o WAL deixa as leituras concorrerem com ele
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+            'pool_timeout': 30,
+        }
+    if uri.startswith('postgres'):
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': 30,
+            'pool_recycle': 1800,  # antes do timeout de ociosidade de proxies/PgBouncer
+            'pool_pre_ping': True,
+            'connect_args': {
+                'connect_timeout': 10,
+                'application_name': 'semapa3',
+                'options': f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))}",
+            },
+        }
+    return {'pool_pre_ping': True}
+
 
 class Config:
     """Configurações base da aplicação"""
@@ -27,6 +57,28 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"sqlite:///{DATABASE_PATH}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = DEBUG
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Réplica de leitura para métodos @read_only (relatórios, listagens, API).
+    # Local: DATABASE_REPLICA_URL=sqlite:///replica.db + `flask semapa sync-replica`
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)}
+    } if DATABASE_REPLICA_URL else {}
+    # Após uma escrita, as leituras do usuário ficam no primário por este tempo
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+    # PRAGMAs aplicados a cada conexão SQLite (core.database.configure_engine).
+    # WAL + synchronous=NORMAL: leitores não bloqueiam o escritor e o commit não
+    # faz fsync a cada transação (durável no checkpoint; seguro contra corrupção)
+    SQLITE_PRAGMAS = {
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000)),  # ms esperando o lock
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64000)),  # negativo = KiB
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'temp_store': 'MEMORY',
+    }
 
     # Flask-Login
     LOGIN_VIEW = 'auth.login'
@@ -38,6 +90,75 @@ class Config:
     UPLOAD_FOLDER = BASE_DIR / 'uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 
+    # Blob store das fotos de vistoria ('local' ou 's3', ex.: MinIO local)
+    BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE_BACKEND', 'local')
+    BLOB_STORE_PATH = Path(os.environ.get('BLOB_STORE_PATH') or BASE_DIR / 'blobs')
+    BLOB_STORE_S3_BUCKET = os.environ.get('BLOB_STORE_S3_BUCKET', 'semapa3')
+    BLOB_STORE_S3_ENDPOINT = os.environ.get('BLOB_STORE_S3_ENDPOINT')  # ex.: http://localhost:9000
+    BLOB_STORE_S3_ACCESS_KEY = os.environ.get('BLOB_STORE_S3_ACCESS_KEY')
+    BLOB_STORE_S3_SECRET_KEY = os.environ.get('BLOB_STORE_S3_SECRET_KEY')
+    BLOB_STORE_S3_REGION = os.environ.get('BLOB_STORE_S3_REGION')
+    # Atrás do nginx: location interna (internal;) apontando para BLOB_STORE_PATH
+    BLOB_ACCEL_REDIRECT_PREFIX = os.environ.get('BLOB_ACCEL_REDIRECT_PREFIX')  # ex.: /_blobs/
+    # Apache/lighttpd com mod_xsendfile
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'
+
+    # Miniaturas e variantes das fotos (geradas em segundo plano)
+    IMAGE_VARIANTS_PATH = Path(os.environ.get('IMAGE_VARIANTS_PATH') or BASE_DIR / 'variantes')
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600  # variantes são imutáveis (derivadas do hash)
+
+    # Mapa: tiles de clusters de árvores (z/x/y)
+    TILE_GRID = int(os.environ.get('TILE_GRID', 64))  # células por lado do tile
+    TILE_MAX_ZOOM = 22
+    TILE_CACHE_SIZE = int(os.environ.get('TILE_CACHE_SIZE', 2048))
+    TILE_CACHE_TTL = int(os.environ.get('TILE_CACHE_TTL', 300))  # segundos
+
+    # Cache de serviços e fragmentos: 'memory' (por processo) ou 'redis'
+    # (compartilhado, requer o pacote redis). Em memória com vários workers
+    # cada um só vê as próprias invalidações até o CACHE_DEFAULT_TTL
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'semapa:')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))  # segundos
+    CACHE_MAX_ITEMS = int(os.environ.get('CACHE_MAX_ITEMS', 1024))  # só no backend 'memory'
+    CACHE_METRICS_FLUSH = int(os.environ.get('CACHE_METRICS_FLUSH', 10))  # segundos, só no 'redis'
+
+    # Banco: uma transação por requisição em vez de um commit por save()/serviço
+    UNIT_OF_WORK_PER_REQUEST = os.environ.get('UNIT_OF_WORK_PER_REQUEST', 'True').lower() == 'true'
+
+    # Esquema versionado (flask semapa db upgrade). Na inicialização só a
+    # versão é conferida: 'error' responde 503 até a migração rodar, 'warn'
+    # só loga e 'upgrade' aplica as pendentes (padrão em desenvolvimento)
+    DB_SCHEMA_CHECK = os.environ.get('DB_SCHEMA_CHECK', 'error')
+
+    # Importa controllers e registra as rotas só na primeira requisição
+    # (inicialização e comandos de CLI mais rápidos)
+    LAZY_BLUEPRINTS = os.environ.get('LAZY_BLUEPRINTS', 'True').lower() == 'true'
+    # Orçamento de `flask semapa startup-benchmark` (mediana de create_app a frio)
+    STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
+    # Templates: bytecode compilado em disco, compartilhado pelos workers
+    # (preenchido por `flask semapa compile-templates`; vazio desliga)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', str(BASE_DIR / 'cache' / 'jinja'))
+    # Carregados já em create_app: os que toda página usa
+    TEMPLATE_WARMUP = [
+        'shared/base.html', 'shared/macros.html', 'shared/navbar.html',
+        'shared/sidebar.html', 'shared/alert.html', 'base.html', 'dashboard/index.html',
+    ]
+    # Tempo de render por template, bloco e macro (GET /api/templates/stats)
+    TEMPLATE_TIMING = os.environ.get('TEMPLATE_TIMING', 'False').lower() == 'true'
+
+    # Instrumentação por requisição (tempo, consultas, linhas, templates;
+    # GET /api/requests/stats) e logs de consultas/requisições lentas (0 desliga)
+    REQUEST_METRICS = os.environ.get('REQUEST_METRICS', 'True').lower() == 'true'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+    # Cabeçalho Server-Timing nas respostas (expõe tempos internos: só em debug)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() == 'true'
+    # Tamanho de cada arquivo de logs/semapa3.log antes de rotacionar
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+
     # Paginação
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 10))
 
@@ -64,6 +185,9 @@ class DevelopmentConfig(Config):
     """Configurações de desenvolvimento"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    DB_SCHEMA_CHECK = os.environ.get('DB_SCHEMA_CHECK', 'upgrade')
+    TEMPLATE_TIMING = os.environ.get('TEMPLATE_TIMING', 'True').lower() == 'true'
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'True').lower() == 'true'
 
 class ProductionConfig(Config):
     """Configurações de produção"""
@@ -81,7 +205,8 @@ class ProductionConfig(Config):
             logs_dir = Config.BASE_DIR / 'logs'
             if not logs_dir.exists():
                 logs_dir.mkdir(parents=True, exist_ok=True)
-            file_handler = RotatingFileHandler(logs_dir / 'semapa3.log', maxBytes=10240, backupCount=10)
+            file_handler = RotatingFileHandler(logs_dir / 'semapa3.log', maxBytes=app.config.get('LOG_MAX_BYTES', 10240),
+                                               backupCount=10)
             file_handler.setFormatter(logging.Formatter(
                 '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
             ))
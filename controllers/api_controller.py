@@ -1,17 +1,177 @@
-from flask import Blueprint, jsonify, request, abort
+from flask import Blueprint, jsonify, request, abort, Response, stream_with_context, current_app
+from flask_login import login_required, current_user
 from services.arvore_service import ArvoreService
 from services.especie_service import EspecieService
 from services.requerente_service import RequerenteService
 from services.ordem_servico_service import OrdemServicoService
 from services.vistoria_service import VistoriaService
+from services.requerimento_service import RequerimentoService
+from services.busca_service import BuscaService
+from services.lookup_service import LookupService
+from core.cache import get_cache
+from core.exceptions import ValidationError, NotFoundError
+from core.security import require_role
+from core.templates import get_template_timer
+from core.metrics import get_request_stats
+from models import load_counts
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-# Exemplo: Listar árvores (GET /api/arvores)
+MAX_PER_PAGE = 200
+
+# Listagens paginadas por cursor: ?cursor=<token>&per_page=N
+# Resposta: {"items": [...], "next": <token|null>, "prev": <token|null>}
+def _listar(buscar_pagina, **filtros):
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+    try:
+        pagina = buscar_pagina(cursor=request.args.get('cursor'), per_page=per_page, **filtros)
+    except ValidationError as e:
+        return jsonify({'error': e.message}), 400
+    load_counts(pagina.items)  # totais do to_dict() num GROUP BY por contador
+    return jsonify(pagina.to_dict())
+
+# Busca por prefixo para os campos de seleção remota dos formulários
+# GET /api/lookup/<requerentes|arvores|especies|tecnicos>?q=<texto>&limit=N
+@api_bp.route('/lookup/<entidade>', methods=['GET'])
+@login_required
+def lookup(entidade):
+    itens = LookupService.search(entidade, request.args.get('q'), request.args.get('limit', type=int))
+    if itens is None:
+        abort(404)
+    return jsonify({'items': itens})
+
+# Métricas do cache: de todos os workers no Redis, deste worker em memória
+@api_bp.route('/cache/stats', methods=['GET'])
+@login_required
+@require_role(3)
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+# Tempo médio, consultas, linhas e templates por endpoint neste worker
+# (GET /api/requests/stats); ?reset=1 zera depois de responder
+@api_bp.route('/requests/stats', methods=['GET'])
+@login_required
+@require_role(3)
+def request_stats():
+    stats = get_request_stats(current_app)
+    if stats is None:
+        return jsonify({'error': 'Medição de requisições desligada (REQUEST_METRICS)'}), 404
+    itens = stats.stats()
+    if request.args.get('reset', type=int):
+        stats.reset()
+    return jsonify({'items': itens})
+
+# Tempo de render por template, bloco e macro deste worker (GET /api/templates/stats)
+# Só com TEMPLATE_TIMING; ?reset=1 zera depois de responder
+@api_bp.route('/templates/stats', methods=['GET'])
+@login_required
+@require_role(3)
+def template_stats():
+    timer = get_template_timer(current_app)
+    if timer is None:
+        return jsonify({'error': 'Medição de templates desligada (TEMPLATE_TIMING)'}), 404
+    stats = timer.stats()
+    if request.args.get('reset', type=int):
+        timer.reset()
+    return jsonify({'items': stats})
+
+# Listar árvores (GET /api/arvores)
 @api_bp.route('/arvores', methods=['GET'])
 def get_arvores():
-    arvores = ArvoreService.list_all()
-    return jsonify([arvore.to_dict() for arvore in arvores])
+    return _listar(ArvoreService.get_cursor_page)
+
+# Importação em lote (POST /api/arvores/import, multipart: arquivo, dry_run=1)
+# Arquivos grandes (censos inteiros): prefira `flask semapa import-arvores`
+@api_bp.route('/arvores/import', methods=['POST'])
+@login_required
+@require_role(2)
+def import_arvores():
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'error': 'Envie o arquivo no campo "arquivo"'}), 400
+    nome = arquivo.filename.lower()
+    formato = request.form.get('formato') or ('csv' if nome.endswith('.csv') else 'geojson')
+    if formato not in ArvoreService.IMPORT_FORMATOS:
+        return jsonify({'error': f'Formato não suportado: {formato}'}), 400
+    try:
+        relatorio = ArvoreService.import_records(
+            ArvoreService.iter_import_records(arquivo.stream, formato),
+            criado_por=current_user.id,
+            dry_run=request.form.get('dry_run') in ('1', 'true')
+        )
+    except ValidationError as e:
+        return jsonify({'error': e.message}), 400
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Arquivo inválido: {e}'}), 400
+    return jsonify(relatorio)
+
+# Árvores dentro do viewport do mapa (GET /api/arvores/bbox?min_lat=&min_lng=&max_lat=&max_lng=)
+@api_bp.route('/arvores/bbox', methods=['GET'])
+@login_required
+def get_arvores_bbox():
+    campos = ['min_lat', 'min_lng', 'max_lat', 'max_lng']
+    valores = [request.args.get(campo, type=float) for campo in campos]
+    if any(valor is None for valor in valores):
+        return jsonify({'error': 'Parâmetros obrigatórios: ' + ', '.join(campos)}), 400
+
+    limit = min(request.args.get('limit', 2000, type=int), 10000)
+    try:
+        arvores = ArvoreService.get_in_bbox(*valores, limit=limit)
+    except ValidationError as e:
+        return jsonify({'error': e.message}), 400
+    return jsonify([arvore.to_kml_dict() for arvore in arvores])
+
+# Árvores num raio em metros (GET /api/arvores/raio?lat=&lng=&metros=)
+@api_bp.route('/arvores/raio', methods=['GET'])
+@login_required
+def get_arvores_raio():
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    metros = request.args.get('metros', type=float)
+    if lat is None or lng is None or metros is None:
+        return jsonify({'error': 'Parâmetros obrigatórios: lat, lng, metros'}), 400
+
+    limit = min(request.args.get('limit', 500, type=int), 10000)
+    try:
+        resultado = ArvoreService.get_within_radius(lat, lng, metros, limit=limit)
+    except ValidationError as e:
+        return jsonify({'error': e.message}), 400
+    return jsonify([
+        dict(arvore.to_kml_dict(), distancia=round(distancia, 1))
+        for arvore, distancia in resultado
+    ])
+
+# Clusters de árvores por tile XYZ (GET /api/arvores/tiles/<z>/<x>/<y>.json)
+@api_bp.route('/arvores/tiles/<int:z>/<int:x>/<int:y>.json', methods=['GET'])
+@login_required
+def get_arvores_tile(z, x, y):
+    try:
+        tile = ArvoreService.get_tile(z, x, y)
+    except NotFoundError:
+        abort(404)
+    response = jsonify(tile)
+    # Exige login: cache só no navegador, nunca em proxies compartilhados
+    response.cache_control.private = True
+    response.cache_control.max_age = 60
+    return response
+
+# Exportação do inventário em streaming (GET /api/arvores/export.kml|.geojson|.csv)
+EXPORT_FORMATOS = {
+    'kml': (ArvoreService.stream_kml, 'application/vnd.google-earth.kml+xml'),
+    'geojson': (ArvoreService.stream_geojson, 'application/geo+json'),
+    'csv': (ArvoreService.stream_csv, 'text/csv'),
+}
+
+@api_bp.route('/arvores/export.<formato>', methods=['GET'])
+@login_required
+@require_role(2)
+def export_arvores(formato):
+    if formato not in EXPORT_FORMATOS:
+        abort(404)
+    gerador, mimetype = EXPORT_FORMATOS[formato]
+    response = Response(stream_with_context(gerador()), mimetype=f'{mimetype}; charset=utf-8')
+    response.headers['Content-Disposition'] = f'attachment; filename=arvores.{formato}'
+    return response
 
 # Exemplo: Detalhes de uma árvore
 @api_bp.route('/arvores/<int:arvore_id>', methods=['GET'])
@@ -21,29 +181,42 @@ def get_arvore(arvore_id):
         abort(404)
     return jsonify(arvore.to_dict())
 
-# Exemplo: Listar espécies
+# Listar espécies
 @api_bp.route('/especies', methods=['GET'])
 def get_especies():
-    especies = EspecieService.list_all()
-    return jsonify([esp.to_dict() for esp in especies])
+    return _listar(EspecieService.get_cursor_page)
 
 # Listar requerentes
 @api_bp.route('/requerentes', methods=['GET'])
 def get_requerentes():
-    requerentes = RequerenteService.list_all()
-    return jsonify([req.to_dict() for req in requerentes])
+    return _listar(RequerenteService.get_cursor_page)
+
+# Listar requerimentos (GET /api/requerimentos?status=)
+@api_bp.route('/requerimentos', methods=['GET'])
+@login_required
+@require_role(1)
+def get_requerimentos():
+    return _listar(RequerimentoService.get_paginated, status=request.args.get('status'), profile=None)
 
 # Listar ordens de serviço
 @api_bp.route('/ordens', methods=['GET'])
 def get_ordens():
-    ordens = OrdemServicoService.list_all()
-    return jsonify([o.to_dict() for o in ordens])
+    return _listar(OrdemServicoService.get_paginated, status=request.args.get('status'), profile=None)
 
 # Listar vistorias
 @api_bp.route('/vistorias', methods=['GET'])
 def get_vistorias():
-    vistorias = VistoriaService.list_all()
-    return jsonify([v.to_dict() for v in vistorias])
+    return _listar(VistoriaService.get_paginated, status=request.args.get('status'), profile=None)
+
+# Busca unificada (GET /api/search?q=&limit=&entidades=requerimento,arvore)
+@api_bp.route('/search', methods=['GET'])
+@login_required
+@require_role(1)
+def search():
+    q = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_PER_PAGE)
+    entidades = [e for e in request.args.get('entidades', '').split(',') if e] or None
+    return jsonify({'q': q, 'items': BuscaService.search(q, limit=limit, entidades=entidades)})
 
 # Exemplo de POST para criar requerente (expandir conforme necessário)
 @api_bp.route('/requerentes', methods=['POST'])
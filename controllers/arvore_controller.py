@@ -38,7 +38,7 @@ def index():
 
         # Dados para filtros
         especies = EspecieService.get_all()
-        requerentes = RequerenteService.get_all()
+        requerentes = RequerenteService.get_options()
 
         return render_template('arvores/index.html', 
                              arvores=arvores, 
@@ -56,13 +56,7 @@ def index():
 def nova():
     """Formulário para nova árvore"""
     try:
-        especies = EspecieService.get_all()
-        requerentes = RequerenteService.get_all()
-
-        return render_template('arvores/form.html', 
-                             arvore=None, 
-                             especies=especies,
-                             requerentes=requerentes)
+        return render_template('arvores/form.html', arvore=None)
 
     except Exception as e:
         current_app.logger.error(f"Erro ao carregar formulário: {str(e)}")
@@ -151,13 +145,7 @@ def editar(id):
             flash('Árvore não encontrada', 'error')
             return redirect(url_for('arvore.index'))
 
-        especies = EspecieService.get_all()
-        requerentes = RequerenteService.get_all()
-
-        return render_template('arvores/form.html', 
-                             arvore=arvore, 
-                             especies=especies,
-                             requerentes=requerentes)
+        return render_template('arvores/form.html', arvore=arvore)
 
     except Exception as e:
         current_app.logger.error(f"Erro ao carregar formulário de edição: {str(e)}")
@@ -258,7 +246,7 @@ def api_buscar():
         if len(term) < 2:
             return jsonify([])
 
-        arvores = ArvoreService.search(term, limit)
+        arvores, _ = ArvoreService.search(term, page=1, per_page=limit)
 
         return jsonify([{
             'id': a.id,
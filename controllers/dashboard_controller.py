@@ -6,9 +6,8 @@ Controller principal do dashboard
 
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
-from services.requerimento_service import RequerimentoService
-from services.arvore_service import ArvoreService
-from models import User, Requerente, Arvore, Especie, Requerimento, OrdemServico, Vistoria
+from services.dashboard_service import DashboardService
+from models import Requerimento, OrdemServico
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -16,30 +15,8 @@ dashboard_bp = Blueprint('dashboard', __name__)
 @login_required
 def index():
     """Dashboard principal"""
-    # Estatísticas gerais
-    stats = {
-        'total_usuarios': User.query.count(),
-        'total_requerentes': Requerente.query.count(),
-        'total_arvores': Arvore.query.count(),
-        'total_especies': Especie.query.count(),
-    }
-
-    # Estatísticas de requerimentos
-    total_requerimentos = Requerimento.query.count()
-    pendentes = Requerimento.query.filter(
-        Requerimento.status.in_(["Aberto", "Pendente"])
-    ).count()
-    concluidos = Requerimento.query.filter_by(status="Concluído").count()
-    negados = Requerimento.query.filter_by(status="Negado").count()
-
-    req_stats = {
-        "total": total_requerimentos,
-        "pendentes": pendentes,
-        "concluídos": concluidos,
-        "negados": negados,
-    }
-
-    req_stats = RequerimentoService.get_statistics()
+    # Estatísticas gerais e de requerimentos (tabela dashboard_stats)
+    stats, req_stats = DashboardService.get_stats()
 
     # Últimos requerimentos
     ultimos_requerimentos = Requerimento.query.order_by(
@@ -64,9 +41,8 @@ def index():
 @dashboard_bp.route('/map')
 @login_required
 def map_view():
-    """Visualização em mapa"""
-    arvores = ArvoreService.get_with_coordinates()
-    return render_template('dashboard/map.html', arvores=arvores)
+    """Visualização em mapa (árvores carregadas via /api/arvores/bbox)"""
+    return render_template('dashboard/map.html')
 
 @dashboard_bp.route('/reports')
 @login_required
@@ -15,7 +15,7 @@ ordem_servico_bp = Blueprint('ordem_servico', __name__, url_prefix='/ordens-serv
 def index():
     """Lista todas as ordens de serviço"""
     try:
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor')
         per_page = current_app.config.get('ITEMS_PER_PAGE', 20)
 
         # Filtros
@@ -28,7 +28,7 @@ def index():
 
         # Buscar ordens de serviço
         ordens = OrdemServicoService.get_paginated(
-            page=page,
+            cursor=cursor,
             per_page=per_page,
             status=status,
             prioridade=prioridade,
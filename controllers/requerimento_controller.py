@@ -1,10 +1,10 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime
+from core.database import CursorPage
+from core.exceptions import ValidationError
 from core.security import require_role
 from services.requerimento_service import RequerimentoService
-from services.requerente_service import RequerenteService
-from services.arvore_service import ArvoreService
 from services.ordem_servico_service import OrdemServicoService
 from utils.validators import validate_required_fields
 from utils.helpers import allowed_file, save_uploaded_file
@@ -16,7 +16,7 @@ requerimento_bp = Blueprint('requerimento', __name__, url_prefix='/requerimentos
 @require_role(1)
 def index():
     try:
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor')
         per_page = current_app.config.get('ITEMS_PER_PAGE', 20)
 
         status = request.args.get('status')
@@ -26,8 +26,8 @@ def index():
         data_fim = request.args.get('data_fim')
         search = request.args.get('search', '').strip()
 
-        pagination = RequerimentoService.get_paginated(
-            page=page,
+        pagina = RequerimentoService.get_paginated(
+            cursor=cursor,
             per_page=per_page,
             status=status,
             tipo=tipo,
@@ -37,22 +37,14 @@ def index():
             search=search
         )
 
-        requerimentos = pagination.items
-        total = pagination.total
-        total_pages = pagination.pages
-
-        requerentes = RequerenteService.get_all(page=1, per_page=1000)[0]  # pegar todos para filtro
         tipos = RequerimentoService.get_tipos()
         status_list = RequerimentoService.get_status_list()
 
         return render_template('requerimentos/list.html',
-                               requerimentos=requerimentos,
-                               requerentes=requerentes,
+                               requerimentos=pagina.items,
+                               pagina=pagina,
                                tipos=tipos,
                                status_list=status_list,
-                               page=page,
-                               total_pages=total_pages,
-                               total=total,
                                search=search,
                                status=status,
                                tipo=tipo,
@@ -60,24 +52,26 @@ def index():
                                data_inicio=data_inicio,
                                data_fim=data_fim)
 
+    except ValidationError as e:
+        # Cursor adulterado ou de uma versão antiga: volta à primeira página
+        flash(e.message, 'warning')
+        filtros = {chave: valor for chave, valor in request.args.items() if chave != 'cursor'}
+        return redirect(url_for('requerimento.index', **filtros))
     except Exception as e:
         current_app.logger.error(f"Erro ao listar requerimentos: {str(e)}")
         flash('Erro ao carregar lista de requerimentos', 'error')
-        return render_template('requerimentos/list.html', requerimentos=[], requerentes=[], tipos=[], status_list=[])
+        return render_template('requerimentos/list.html', requerimentos=[], pagina=CursorPage([]),
+                               tipos=[], status_list=[])
 
 @requerimento_bp.route('/novo')
 @login_required
 @require_role(1)
 def novo():
     try:
-        requerentes = RequerenteService.get_all(page=1, per_page=1000)[0]
-        arvores = ArvoreService.get_all()
         tipos = RequerimentoService.get_tipos()
 
         return render_template('requerimentos/form.html',
                                requerimento=None,
-                               requerentes=requerentes,
-                               arvores=arvores,
                                tipos=tipos)
 
     except Exception as e:
@@ -127,7 +121,7 @@ def criar():
 @require_role(1)
 def detalhes(id):
     try:
-        requerimento = RequerimentoService.get_by_id(id)
+        requerimento = RequerimentoService.get_by_id(id, profile='detail')
         if not requerimento:
             flash('Requerimento não encontrado', 'error')
             return redirect(url_for('requerimento.index'))
@@ -159,14 +153,10 @@ def editar(id):
             flash('Requerimento não pode ser editado no status atual', 'error')
             return redirect(url_for('requerimento.detalhes', id=id))
 
-        requerentes = RequerenteService.get_all(page=1, per_page=1000)[0]
-        arvores = ArvoreService.get_all()
         tipos = RequerimentoService.get_tipos()
 
         return render_template('requerimentos/form.html',
                                requerimento=requerimento,
-                               requerentes=requerentes,
-                               arvores=arvores,
                                tipos=tipos)
 
     except Exception as e:
@@ -1,14 +1,16 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, abort, send_file
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from core.security import require_role
 from services.vistoria_service import VistoriaService
 from services.ordem_servico_service import OrdemServicoService
-from services.arvore_service import ArvoreService
 from services.user_service import UserService
 from utils.validators import validate_required_fields
-from utils.helpers import allowed_file, save_uploaded_file
+from utils.images import VARIANTES, FORMATOS, caminho_variante_blob, gerar_variantes_blob
+from models.vistoria_model import Vistoria
+from models.vistoria_foto_model import VistoriaFoto
+from core.storage import get_blob_store, send_blob, send_stream
 
 vistoria_bp = Blueprint('vistoria', __name__, url_prefix='/vistorias')
 
@@ -18,7 +20,7 @@ vistoria_bp = Blueprint('vistoria', __name__, url_prefix='/vistorias')
 def index():
     """Lista todas as vistorias"""
     try:
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor')
         per_page = current_app.config.get('ITEMS_PER_PAGE', 20)
 
         # Filtros
@@ -31,7 +33,7 @@ def index():
 
         # Buscar vistorias
         vistorias = VistoriaService.get_paginated(
-            page=page,
+            cursor=cursor,
             per_page=per_page,
             status=status,
             tipo=tipo,
@@ -77,8 +79,7 @@ def nova():
             else:
                 ordens_servico = OrdemServicoService.get_in_progress()
 
-        # Buscar árvores e técnicos
-        arvores = ArvoreService.get_all()
+        # Buscar técnicos
         tecnicos = UserService.get_technicians()
         tipos_vistoria = VistoriaService.get_tipos()
 
@@ -86,7 +87,6 @@ def nova():
                              vistoria=None,
                              tipo=tipo,
                              ordens_servico=ordens_servico,
-                             arvores=arvores,
                              tecnicos=tecnicos,
                              tipos_vistoria=tipos_vistoria)
 
@@ -119,8 +119,8 @@ def criar():
             'created_by': current_user.id
         }
 
-        # Criar vistoria
-        vistoria = VistoriaService.create(data)
+        # Criar vistoria (fotos do formulário vão para o blob store)
+        vistoria = VistoriaService.create(data, request.files.getlist('fotos'))
 
         flash('Vistoria criada com sucesso!', 'success')
         return redirect(url_for('vistoria.detalhes', id=vistoria.id))
@@ -168,7 +168,6 @@ def editar(id):
             return redirect(url_for('vistoria.detalhes', id=id))
 
         # Dados para o formulário
-        arvores = ArvoreService.get_all()
         tecnicos = UserService.get_technicians()
         tipos_vistoria = VistoriaService.get_tipos()
 
@@ -176,7 +175,6 @@ def editar(id):
                              vistoria=vistoria,
                              tipo='editar',
                              ordens_servico=[],
-                             arvores=arvores,
                              tecnicos=tecnicos,
                              tipos_vistoria=tipos_vistoria)
 
@@ -243,20 +241,12 @@ def executar(id):
             'updated_by': current_user.id
         }
 
-        # Processar upload de fotos
-        fotos = request.files.getlist('fotos')
-        fotos_paths = []
-        for foto in fotos:
-            if foto and foto.filename and allowed_file(foto.filename):
-                foto_path = save_uploaded_file(foto, 'vistorias')
-                fotos_paths.append(foto_path)
-
-        if fotos_paths:
-            data['fotos'] = fotos_paths
-
         # Atualizar vistoria
         VistoriaService.execute(id, data)
 
+        # Fotos vão para o blob store (vistoria_foto), com variantes em segundo plano
+        VistoriaService.add_fotos(id, request.files.getlist('fotos'))
+
         flash('Vistoria realizada com sucesso!', 'success')
         return redirect(url_for('vistoria.detalhes', id=id))
 
@@ -268,6 +258,19 @@ def executar(id):
         flash('Erro ao executar vistoria', 'error')
         return redirect(url_for('vistoria.realizar', id=id))
 
+@vistoria_bp.route('/<int:id>/fotos', methods=['POST'])
+@login_required
+@require_role(2)
+def adicionar_fotos(id):
+    """Envia fotos para uma vistoria (blob store, campo multipart 'fotos')"""
+    Vistoria.get_or_404(id)
+    fotos = VistoriaService.add_fotos(id, request.files.getlist('fotos'))
+    if fotos:
+        flash(f'{len(fotos)} foto(s) enviada(s)', 'success')
+    else:
+        flash('Nenhuma foto válida enviada (png, jpg, gif ou webp)', 'error')
+    return redirect(url_for('vistoria.detalhes', id=id))
+
 @vistoria_bp.route('/<int:id>/iniciar', methods=['POST'])
 @login_required
 @require_role(2)
@@ -453,4 +456,60 @@ def api_agenda(date):
         return jsonify({'error': 'Data inválida'}), 400
     except Exception as e:
         current_app.logger.error(f"Erro ao carregar agenda: {str(e)}")
-        return jsonify({'error': 'Erro interno'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Erro interno'}), 500
+
+@vistoria_bp.route('/fotos/<int:foto_id>')
+@login_required
+@require_role(1)
+def foto(foto_id):
+    """Serve a foto original em streaming (Range, ETag/304, X-Accel-Redirect/X-Sendfile)"""
+    foto = VistoriaFoto.get_or_404(foto_id)
+    mimetype = foto.mime_type or 'application/octet-stream'
+
+    if foto.no_blob_store:
+        return send_blob(foto.sha256, mimetype, foto.tamanho, download_name=foto.arquivo_nome)
+
+    # Foto legada ainda gravada no banco (até rodar `flask semapa migrate-fotos`)
+    return send_stream(
+        lambda inicio: _abrir_legado(foto, inicio), foto.tamanho_arquivo, mimetype,
+        download_name=foto.arquivo_nome
+    )
+
+def _abrir_legado(foto, inicio):
+    arquivo = foto.open()
+    arquivo.seek(inicio)
+    return arquivo
+
+@vistoria_bp.route('/fotos/<int:foto_id>/<variante>')
+@login_required
+@require_role(1)
+def foto_variante(foto_id, variante):
+    """Serve miniatura/variante de uma foto (WebP quando aceito, senão JPEG)"""
+    if variante not in VARIANTES:
+        abort(404)
+
+    foto = VistoriaFoto.get_or_404(foto_id)
+    if not foto.no_blob_store:
+        abort(404)  # foto legada ainda no banco: rodar `flask semapa migrate-fotos`
+
+    formato = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+    raiz = current_app.config['IMAGE_VARIANTS_PATH']
+    caminho = caminho_variante_blob(raiz, foto.sha256, variante, formato)
+    if not caminho.exists():
+        # O worker ainda não terminou (ou a variante foi limpa): gera agora
+        if not gerar_variantes_blob(get_blob_store(), raiz, foto.sha256):
+            abort(404)
+
+    response = send_file(
+        caminho,
+        mimetype=FORMATOS[formato][1],
+        conditional=True,
+        etag=f'{foto.sha256}-{variante}-{formato}',
+        max_age=current_app.config.get('IMAGE_CACHE_MAX_AGE', 31536000)
+    )
+    # Exige login: cache só no navegador, nunca em proxies compartilhados
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
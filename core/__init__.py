@@ -4,7 +4,11 @@ SEMAPA3 - Core Package
 Núcleo da aplicação com funcionalidades essenciais
 """
 
-from .database import db, BaseModel
+from .database import (
+    db, BaseModel, paginate_query, count_query, paginate_cursor, CursorPage,
+    apply_profile, count_queries, assert_max_queries, unit_of_work, suspend_unit_of_work, in_unit_of_work,
+    read_only
+)
 from .security import login_manager, csrf, require_role, SecurityMixin
 from .exceptions import (
     SemapaException, 
@@ -18,6 +22,17 @@ from .exceptions import (
 __all__ = [
     'db',
     'BaseModel',
+    'paginate_query',
+    'count_query',
+    'paginate_cursor',
+    'CursorPage',
+    'apply_profile',
+    'count_queries',
+    'assert_max_queries',
+    'unit_of_work',
+    'suspend_unit_of_work',
+    'in_unit_of_work',
+    'read_only',
     'login_manager',  
     'csrf',
     'require_role',
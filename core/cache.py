@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Cache
+Cache de resultados de serviços e de fragmentos de template, com backend em
+memória (LRU + TTL) ou Redis, e invalidação automática por tabela: quando um
+modelo é inserido, alterado ou removido, tudo o que depende da tabela dele
+deixa de valer após o commit.
+
+Os valores são serializados em JSON nos dois backends; guarde dicionários,
+listas e textos, não objetos do ORM.
+
+O backend em memória (padrão) é de cada processo: com vários workers, uma
+invalidação só vale no worker que fez o commit e os demais servem o valor
+antigo por até CACHE_DEFAULT_TTL (ou o ttl do método). O gunicorn avisa na
+subida; com CACHE_BACKEND=redis as invalidações e as métricas valem para
+todos. Falhas do Redis não derrubam a requisição: leitura vira erro de
+cache (recalcula) e a invalidação após o commit só é registrada no log.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+from core.database import after_commit, defer_after_commit
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """LRU em processo com expiração por item"""
+    compartilhado = False
+
+    def __init__(self, max_items=1024):
+        self.max_items = max_items
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, chaves):
+        agora = time.time()
+        valores = []
+        with self._lock:
+            for chave in chaves:
+                item = self._itens.get(chave)
+                if item is None or (item[0] is not None and item[0] <= agora):
+                    self._itens.pop(chave, None)
+                    valores.append(None)
+                else:
+                    self._itens.move_to_end(chave)
+                    valores.append(item[1])
+        return valores
+
+    def get(self, chave):
+        return self.get_many([chave])[0]
+
+    def set(self, chave, valor, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        with self._lock:
+            self._itens[chave] = (expira, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_items:
+                self._itens.popitem(last=False)
+
+    def add(self, chave, valor):
+        """Grava só se a chave não existir; retorna o valor em vigor"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self._itens[chave] = (None, valor)
+                return valor
+            return item[1]
+
+    def incr(self, chave):
+        with self._lock:
+            expira, valor = self._itens.get(chave, (None, 0))
+            self._itens[chave] = (expira, int(valor) + 1)
+            return int(valor) + 1
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class RedisBackend:
+    """Redis (ou compatível, ex.: Valkey/KeyDB) compartilhado entre os workers"""
+    compartilhado = True
+
+    def __init__(self, url, prefix='semapa:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND 'redis' requer o pacote redis instalado") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _k(self, chave):
+        return self.prefix + chave
+
+    def get_many(self, chaves):
+        valores = self.client.mget([self._k(c) for c in chaves])
+        return [v.decode() if isinstance(v, bytes) else v for v in valores]
+
+    def get(self, chave):
+        return self.get_many([chave])[0]
+
+    def set(self, chave, valor, ttl=None):
+        self.client.set(self._k(chave), valor, ex=ttl or None)
+
+    def add(self, chave, valor):
+        if self.client.set(self._k(chave), valor, nx=True):
+            return valor
+        return self.get(chave)
+
+    def incr(self, chave):
+        return self.client.incr(self._k(chave))
+
+    def incr_many(self, quantidades):
+        """Soma {chave: n} numa única ida ao Redis"""
+        pipe = self.client.pipeline(transaction=False)
+        for chave, n in quantidades.items():
+            pipe.incrby(self._k(chave), n)
+        pipe.execute()
+
+    def delete(self, chave):
+        self.client.delete(self._k(chave))
+
+    def clear(self):
+        for chave in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(chave)
+
+    def scan(self, padrao):
+        """{chave: valor} das chaves que casam com `padrao` (glob, sem o prefixo)"""
+        chaves = list(self.client.scan_iter(self._k(padrao)))
+        valores = self.client.mget(chaves) if chaves else []
+        return {
+            chave.decode()[len(self.prefix):]: valor.decode()
+            for chave, valor in zip(chaves, valores) if valor is not None
+        }
+
+
+class Cache:
+    """Fachada sobre o backend: chaves versionadas por tabela e métricas"""
+
+    def __init__(self, backend, default_ttl=300, metrics_flush=10):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.metrics_flush = metrics_flush
+        self._metricas = {}
+        self._pendentes = {}
+        self._enviado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    # --- Versões por tabela ---
+    # Invalidar = incrementar a versão da tabela; as chaves antigas ficam
+    # órfãs e saem por TTL/LRU. Uma versão perdida recomeça do relógio em
+    # ms, sempre acima de qualquer valor anterior.
+
+    def _versoes(self, tabelas):
+        if not tabelas:
+            return []
+        chaves = [f'versao:{t}' for t in tabelas]
+        versoes = self.backend.get_many(chaves)
+        for i, versao in enumerate(versoes):
+            if versao is None:
+                versoes[i] = self.backend.add(chaves[i], int(time.time() * 1000))
+        return [str(v) for v in versoes]
+
+    def version(self, tabela):
+        """Versão atual da tabela, a mesma em todos os workers com Redis:
+        chave para caches próprios que dependem dela (ex.: tiles do mapa)"""
+        return self._versoes([tabela])[0]
+
+    def invalidate(self, *tabelas):
+        """Invalida tudo o que foi cacheado dependendo destas tabelas"""
+        for tabela in tabelas:
+            chave = f'versao:{tabela}'
+            if self.backend.get(chave) is None:
+                self.backend.add(chave, int(time.time() * 1000))
+            self.backend.incr(chave)
+
+    def _chave(self, nome, partes, tabelas):
+        bruto = json.dumps(partes, sort_keys=True, default=str)
+        resumo = hashlib.sha1(bruto.encode()).hexdigest()[:16]
+        versoes = '.'.join(self._versoes(tabelas))
+        return f'{nome}:{resumo}:{versoes}'
+
+    # --- Métricas ---
+    # Contadas em memória; num backend compartilhado o acumulado vai para lá
+    # em lote a cada metrics_flush segundos, não uma ida ao Redis por acesso.
+
+    def _contar(self, nome, acerto):
+        tipo = 'hits' if acerto else 'misses'
+        with self._lock:
+            metrica = self._metricas.setdefault(nome, [0, 0])
+            metrica[0 if acerto else 1] += 1
+            if not self.backend.compartilhado:
+                return
+            chave = f'metricas:{nome}:{tipo}'
+            self._pendentes[chave] = self._pendentes.get(chave, 0) + 1
+            if time.monotonic() - self._enviado_em < self.metrics_flush:
+                return
+        self.flush_metrics()
+
+    def flush_metrics(self):
+        """Envia ao backend compartilhado as métricas acumuladas no processo"""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+            self._enviado_em = time.monotonic()
+        if not pendentes:
+            return
+        try:
+            self.backend.incr_many(pendentes)
+        except Exception:
+            logger.warning("Cache: métricas não enviadas ao backend", exc_info=True)
+            with self._lock:
+                for chave, n in pendentes.items():
+                    self._pendentes[chave] = self._pendentes.get(chave, 0) + n
+
+    def remember(self, nome, partes, calcular, ttl=None, tabelas=()):
+        """Valor em cache para (nome, partes); senão calcula e guarda"""
+        try:
+            chave = self._chave(nome, partes, tabelas)
+            bruto = self.backend.get(chave)
+        except Exception:
+            # Backend fora do ar: serve sem cache em vez de falhar a requisição
+            logger.warning("Cache: backend indisponível em %s", nome, exc_info=True)
+            return calcular()
+        if bruto is not None:
+            self._contar(nome, True)
+            return json.loads(bruto)
+        self._contar(nome, False)
+        valor = calcular()
+        try:
+            self.backend.set(chave, json.dumps(valor, default=str), ttl or self.default_ttl)
+        except Exception:
+            logger.warning("Cache: backend indisponível em %s", nome, exc_info=True)
+        return valor
+
+    def clear(self):
+        self.backend.clear()
+
+    def _metricas_compartilhadas(self):
+        metricas = {}
+        for chave, valor in self.backend.scan('metricas:*').items():
+            nome, tipo = chave[len('metricas:'):].rsplit(':', 1)
+            metricas.setdefault(nome, [0, 0])[0 if tipo == 'hits' else 1] = int(valor)
+        return metricas
+
+    def stats(self):
+        """Acertos/erros por nome: de todos os workers no Redis (desde o
+        último clear), só deste processo no backend em memória"""
+        if self.backend.compartilhado:
+            self.flush_metrics()
+            metricas = self._metricas_compartilhadas()
+        else:
+            with self._lock:
+                metricas = {nome: tuple(valores) for nome, valores in self._metricas.items()}
+        por_nome = {
+            nome: {'hits': h, 'misses': m, 'hit_ratio': round(h / (h + m), 3) if h + m else None}
+            for nome, (h, m) in sorted(metricas.items())
+        }
+        hits = sum(m['hits'] for m in por_nome.values())
+        misses = sum(m['misses'] for m in por_nome.values())
+        stats = {
+            'backend': type(self.backend).__name__,
+            'compartilhado': self.backend.compartilhado,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+            'por_nome': por_nome,
+        }
+        if isinstance(self.backend, MemoryBackend):
+            stats['itens'] = len(self.backend)
+        return stats
+
+
+def create_cache(config):
+    """Cria o cache configurado em CACHE_BACKEND ('memory' ou 'redis')"""
+    backend = config.get('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        store = MemoryBackend(config.get('CACHE_MAX_ITEMS', 1024))
+    elif backend == 'redis':
+        store = RedisBackend(config['CACHE_REDIS_URL'], config.get('CACHE_KEY_PREFIX', 'semapa:'))
+    else:
+        raise ValueError(f"CACHE_BACKEND desconhecido: {backend}")
+    return Cache(store, config.get('CACHE_DEFAULT_TTL', 300), config.get('CACHE_METRICS_FLUSH', 10))
+
+
+def get_cache(app=None):
+    """Retorna o cache da aplicação (criado uma vez por processo)"""
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+    cache = app.extensions.get('cache')
+    if cache is None:
+        cache = app.extensions['cache'] = create_cache(app.config)
+    return cache
+
+
+def _tabelas(models):
+    return tuple(getattr(m, '__tablename__', m) for m in models)
+
+
+def cached(ttl=None, models=()):
+    """Decorator para métodos de serviço: cacheia pelo nome e argumentos.
+
+    `models` são as classes (ou nomes de tabela) das quais o resultado
+    depende. A função original fica em `.uncached`.
+    """
+    tabelas = _tabelas(models)
+
+    def decorator(func):
+        nome = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_cache().remember(
+                nome, [args, kwargs], lambda: func(*args, **kwargs), ttl=ttl, tabelas=tabelas
+            )
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def cache_fragment(nome, *partes, ttl=None, models=(), caller=None):
+    """Uso em templates, com o conteúdo do bloco cacheado:
+
+        {% call cache_fragment('especies_options', models=['especies']) %}
+          ...
+        {% endcall %}
+    """
+    html = get_cache().remember(
+        f'fragmento:{nome}', list(partes), lambda: str(caller()), ttl=ttl, tabelas=_tabelas(models)
+    )
+    return Markup(html)
+
+
+# === Invalidação pelos eventos do ORM ===
+# Marca as tabelas alteradas na sessão e invalida só após o commit, para que
+# outra requisição não recoloque no cache um valor de transação ainda aberta.
+
+def _marcar_tabela(mapper, connection, target):
+    from sqlalchemy.orm import object_session
+    session = object_session(target)
+    if session is not None:
+        defer_after_commit(session, 'cache', mapper.local_table.name)
+
+
+@after_commit('cache')
+def _invalidar_apos_commit(tabelas):
+    from flask import has_app_context
+    if not has_app_context():
+        return
+    try:
+        get_cache().invalidate(*sorted(set(tabelas)))
+    except Exception:
+        # O commit já valeu: falhar aqui só transformaria a gravação em 500
+        logger.exception("Cache: invalidação de %s falhou após o commit", sorted(set(tabelas)))
+
+
+for _evento in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Mapper, _evento, _marcar_tabela)
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core CLI
+Comandos de manutenção disponíveis em `flask semapa ...`
+"""
+
+import click
+from flask.cli import AppGroup
+
+semapa_cli = AppGroup('semapa', help='Comandos de manutenção do SEMAPA3.')
+db_cli = AppGroup('db', help='Migrações versionadas do esquema (migrations/).')
+semapa_cli.add_command(db_cli)
+
+# Máximo de consultas SQL por endpoint (check-queries). Um aumento aqui
+# normalmente indica N+1: ajuste o perfil de carregamento do serviço.
+# Só páginas que renderizam: /ordens-servico/ e /vistorias/ voltam quando
+# tiverem os templates index.html.
+QUERY_BUDGETS = {
+    '/requerimentos/': 5,
+    '/api/requerimentos': 4,
+    '/api/ordens': 4,
+    '/api/vistorias': 3,
+    '/api/arvores': 4,
+    '/api/requerentes': 3,
+    '/api/especies': 3,
+}
+
+# Processo novo que só cria a app, como um worker ou comando de CLI a frio
+STARTUP_SNIPPET = (
+    "import os, time; inicio = time.perf_counter(); "
+    "from config.settings import config; from app import create_app; "
+    "create_app(config[os.environ.get('FLASK_CONFIG', 'default')]); "
+    "print('SEMAPA_STARTUP_MS', (time.perf_counter() - inicio) * 1000)"
+)
+
+
+def _processo_de_inicializacao(*opcoes_python):
+    """Roda STARTUP_SNIPPET num interpretador novo (raiz do projeto)"""
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    raiz = Path(__file__).resolve().parent.parent
+    processo = subprocess.run(
+        [sys.executable, *opcoes_python, '-c', STARTUP_SNIPPET],
+        cwd=raiz, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        erro = [l for l in processo.stderr.splitlines() if not l.startswith('import time:')]
+        raise click.ClickException("create_app falhou:\n" + '\n'.join(erro[-15:]))
+    return processo
+
+
+def _consultas_indexadas():
+    """Listagens que devem usar índice (check-indexes): (nome, índice, chamada).
+
+    Os valores dos filtros não importam para o plano; só as colunas usadas.
+    """
+    from datetime import datetime
+    from core.database import encode_cursor
+    from models import Arvore
+    from services.requerimento_service import RequerimentoService
+    from services.ordem_servico_service import OrdemServicoService
+    from services.vistoria_service import VistoriaService
+    from services.arvore_service import ArvoreService
+    from services.requerente_service import RequerenteService
+    from services.especie_service import EspecieService
+
+    agora = datetime.now()
+    return [
+        ('requerimentos', 'ix_requerimentos_data_abertura_id', lambda: RequerimentoService.get_paginated()),
+        ('requerimentos?cursor', 'ix_requerimentos_data_abertura_id', lambda: RequerimentoService.get_paginated(cursor=encode_cursor('n', agora, 1))),
+        ('requerimentos?status', 'ix_requerimentos_status_data_abertura_id', lambda: RequerimentoService.get_paginated(status='pendente')),
+        ('requerimentos?tipo', 'ix_requerimentos_tipo_data_abertura_id', lambda: RequerimentoService.get_paginated(tipo='poda')),
+        ('requerimentos?requerente_id', 'ix_requerimentos_requerente_data_abertura_id', lambda: RequerimentoService.get_paginated(requerente_id=1)),
+        ('requerimentos?periodo', 'ix_requerimentos_data_abertura_id', lambda: RequerimentoService.get_paginated(data_inicio=agora, data_fim=agora)),
+        ('requerimentos?status&periodo', 'ix_requerimentos_status_data_abertura_id',
+         lambda: RequerimentoService.get_paginated(status='pendente', data_inicio=agora, data_fim=agora)),
+        ('ordens', 'ix_ordens_servico_data_emissao_id', lambda: OrdemServicoService.get_paginated()),
+        ('ordens?status', 'ix_ordens_servico_status_data_emissao_id', lambda: OrdemServicoService.get_paginated(status='Pendente')),
+        ('vistorias', 'ix_vistoria_data_id', lambda: VistoriaService.get_paginated()),
+        ('vistorias?status', 'ix_vistoria_status_data_id', lambda: VistoriaService.get_paginated(status='Pendente')),
+        ('vistorias?tecnico_id', 'ix_vistoria_user_data_id', lambda: VistoriaService.get_paginated(tecnico_id=1)),
+        ('arvores', 'ix_arvores_endereco_id', lambda: ArvoreService.get_cursor_page()),
+        ('arvores?bairro', 'ix_arvores_bairro_endereco_id', lambda: Arvore.get_by_bairro('Centro')),
+        ('arvores?especie_id', 'ix_arvores_especie_endereco_id', lambda: Arvore.get_by_especie(1)),
+        ('requerentes', 'ix_requerentes_nome_id', lambda: RequerenteService.get_cursor_page()),
+        ('especies', 'ix_especies_nome_cientifico', lambda: EspecieService.get_cursor_page()),
+    ]
+
+
+@db_cli.command('upgrade')
+@click.option('--to', 'alvo', type=int, help='Para nesta versão (padrão: a mais recente).')
+def db_upgrade(alvo):
+    """Aplica as migrações pendentes (rode uma vez por deploy, antes dos workers)."""
+    from core.migrations import upgrade
+    from services.dashboard_service import DashboardService
+
+    aplicadas = upgrade(alvo=alvo, log=click.echo)
+    if aplicadas:
+        click.echo(f"✅ Esquema na versão {aplicadas[-1]} ({len(aplicadas)} migração(ões) aplicada(s))")
+    else:
+        click.echo("✅ Esquema já atualizado")
+    # O dashboard só lê os contadores: a primeira contagem sai no deploy
+    if DashboardService.reconciliado_em() is None:
+        DashboardService.reconcile()
+        click.echo("✅ Contadores do dashboard calculados")
+
+
+@db_cli.command('status')
+def db_status():
+    """Mostra a versão do esquema e as migrações aplicadas e pendentes."""
+    from core.migrations import available, status
+
+    atual, mais_recente, historico = status()
+    for versao, nome, aplicada_em in historico:
+        click.echo(f"  {versao:04d}_{nome}  aplicada em {aplicada_em:%Y-%m-%d %H:%M}")
+    for versao, nome in available():
+        if versao > atual:
+            click.echo(f"  {versao:04d}_{nome}  pendente")
+    click.echo(f"Versão {atual} de {mais_recente}")
+
+
+@semapa_cli.command('import-report')
+@click.option('--top', default=25, show_default=True, help='Quantos módulos listar.')
+@click.option('--todos', is_flag=True, help='Inclui bibliotecas (padrão: só módulos do projeto).')
+def import_report(top, todos):
+    """Tempo de import de cada módulo ao criar a app a frio (python -X importtime)."""
+    import re
+
+    processo = _processo_de_inicializacao('-X', 'importtime')
+    projeto = ('app', 'config', 'controllers', 'core', 'migrations', 'models', 'services', 'utils')
+    linhas = []
+    for linha in processo.stderr.splitlines():
+        casamento = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', linha)
+        if not casamento:
+            continue
+        proprio, acumulado, recuo, modulo = casamento.groups()
+        if todos or modulo.split('.')[0] in projeto:
+            linhas.append((int(acumulado), int(proprio), len(recuo) // 2, modulo))
+
+    total = re.search(r'SEMAPA_STARTUP_MS ([\d.]+)', processo.stdout)
+    click.echo(f"{'acumulado':>10} {'próprio':>9}  módulo (ms)")
+    for acumulado, proprio, nivel, modulo in sorted(linhas, reverse=True)[:top]:
+        click.echo(f"{acumulado / 1000:10.1f} {proprio / 1000:9.1f}  {'  ' * nivel}{modulo}")
+    if total:
+        click.echo(f"create_app (imports inclusos): {float(total.group(1)):.0f} ms")
+
+
+@semapa_cli.command('startup-benchmark')
+@click.option('--repeticoes', default=5, show_default=True, help='Processos medidos.')
+@click.option('--budget', type=int, help='Máximo em ms para a mediana (padrão: STARTUP_BUDGET_MS).')
+def startup_benchmark(repeticoes, budget):
+    """Mede import + create_app a frio em processos novos; falha acima do orçamento (CI)."""
+    import re
+    import statistics
+    from flask import current_app
+
+    budget = budget or current_app.config.get('STARTUP_BUDGET_MS', 1500)
+    tempos = []
+    for _ in range(repeticoes):
+        processo = _processo_de_inicializacao()
+        tempos.append(float(re.search(r'SEMAPA_STARTUP_MS ([\d.]+)', processo.stdout).group(1)))
+    mediana = statistics.median(tempos)
+    click.echo(f"create_app a frio: mediana {mediana:.0f} ms, mín {min(tempos):.0f}, "
+               f"máx {max(tempos):.0f} ({repeticoes} processos; orçamento {budget} ms)")
+    if mediana > budget:
+        raise click.ClickException(f"Inicialização acima do orçamento: {mediana:.0f} > {budget} ms")
+
+
+@semapa_cli.command('compile-templates')
+@click.option('--clear', is_flag=True, help='Apaga o cache de bytecode antes de compilar.')
+def compile_templates(clear):
+    """Compila todos os templates para o cache de bytecode (rode no deploy)."""
+    import time
+    from flask import current_app
+    from core.templates import precompile_templates
+
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException("Cache de bytecode desligado (TEMPLATE_CACHE_DIR)")
+    if clear:
+        env.bytecode_cache.clear()
+    # Os do aquecimento já estão em memória: recarrega tudo pelo cache em disco
+    env.cache.clear()
+    inicio = time.perf_counter()
+    compilados, falhas = precompile_templates(current_app)
+    for nome, erro in falhas:
+        click.echo(f"❌ {nome}: {erro}")
+    click.echo(f"✅ {compilados} templates em {env.bytecode_cache.directory} "
+               f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+    if falhas:
+        raise click.ClickException(f"{len(falhas)} template(s) com erro")
+
+
+@semapa_cli.command('template-stats')
+@click.option('--top', default=25, show_default=True, help='Quantas linhas listar.')
+@click.option('--url', 'urls', multiple=True, help='Renderiza esta página antes (com o usuário de maior nível); repetível.')
+def template_stats(top, urls):
+    """Tempo de render por template, bloco e macro (requer TEMPLATE_TIMING)."""
+    from flask import current_app
+    from core.templates import get_template_timer
+
+    timer = get_template_timer(current_app)
+    if timer is None:
+        raise click.ClickException("Medição desligada: rode com TEMPLATE_TIMING=true")
+    if urls:
+        client = _cliente_logado()
+        for url in urls:
+            response = client.get(url)
+            click.echo(f"{url}: HTTP {response.status_code}")
+    click.echo(f"{'total ms':>10} {'médio ms':>9} {'máx ms':>8} {'renders':>8}  nome")
+    for metrica in timer.stats()[:top]:
+        click.echo(f"{metrica['total_ms']:10.1f} {metrica['medio_ms']:9.2f} {metrica['max_ms']:8.2f} "
+                   f"{metrica['renders']:8d}  {metrica['nome']}")
+
+
+@semapa_cli.command('rebuild-spatial-index')
+def rebuild_spatial_index():
+    """Recalcula coordenadas numéricas e reconstrói o índice espacial de árvores."""
+    from services.arvore_service import ArvoreService
+
+    total = ArvoreService.rebuild_spatial_index()
+    click.echo(f"✅ Índice espacial reconstruído: {total} árvores georreferenciadas")
+
+
+@semapa_cli.command('migrate-fotos')
+@click.option('--batch-size', default=50, show_default=True, help='Fotos por transação.')
+def migrate_fotos(batch_size):
+    """Move as fotos de vistoria gravadas no banco para o blob store."""
+    from services.vistoria_service import VistoriaService
+
+    total = VistoriaService.migrate_fotos_to_blob_store(batch_size=batch_size)
+    click.echo(f"✅ {total} fotos migradas para o blob store")
+    click.echo("ℹ️  Em SQLite, rode VACUUM para devolver o espaço ao sistema de arquivos")
+
+
+@semapa_cli.command('import-arvores')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'geojson']),
+              help='Padrão: pela extensão do arquivo (.csv, .geojson/.json).')
+@click.option('--batch-size', default=1000, show_default=True, help='Linhas por INSERT/commit.')
+@click.option('--email', help='Usuário registrado como criador das árvores.')
+@click.option('--dry-run', is_flag=True, help='Só valida; não grava nada.')
+@click.option('--erros', 'arquivo_erros', type=click.Path(dir_okay=False),
+              help='Grava as linhas com erro neste CSV (linha;erros).')
+def import_arvores(arquivo, formato, batch_size, email, dry_run, arquivo_erros):
+    """Importa árvores em lote de CSV ou GeoJSON (colunas da exportação)."""
+    import csv
+    import time
+    from services.arvore_service import ArvoreService
+    from models.user_model import User
+
+    formato = formato or ('csv' if arquivo.lower().endswith('.csv') else 'geojson')
+    criado_por = None
+    if email:
+        usuario = User.query.filter_by(email=email).first()
+        if not usuario:
+            raise click.ClickException(f"Usuário não encontrado: {email}")
+        criado_por = usuario.id
+
+    inicio = time.perf_counter()
+    with open(arquivo, 'rb') as stream:
+        relatorio = ArvoreService.import_records(
+            ArvoreService.iter_import_records(stream, formato),
+            criado_por=criado_por, batch_size=batch_size, dry_run=dry_run
+        )
+    duracao = time.perf_counter() - inicio
+
+    for erro in relatorio['erros'][:20]:
+        click.echo(f"  linha {erro['linha']}: {'; '.join(erro['erros'])}")
+    if relatorio['com_erro'] > 20:
+        click.echo(f"  ... e mais {relatorio['com_erro'] - 20} linha(s) com erro")
+    if arquivo_erros:
+        with open(arquivo_erros, 'w', newline='', encoding='utf-8') as saida:
+            writer = csv.writer(saida, delimiter=';')
+            writer.writerow(['linha', 'erros'])
+            for erro in relatorio['erros']:
+                writer.writerow([erro['linha'], ' | '.join(erro['erros'])])
+
+    acao = 'validadas' if dry_run else 'importadas'
+    click.echo(f"✅ {relatorio['importadas']}/{relatorio['total']} árvores {acao} "
+               f"em {duracao:.1f}s ({relatorio['com_erro']} com erro)")
+
+
+@semapa_cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Reconstrói o índice de busca textual (requerimentos, requerentes, árvores e espécies)."""
+    from services.busca_service import BuscaService
+
+    total = BuscaService.rebuild_index()
+    click.echo(f"✅ Índice de busca reconstruído: {total} documentos")
+
+
+@semapa_cli.command('check-queries')
+@click.option('--email', help='Usuário das páginas com login (padrão: o de maior nível).')
+def check_queries(email):
+    """Confere o máximo de consultas SQL por endpoint (detecta N+1)."""
+    from core.database import assert_max_queries
+
+    client = _cliente_logado(email)
+    falhas = 0
+    for url, maximo in QUERY_BUDGETS.items():
+        try:
+            with assert_max_queries(maximo) as contador:
+                response = client.get(url)
+        except AssertionError as e:
+            falhas += 1
+            click.echo(f"❌ {url}: {e}")
+            continue
+        except Exception as e:  # com TESTING/PROPAGATE_EXCEPTIONS o erro da página chega aqui
+            falhas += 1
+            click.echo(f"❌ {url}: {type(e).__name__}: {e}")
+            continue
+        if response.status_code >= 300:
+            # Um redirect (ex.: para o login) não mede a página de verdade
+            falhas += 1
+            click.echo(f"❌ {url}: HTTP {response.status_code}")
+            continue
+        click.echo(f"✅ {url}: {contador.count}/{maximo} consultas")
+
+    if falhas:
+        raise click.ClickException(f"{falhas} endpoint(s) acima do orçamento de consultas")
+
+
+def _cliente_logado(email=None):
+    """Test client com a sessão de `email` (padrão: o usuário de maior nível)"""
+    from flask import current_app
+    from models.user_model import User
+
+    if email:
+        usuario = User.query.filter_by(email=email).first()
+    else:
+        usuario = User.query.order_by(User.nivel.desc()).first()
+
+    if usuario is None:
+        raise click.ClickException(f"Usuário não encontrado: {email or 'nenhum cadastrado'}")
+
+    client = current_app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['_user_id'] = str(usuario.id)
+        sessao['_fresh'] = True
+    return client
+
+
+@semapa_cli.command('check-indexes')
+def check_indexes():
+    """Confere com EXPLAIN que as listagens não fazem full scan nem ordenam fora do índice."""
+    from core.database import assert_indexed
+
+    falhas = 0
+    for nome, indice, consulta in _consultas_indexadas():
+        try:
+            with assert_indexed(indice) as contador:
+                consulta()
+        except AssertionError as e:
+            falhas += 1
+            click.echo(f"❌ {nome}: {e}")
+            continue
+        if contador.unsupported:
+            click.echo(f"⚠️  {nome}: dialeto não suportado ({', '.join(sorted(contador.unsupported))}), "
+                       f"plano não conferido")
+            continue
+        click.echo(f"✅ {nome}: {contador.count} consulta(s) indexada(s)")
+
+    if falhas:
+        raise click.ClickException(f"{falhas} listagem(ns) sem índice adequado")
+
+
+@semapa_cli.command('sync-replica')
+def sync_replica():
+    """Copia o banco primário para a réplica (SQLite; para testar o roteamento local)."""
+    import sqlite3
+    from core.database import db, REPLICA_BIND
+
+    if REPLICA_BIND not in db.engines:
+        raise click.ClickException("Réplica não configurada (DATABASE_REPLICA_URL)")
+    primario, replica = db.engine, db.engines[REPLICA_BIND]
+    if primario.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise click.ClickException("sync-replica só copia SQLite; no PostgreSQL use a replicação nativa")
+
+    replica.dispose()
+    origem = sqlite3.connect(primario.url.database)
+    destino = sqlite3.connect(replica.url.database)
+    try:
+        origem.backup(destino)
+    finally:
+        origem.close()
+        destino.close()
+    click.echo(f"✅ Réplica atualizada: {replica.url.database}")
+
+
+@semapa_cli.command('cache-stats')
+@click.option('--clear', is_flag=True, help='Esvazia o cache depois de exibir as métricas.')
+def cache_stats(clear):
+    """Mostra acertos/erros do cache por método ou fragmento (somente Redis)."""
+    from core.cache import get_cache
+
+    cache = get_cache()
+    if not cache.backend.compartilhado:
+        # Cache e métricas em memória são de cada worker: aqui estariam sempre vazios
+        raise click.ClickException(
+            "CACHE_BACKEND 'memory' é por processo: use GET /api/cache/stats "
+            "em cada worker ou CACHE_BACKEND=redis"
+        )
+    stats = cache.stats()
+    click.echo(f"Backend: {stats['backend']}  hits: {stats['hits']}  misses: {stats['misses']}"
+               f"  hit ratio: {stats['hit_ratio']}")
+    for nome, metrica in stats['por_nome'].items():
+        click.echo(f"  {nome}: {metrica['hits']} hits, {metrica['misses']} misses")
+    if clear:
+        cache.clear()
+        click.echo("✅ Cache esvaziado")
+
+
+@semapa_cli.command('reconcile-stats')
+def reconcile_stats():
+    """Reconta os contadores do dashboard (agende no cron para corrigir desvios)."""
+    from services.dashboard_service import DashboardService
+
+    valores = DashboardService.reconcile()
+    click.echo(f"✅ Estatísticas do dashboard reconciliadas: {len(valores) - 1} contadores")
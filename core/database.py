@@ -4,25 +4,620 @@ SEMAPA3 - Core Database
 Configuração do banco de dados usando SQLAlchemy
 """
 
+import base64
+import binascii
+import importlib
+import json
+import re
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import wraps
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, func, literal, select, tuple_
+from core.exceptions import ValidationError
+
+# Profundidade de unit_of_work() abertos, em session.info
+UOW_KEY = 'unit_of_work'
+# Profundidade de métodos @read_only em execução, em session.info
+READ_ONLY_KEY = 'somente_leitura'
+# Bind da réplica em SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+# Até quando (time.time()) as leituras ficam no primário após uma escrita
+PRIMARIO_ATE_KEY = '_leitura_primario_ate'
+
+
+class SemapaSession(Session):
+    """Sessão que adia o commit() enquanto houver uma unidade de trabalho aberta
+    e envia as leituras de métodos @read_only para a réplica.
+
+    Dentro de unit_of_work() os commit() de models e serviços viram flush()
+    (ids e constraints continuam valendo na hora); só o fim da unidade grava.
+    """
+
+    def commit(self):
+        if self.info.get(UOW_KEY):
+            self.flush()
+            return
+        super().commit()
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get(READ_ONLY_KEY) and self._usar_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+    def _usar_replica(self, clause):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        # Read-your-writes: esta sessão gravou (o autoflush já rodou antes do
+        # get_bind), ou o usuário gravou há pouco
+        if self.info.get('escreveu'):
+            return False
+        return time.time() >= _primario_ate(self)
+
 
 # Instância global do SQLAlchemy
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SemapaSession})
+
+
+def in_unit_of_work():
+    """Indica se os commits da sessão atual estão sendo adiados"""
+    return bool(db.session().info.get(UOW_KEY))
+
+
+@contextmanager
+def unit_of_work():
+    """Agrupa tudo o que for gravado no bloco numa única transação:
+
+        with unit_of_work():
+            RequerimentoService.create(...)
+            OrdemServicoService.create(...)
+
+    Confirma ao sair do bloco mais externo; qualquer exceção desfaz a
+    transação inteira. Um rollback() dentro do bloco também desfaz tudo o
+    que a unidade já gravou.
+    """
+    session = db.session()
+    session.info[UOW_KEY] = session.info.get(UOW_KEY, 0) + 1
+    try:
+        yield session
+    except BaseException:
+        session.info[UOW_KEY] -= 1
+        session.rollback()
+        raise
+    session.info[UOW_KEY] -= 1
+    if not session.info[UOW_KEY]:
+        session.commit()
+
+
+@contextmanager
+def suspend_unit_of_work():
+    """Dentro do bloco cada commit() volta a gravar de verdade, para cargas
+    longas (ex.: importação em lotes) que não podem ser uma transação só.
+
+    Confirma antes o que a unidade aberta já gravou; ao sair ela volta a
+    valer para o restante da requisição.
+    """
+    session = db.session()
+    profundidade = session.info.pop(UOW_KEY, 0)
+    try:
+        if profundidade:
+            session.commit()
+        yield session
+    finally:
+        if profundidade:
+            session.info[UOW_KEY] = profundidade
+
+
+# === Engine: PRAGMAs do SQLite e verificação na inicialização ===
+
+def configure_engine(app):
+    """Aplica SQLITE_PRAGMAS a cada nova conexão SQLite, inclusive da réplica
+    (requer app context)"""
+    for chave, engine in db.engines.items():
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+        if engine.dialect.name != 'sqlite':
+            continue
+        if chave == REPLICA_BIND:
+            pragmas['query_only'] = 'ON'  # qualquer escrita roteada errado falha na hora
+        _registrar_pragmas(engine, pragmas)
+
+
+def _registrar_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def _aplicar_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for nome, valor in pragmas.items():
+                cursor.execute(f'PRAGMA {nome} = {valor}')
+        finally:
+            cursor.close()
+
+
+def check_database(app):
+    """Registra no log as configurações efetivas do banco e avisa divergências.
+
+    Retorna {'dialeto', 'versao', 'pool', 'pragmas'} para uso em comandos.
+    """
+    engine = db.engine
+    info = {'dialeto': engine.dialect.name, 'pool': engine.pool.status(), 'pragmas': {}}
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            info['versao'] = conn.exec_driver_sql('SELECT sqlite_version()').scalar()
+            for nome in app.config.get('SQLITE_PRAGMAS') or {}:
+                info['pragmas'][nome] = conn.exec_driver_sql(f'PRAGMA {nome}').scalar()
+        elif engine.dialect.name == 'postgresql':
+            info['versao'] = conn.exec_driver_sql('SHOW server_version').scalar()
+            info['pragmas']['statement_timeout'] = conn.exec_driver_sql('SHOW statement_timeout').scalar()
+        else:
+            info['versao'] = '.'.join(str(p) for p in engine.dialect.server_version_info or ())
+
+    app.logger.info(f"Banco: {info['dialeto']} {info['versao']} | pool: {info['pool']} | {info['pragmas']}")
+    if engine.dialect.name == 'sqlite':
+        desejado = str((app.config.get('SQLITE_PRAGMAS') or {}).get('journal_mode', '')).lower()
+        if desejado and str(info['pragmas'].get('journal_mode', '')).lower() != desejado:
+            app.logger.warning(f"SQLite: journal_mode={info['pragmas'].get('journal_mode')} "
+                               f"(configurado {desejado}); o arquivo está num sistema de arquivos de rede?")
+        if tuple(int(p) for p in info['versao'].split('.')) < (3, 35):
+            app.logger.warning("SQLite < 3.35: sem RETURNING (numeração e importação ficam mais lentas)")
+    return info
+
+
+# === Réplica de leitura ===
+# SQLALCHEMY_BINDS = {'replica': <url>} liga o roteamento. Só métodos marcados
+# com @read_only leem da réplica; escritas, flush e DML sempre vão ao primário.
+# Depois de um commit com escrita, as leituras do mesmo usuário (sessão Flask)
+# ficam no primário por REPLICA_STICKY_SECONDS, cobrindo o atraso da réplica.
+
+def read_only(func):
+    """Decorator: as consultas do método podem ser atendidas pela réplica"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        session = db.session()
+        session.info[READ_ONLY_KEY] = session.info.get(READ_ONLY_KEY, 0) + 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.info[READ_ONLY_KEY] -= 1
+    return wrapper
+
+
+def _primario_ate(session):
+    limite = session.info.get(PRIMARIO_ATE_KEY, 0)
+    from flask import has_request_context, session as sessao_flask
+    if has_request_context():
+        limite = max(limite, sessao_flask.get(PRIMARIO_ATE_KEY, 0))
+    return limite
+
+
+@event.listens_for(SemapaSession, 'after_flush')
+def _marcar_escrita(session, flush_context):
+    session.info['escreveu'] = True
+
+
+@event.listens_for(SemapaSession, 'after_commit')
+def _fixar_no_primario(session):
+    if not session.info.pop('escreveu', False):
+        return
+    from flask import current_app, has_app_context, has_request_context, session as sessao_flask
+    if not has_app_context() or REPLICA_BIND not in session._db.engines:
+        return
+    limite = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    session.info[PRIMARIO_ATE_KEY] = limite
+    if has_request_context():
+        sessao_flask[PRIMARIO_ATE_KEY] = limite
+
+
+@event.listens_for(SemapaSession, 'after_rollback')
+def _descartar_escrita(session):
+    session.info.pop('escreveu', None)
+
+
+# === Efeitos depois do commit ===
+# Trabalho que só pode valer depois que a transação for confirmada (invalidar
+# cache, somar contadores do dashboard fora dela). Registrado durante a
+# transação e executado após o commit da transação de fora; o que foi
+# registrado dentro de um SAVEPOINT desfeito (begin_nested) é descartado, o
+# resto continua valendo. after_commit/after_rollback também disparam nos
+# SAVEPOINTs, por isso o controle aqui e não em cada listener.
+
+_APOS_COMMIT_KEY = 'apos_commit'
+_apos_commit = {}
+
+
+def after_commit(chave):
+    """Decorator: `func(valores)` roda após o commit com a lista de valores
+    registrados por defer_after_commit(session, chave, valor)"""
+    def decorator(func):
+        _apos_commit[chave] = func
+        return func
+    return decorator
+
+
+def defer_after_commit(session, chave, valor):
+    """Registra `valor` para o handler `chave`, na transação atual da sessão"""
+    session.info.setdefault(_APOS_COMMIT_KEY, []).append(
+        (session.get_nested_transaction(), chave, valor)
+    )
+
+
+def discard_after_commit(session, chave):
+    """Descarta o que está pendente para `chave` (ex.: já refletido na transação)"""
+    pendentes = session.info.get(_APOS_COMMIT_KEY)
+    if pendentes:
+        session.info[_APOS_COMMIT_KEY] = [p for p in pendentes if p[1] != chave]
+
+
+def _dentro_de(transacao, savepoint):
+    while transacao is not None:
+        if transacao is savepoint:
+            return True
+        transacao = transacao.parent
+    return False
+
+
+@event.listens_for(SemapaSession, 'after_commit')
+def _executar_apos_commit(session):
+    if session.get_nested_transaction() is not None:
+        return  # só um SAVEPOINT foi liberado: ainda depende do commit de fora
+    pendentes = session.info.pop(_APOS_COMMIT_KEY, None)
+    if not pendentes:
+        return
+    por_chave = {}
+    for _, chave, valor in pendentes:
+        por_chave.setdefault(chave, []).append(valor)
+    for chave, valores in por_chave.items():
+        _apos_commit[chave](valores)
+
+
+@event.listens_for(SemapaSession, 'after_soft_rollback')
+def _descartar_apos_commit(session, anterior):
+    pendentes = session.info.get(_APOS_COMMIT_KEY)
+    if not pendentes:
+        return
+    if anterior.nested:
+        session.info[_APOS_COMMIT_KEY] = [p for p in pendentes if not _dentro_de(p[0], anterior)]
+    elif anterior.parent is None:
+        session.info.pop(_APOS_COMMIT_KEY, None)
+
+
+def init_unit_of_work(app):
+    """Modo UNIT_OF_WORK_PER_REQUEST: uma transação por requisição.
+
+    Respostas < 400 (inclusive redirects) confirmam; as demais, exceções não
+    tratadas e transações que já falharam (ex.: erro capturado pelo
+    controller) desfazem.
+    """
+    @app.before_request
+    def _abrir_unidade():
+        session = db.session()
+        session.info[UOW_KEY] = session.info.get(UOW_KEY, 0) + 1
+
+    @app.after_request
+    def _fechar_unidade(response):
+        session = db.session()
+        if session.info.pop(UOW_KEY, 0):
+            if response.status_code < 400 and session.is_active:
+                session.commit()
+            else:
+                session.rollback()
+        return response
+
+
+def upsert_insert(dialeto):
+    """insert() com on_conflict_do_update do dialeto ('sqlite' ou 'postgresql').
+
+    Importa só o dialeto em uso: sqlalchemy.dialects.postgresql (com asyncpg
+    e companhia) custa ~0,1s na inicialização de uma instalação SQLite.
+    """
+    return importlib.import_module(f'sqlalchemy.dialects.{dialeto}').insert
+
+
+def count_query(query):
+    """COUNT(*) da consulta, sem ORDER BY e sem carregar as linhas"""
+    subquery = query.order_by(None).subquery()
+    return db.session.execute(select(func.count()).select_from(subquery)).scalar()
+
+
+def paginate_query(query, page=1, per_page=10):
+    """Pagina no banco (LIMIT/OFFSET) e conta à parte. Retorna (itens, total)."""
+    page = max(page or 1, 1)
+    per_page = max(per_page or 1, 1)
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+    if page == 1 and len(items) < per_page:
+        total = len(items)  # página única: dispensa o COUNT
+    else:
+        total = count_query(query)
+    return items, total
+
+
+# === Paginação por cursor (keyset) ===
+
+def encode_cursor(direcao, chave, id):
+    """Token opaco com a direção ('n'ext/'p'rev), a chave de ordenação e o id"""
+    if isinstance(chave, datetime):
+        chave = {'dt': chave.isoformat()}
+    elif isinstance(chave, date):
+        chave = {'d': chave.isoformat()}
+    bruto = json.dumps([direcao, chave, id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverso de encode_cursor. Lança ValidationError para tokens inválidos."""
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direcao, chave, id = json.loads(bruto)
+        if isinstance(chave, dict):
+            chave = (datetime.fromisoformat(chave['dt']) if 'dt' in chave
+                     else date.fromisoformat(chave['d']))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValidationError("Cursor de paginação inválido", field='cursor')
+    if direcao not in ('n', 'p') or not isinstance(id, int):
+        raise ValidationError("Cursor de paginação inválido", field='cursor')
+    return direcao, chave, id
+
+
+def _aceita_nulos(chave):
+    """Se a coluna de ordenação pode ter NULL (na dúvida, assume que sim)"""
+    try:
+        return any(col.nullable for col in chave.property.columns)
+    except AttributeError:
+        return True
+
+
+class CursorPage:
+    """Página de resultados com tokens para a próxima e a anterior"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def to_dict(self, serializer=None):
+        serializer = serializer or (lambda item: item.to_dict())
+        return {
+            'items': [serializer(item) for item in self.items],
+            'next': self.next_cursor,
+            'prev': self.prev_cursor
+        }
+
+
+def paginate_cursor(query, chave, id_col, cursor=None, per_page=20, descending=True,
+                    nulos=None):
+    """Pagina por keyset em (chave, id): custo igual em qualquer página.
+
+    `chave` é a coluna de ordenação e `id_col` o desempate único; com um índice
+    em (chave, id) cada página é uma busca por intervalo no índice. NULLs em
+    `chave` contam como o menor valor e são lidos num trecho separado, para
+    que a comparação por tupla continue usando o índice. Passe nulos=False
+    quando o filtro já exclui NULLs (ex.: intervalo de datas) para pular
+    esse trecho.
+    """
+    per_page = max(per_page or 1, 1)
+    direcao, valor, id_valor = decode_cursor(cursor) if cursor else ('n', None, None)
+    voltando = direcao == 'p'
+    # Ler "para frente" na ordem pedida significa buscar valores maiores se ASC
+    crescente = descending == voltando
+
+    # Trechos na ordem de leitura: NULLs vêm antes dos valores quando crescente
+    trechos = ['valores']
+    if _aceita_nulos(chave) if nulos is None else nulos:
+        trechos = ['nulos', 'valores'] if crescente else ['valores', 'nulos']
+    if cursor:
+        atual = 'nulos' if valor is None else 'valores'
+        trechos = trechos[trechos.index(atual):] if atual in trechos else []
+
+    inicio = cursor
+    linhas = []
+    for trecho in trechos:
+        if trecho == 'nulos':
+            consulta = query.filter(chave.is_(None))
+            if cursor and valor is None:
+                consulta = consulta.filter(id_col > id_valor if crescente else id_col < id_valor)
+            ordem = [id_col.asc() if crescente else id_col.desc()]
+        else:
+            consulta = query.filter(chave.isnot(None))
+            if cursor and valor is not None:
+                atual, marco = tuple_(chave, id_col), tuple_(literal(valor, chave.type), literal(id_valor, id_col.type))
+                consulta = consulta.filter(atual > marco if crescente else atual < marco)
+            ordem = ([chave.asc(), id_col.asc()] if crescente
+                     else [chave.desc(), id_col.desc()])
+        linhas += consulta.order_by(None).order_by(*ordem).limit(per_page + 1 - len(linhas)).all()
+        if len(linhas) > per_page:
+            break
+        # O cursor só se aplica ao trecho em que ele está
+        cursor = None
+
+    ha_mais = len(linhas) > per_page
+    linhas = linhas[:per_page]
+    if voltando:
+        linhas.reverse()
+
+    def _token(direcao, item):
+        return encode_cursor(direcao, getattr(item, chave.key), getattr(item, id_col.key))
+
+    next_cursor = prev_cursor = None
+    if linhas:
+        if ha_mais or voltando:
+            next_cursor = _token('n', linhas[-1])
+        if ha_mais if voltando else inicio is not None:
+            prev_cursor = _token('p', linhas[0])
+    return CursorPage(linhas, next_cursor, prev_cursor)
+
+
+# === Perfis de carregamento e contagem de consultas ===
+
+def apply_profile(query, profiles, profile):
+    """Aplica as opções de carregamento (joinedload/selectinload) de um perfil.
+
+    `profiles` mapeia nome -> função que retorna as opções; a função adia a
+    criação para depois da configuração dos mappers (backrefs).
+    """
+    if profile is None:
+        return query
+    try:
+        opcoes = profiles[profile]
+    except KeyError:
+        raise ValueError(f"Perfil de carregamento desconhecido: {profile}")
+    return query.options(*opcoes())
+
+
+class QueryCounter:
+    """Consultas SQL executadas dentro de count_queries()"""
+
+    def __init__(self):
+        self.statements = []
+        # (engine, sql, parâmetros) de cada execução, para assert_indexed()
+        self.executions = []
+        # Dialetos sem explain_plan(): assert_indexed() não conferiu essas consultas
+        self.unsupported = set()
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Conta as consultas enviadas ao banco no bloco (por padrão em todos os
+    binds, inclusive a réplica)"""
+    engines = [engine] if engine is not None else list(db.engines.values())
+    contador = QueryCounter()
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        contador.statements.append(statement)
+        if not executemany:
+            contador.executions.append((conn.engine, statement, parameters))
+
+    for alvo in engines:
+        event.listen(alvo, 'before_cursor_execute', _registrar)
+    try:
+        yield contador
+    finally:
+        for alvo in engines:
+            event.remove(alvo, 'before_cursor_execute', _registrar)
+
+
+@contextmanager
+def assert_max_queries(maximo, engine=None):
+    """Falha com AssertionError se o bloco executar mais de `maximo` consultas"""
+    with count_queries(engine) as contador:
+        yield contador
+    if contador.count > maximo:
+        consultas = '\n'.join(f'  {i}. {sql}' for i, sql in enumerate(contador.statements, 1))
+        raise AssertionError(
+            f"{contador.count} consultas executadas (máximo {maximo}):\n{consultas}"
+        )
+
+
+# Linhas do plano que indicam leitura da tabela inteira ou ordenação fora do índice
+_PLANO_SUSPEITO = {
+    'sqlite': re.compile(r'^SCAN (?!CONSTANT ROW)(?!anon_)\S+$|^USE TEMP B-TREE FOR .*ORDER BY'),
+    'postgresql': re.compile(r'Seq Scan on |(^|->)\s*Sort\s+\('),
+}
+
+
+def explain_plan(connection, statement, parameters=()):
+    """Plano da consulta, uma linha de texto por nó (SQLite e PostgreSQL;
+    None nos demais bancos).
+
+    No PostgreSQL seq scan e sort são desligados durante o EXPLAIN: em tabelas
+    pequenas o planejador os escolhe mesmo havendo índice; assim só aparecem
+    quando nenhum índice serve.
+    """
+    dialeto = connection.dialect.name
+    if dialeto == 'sqlite':
+        return [linha[-1] for linha in
+                connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+    if dialeto == 'postgresql':
+        connection.exec_driver_sql('SET enable_seqscan = off')
+        connection.exec_driver_sql('SET enable_sort = off')
+        try:
+            return [linha[0] for linha in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        finally:
+            connection.exec_driver_sql('RESET enable_seqscan')
+            connection.exec_driver_sql('RESET enable_sort')
+    return None
+
+
+@contextmanager
+def assert_indexed(*indices, engine=None):
+    """Falha com AssertionError se algum SELECT do bloco fizer full scan ou
+    ordenar fora de um índice (verificado com EXPLAIN ao fim do bloco).
+
+    `indices` são nomes que precisam aparecer em algum plano: percorrer um
+    índice inteiro filtrando linha a linha também aparece como "SCAN ...
+    USING INDEX", que só é aceitável na listagem sem filtro.
+
+    Em bancos sem explain_plan() nada é conferido: o dialeto vai para
+    `contador.unsupported` e quem chama decide como informar.
+    """
+    with count_queries(engine) as contador:
+        yield contador
+    problemas = []
+    usados = set()
+    for alvo, statement, parametros in contador.executions:
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        with alvo.connect() as connection:
+            plano = explain_plan(connection, statement, parametros)
+        if plano is None:
+            contador.unsupported.add(alvo.dialect.name)
+            continue
+        suspeito = _PLANO_SUSPEITO[alvo.dialect.name]
+        usados.update(nome for nome in indices if any(nome in linha for linha in plano))
+        ruins = [linha for linha in plano if suspeito.search(linha.strip())]
+        if ruins:
+            problemas.append(f"  {' | '.join(ruins)}\n    {' '.join(statement.split())}")
+    faltando = [] if contador.unsupported else [nome for nome in indices if nome not in usados]
+    if faltando:
+        problemas.append(f"  índice(s) não usado(s): {', '.join(faltando)}")
+    if problemas:
+        raise AssertionError("Consultas sem índice:\n" + '\n'.join(problemas))
+
 
 class BaseModel(db.Model):
     """Modelo base abstrato com utilitários comuns, sem impor campos."""
     __abstract__ = True
 
-    def save(self):
-        """Salva o objeto no banco de dados."""
+    def save(self, commit=True):
+        """Salva o objeto no banco de dados.
+
+        Com commit=False (ou dentro de unit_of_work) só faz flush: o objeto
+        ganha id, mas a gravação fica para o commit da transação.
+        """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
         return self
 
-    def delete(self):
-        """Remove o objeto do banco de dados."""
+    def delete(self, commit=True):
+        """Remove o objeto do banco de dados (commit=False: só flush)."""
         db.session.delete(self)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
 
     def to_dict(self, exclude_fields=None):
         """Converte o objeto para dicionário."""
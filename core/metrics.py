@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Metrics
+Instrumentação de cada requisição: tempo total, tempo e número de consultas
+SQL, linhas lidas do banco e tempo de render dos templates (eventos
+before/after_cursor_execute do SQLAlchemy e sinais do Flask).
+
+- Consultas acima de SLOW_QUERY_MS vão para o log com os tipos dos
+  parâmetros (nunca os valores: senhas, telefones...) e o método (de
+  serviço, de preferência) que as disparou; vale também na CLI.
+- Requisições acima de SLOW_REQUEST_MS são logadas com o resumo.
+- Acumulado por endpoint no worker: GET /api/requests/stats.
+- Com SERVER_TIMING (padrão em desenvolvimento), cabeçalho Server-Timing na
+  resposta, exibido pelo DevTools do navegador (aba Network > Timing).
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+from flask import (before_render_template, g, has_app_context, request, request_finished,
+                   request_started, template_rendered)
+from sqlalchemy import event
+from core.database import db
+
+RAIZ = str(Path(__file__).resolve().parent.parent)
+# Módulos do projeto que só repassam consultas: nunca são a origem no log
+_INTERMEDIARIOS = ('core/metrics.py', 'core/database.py')
+# Início das consultas em andamento, em connection.info
+_INICIOS_KEY = 'metricas_inicio'
+# Tamanho máximo da descrição dos parâmetros no log de consultas lentas
+MAX_PARAMS_LOG = 500
+
+
+class RequestMetrics:
+    """Medidas da requisição em andamento (flask.g.request_metrics).
+
+    O tempo de template inclui as consultas disparadas durante o render
+    (ex.: lazy loads), que também contam no tempo de banco.
+    """
+    __slots__ = ('inicio', 'db_segundos', 'consultas', 'linhas',
+                 'template_segundos', 'templates', '_renders')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.db_segundos = 0.0
+        self.consultas = 0
+        self.linhas = 0
+        self.template_segundos = 0.0
+        self.templates = []
+        self._renders = []
+
+    def server_timing(self, total):
+        """Valor do cabeçalho Server-Timing (durações em ms)"""
+        return (f'db;dur={self.db_segundos * 1000:.1f};desc="{self.consultas} consultas, {self.linhas} linhas", '
+                f'tpl;dur={self.template_segundos * 1000:.1f};desc="templates", '
+                f'total;dur={total * 1000:.1f}')
+
+    def resumo(self, total):
+        return (f"{total * 1000:.1f} ms | banco {self.db_segundos * 1000:.1f} ms em "
+                f"{self.consultas} consultas, {self.linhas} linhas | templates "
+                f"{self.template_segundos * 1000:.1f} ms {self.templates}")
+
+
+class RequestStats:
+    """Acumulado por endpoint desde o início do processo"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, metricas, total):
+        with self._lock:
+            acumulado = self._metricas.setdefault(endpoint, [0, 0.0, 0.0, 0.0, 0, 0, 0.0])
+            acumulado[0] += 1
+            acumulado[1] += total
+            acumulado[2] = max(acumulado[2], total)
+            acumulado[3] += metricas.db_segundos
+            acumulado[4] += metricas.consultas
+            acumulado[5] += metricas.linhas
+            acumulado[6] += metricas.template_segundos
+
+    def reset(self):
+        with self._lock:
+            self._metricas.clear()
+
+    def stats(self):
+        """Lista por tempo total decrescente (médias por requisição)"""
+        with self._lock:
+            itens = [(endpoint, *acumulado) for endpoint, acumulado in self._metricas.items()]
+        return [
+            {
+                'endpoint': endpoint,
+                'requisicoes': n,
+                'total_ms': round(total * 1000, 1),
+                'medio_ms': round(total * 1000 / n, 2),
+                'max_ms': round(maximo * 1000, 2),
+                'db_medio_ms': round(banco * 1000 / n, 2),
+                'consultas_media': round(consultas / n, 1),
+                'linhas_media': round(linhas / n, 1),
+                'template_medio_ms': round(template * 1000 / n, 2),
+            }
+            for endpoint, n, total, maximo, banco, consultas, linhas, template
+            in sorted(itens, key=lambda item: -item[2])
+        ]
+
+
+class _CursorContado:
+    """Cursor DBAPI que conta as linhas entregues ao SQLAlchemy"""
+    __slots__ = ('_cursor', '_metricas')
+
+    def __init__(self, cursor, metricas):
+        self._cursor = cursor
+        self._metricas = metricas
+
+    def fetchone(self):
+        linha = self._cursor.fetchone()
+        if linha is not None:
+            self._metricas.linhas += 1
+        return linha
+
+    def fetchmany(self, *args):
+        linhas = self._cursor.fetchmany(*args)
+        self._metricas.linhas += len(linhas)
+        return linhas
+
+    def fetchall(self):
+        linhas = self._cursor.fetchall()
+        self._metricas.linhas += len(linhas)
+        return linhas
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+
+def current_metrics():
+    """RequestMetrics da requisição atual (None fora de requisição)"""
+    return g.get('request_metrics') if has_app_context() else None
+
+
+def _origem():
+    """'arquivo:linha Classe.metodo' de quem executou a consulta, subindo a
+    pilha até o código do projeto (services/ de preferência)"""
+    frame = sys._getframe(2)
+    primeira = None
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        relativo = arquivo[len(RAIZ) + 1:].replace('\\', '/')
+        if (arquivo.startswith(RAIZ) and relativo not in _INTERMEDIARIOS
+                and 'site-packages' not in relativo):
+            nome = getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+            local = f"{relativo}:{frame.f_lineno} {nome}"
+            if relativo.startswith('services/'):
+                return local
+            primeira = primeira or local
+        frame = frame.f_back
+    return primeira or '?'
+
+
+def _instrumentar_engine(engine, lenta_ms, logger):
+    if event.contains(engine, 'before_cursor_execute', _antes_da_consulta):
+        return
+
+    event.listen(engine, 'before_cursor_execute', _antes_da_consulta)
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get(_INICIOS_KEY)
+        if not inicios:
+            return
+        duracao = time.perf_counter() - inicios.pop()
+        metricas = current_metrics()
+        if metricas is not None:
+            metricas.db_segundos += duracao
+            metricas.consultas += 1
+            # SELECT/RETURNING: as linhas só são lidas depois deste evento
+            if (context is not None and not executemany and cursor.description is not None
+                    and not isinstance(context.cursor, _CursorContado)):
+                context.cursor = _CursorContado(context.cursor, metricas)
+        if lenta_ms and duracao * 1000 >= lenta_ms:
+            parametros = _descrever_parametros(parameters, executemany)
+            if len(parametros) > MAX_PARAMS_LOG:
+                parametros = parametros[:MAX_PARAMS_LOG] + '...'
+            logger.warning(f"Consulta lenta ({duracao * 1000:.1f} ms) em {_origem()}: "
+                           f"{' '.join(statement.split())} | parâmetros: {parametros}")
+
+    @event.listens_for(engine, 'handle_error')
+    def _consulta_falhou(contexto):
+        # after_cursor_execute não roda: descarta o início pendente
+        conexao = contexto.connection
+        if conexao is not None and conexao.info.get(_INICIOS_KEY):
+            conexao.info[_INICIOS_KEY].pop()
+
+
+def _descrever_parametros(parametros, executemany):
+    """Tipos dos parâmetros, sem os valores: '(int, str)' ou '{nome: str}'"""
+    if executemany:
+        primeira = parametros[0] if parametros else ()
+        return f"{len(parametros)} linhas × {_descrever_parametros(primeira, False)}"
+    if isinstance(parametros, dict):
+        return '{' + ', '.join(f"{nome}: {type(valor).__name__}" for nome, valor in parametros.items()) + '}'
+    return '(' + ', '.join(type(valor).__name__ for valor in parametros or ()) + ')'
+
+
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_INICIOS_KEY, []).append(time.perf_counter())
+
+
+def _iniciar_requisicao(sender, **extra):
+    g.request_metrics = RequestMetrics()
+
+
+def _antes_do_render(sender, template, context, **extra):
+    metricas = current_metrics()
+    if metricas is not None:
+        metricas._renders.append(time.perf_counter())
+        metricas.templates.append(template.name)
+
+
+def _depois_do_render(sender, template, context, **extra):
+    metricas = current_metrics()
+    if metricas is not None and metricas._renders:
+        duracao = time.perf_counter() - metricas._renders.pop()
+        if not metricas._renders:  # render aninhado já conta no de fora
+            metricas.template_segundos += duracao
+
+
+def _finalizar_requisicao(sender, response, **extra):
+    metricas = g.pop('request_metrics', None)
+    if metricas is None:
+        return
+    total = time.perf_counter() - metricas.inicio
+    sender.extensions['request_stats'].record(request.endpoint or '(sem rota)', metricas, total)
+    if sender.config.get('SERVER_TIMING'):
+        response.headers['Server-Timing'] = metricas.server_timing(total)
+    lenta_ms = sender.config.get('SLOW_REQUEST_MS')
+    if lenta_ms and total * 1000 >= lenta_ms:
+        sender.logger.warning(f"Requisição lenta: {request.method} {request.full_path.rstrip('?')} "
+                              f"→ {response.status_code} em {metricas.resumo(total)}")
+
+
+def init_metrics(app):
+    """Liga a medição por requisição (REQUEST_METRICS) e o log de consultas
+    lentas (SLOW_QUERY_MS) nos engines e nos sinais da app"""
+    por_requisicao = app.config.get('REQUEST_METRICS', True)
+    if por_requisicao or app.config.get('SLOW_QUERY_MS'):
+        with app.app_context():
+            for engine in db.engines.values():
+                _instrumentar_engine(engine, app.config.get('SLOW_QUERY_MS'), app.logger)
+    if not por_requisicao:
+        return
+    app.extensions['request_stats'] = RequestStats()
+    request_started.connect(_iniciar_requisicao, app)
+    before_render_template.connect(_antes_do_render, app)
+    template_rendered.connect(_depois_do_render, app)
+    request_finished.connect(_finalizar_requisicao, app)
+
+
+def get_request_stats(app):
+    """RequestStats da app (None com REQUEST_METRICS desligado)"""
+    return app.extensions.get('request_stats')
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Migrations
+Migrações versionadas do esquema: scripts migrations/NNNN_nome.py com uma
+função upgrade(connection), aplicadas em ordem por `flask semapa db upgrade`
+e registradas na tabela schema_version.
+
+Cada migração roda numa transação exclusiva (BEGIN IMMEDIATE no SQLite,
+advisory lock no PostgreSQL) que também grava a versão: vários processos
+rodando upgrade ao mesmo tempo aplicam cada script uma única vez.
+"""
+
+import importlib
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from core.database import db
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'migrations'
+MIGRATIONS_PACKAGE = 'migrations'
+_ARQUIVO = re.compile(r'^(\d{4})_(\w+)\.py$')
+# Chave do pg_advisory_xact_lock das migrações
+PG_LOCK_KEY = 0x53454D41
+# Com o esquema desatualizado (modo 'error'), intervalo entre reconferências
+SCHEMA_RECHECK_SECONDS = 5
+
+# Fora de db.metadata: quem cria e mantém é o próprio runner
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('versao', Integer, primary_key=True, autoincrement=False),
+    Column('nome', String(100), nullable=False),
+    Column('aplicada_em', DateTime, nullable=False),
+)
+
+
+def available():
+    """[(versao, nome)] dos scripts em migrations/, em ordem (sem importá-los)"""
+    scripts = []
+    for arquivo in MIGRATIONS_DIR.iterdir():
+        casamento = _ARQUIVO.match(arquivo.name)
+        if casamento:
+            scripts.append((int(casamento.group(1)), casamento.group(2)))
+    return sorted(scripts)
+
+
+def head():
+    """Versão do script mais recente"""
+    scripts = available()
+    return scripts[-1][0] if scripts else 0
+
+
+def current_version(connection):
+    """Última versão aplicada no banco (0 sem a tabela schema_version)"""
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(select(func.max(schema_version.c.versao))).scalar() or 0
+
+
+def add_columns(connection, tabela, colunas):
+    """ALTER TABLE ... ADD COLUMN para cada {nome: tipo SQL} de `colunas` que
+    a tabela ainda não tenha (create_all não altera tabelas existentes).
+    Só colunas anuláveis e sem default. Retorna os nomes adicionados."""
+    existentes = {coluna['name'] for coluna in inspect(connection).get_columns(tabela)}
+    adicionadas = []
+    for nome, tipo in colunas.items():
+        if nome not in existentes:
+            connection.exec_driver_sql(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+            adicionadas.append(nome)
+    return adicionadas
+
+
+def _carregar(versao, nome):
+    return importlib.import_module(f'{MIGRATIONS_PACKAGE}.{versao:04d}_{nome}')
+
+
+@contextmanager
+def _transacao_exclusiva(engine):
+    """Conexão numa transação que só um processo por vez consegue abrir"""
+    if engine.dialect.name == 'sqlite':
+        # O pysqlite não envolve DDL na transação implícita: controla o
+        # BEGIN à mão para que a migração inteira seja atômica
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                if connection.connection.dbapi_connection.in_transaction:
+                    connection.exec_driver_sql('ROLLBACK')
+                raise
+            connection.exec_driver_sql('COMMIT')
+        return
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:chave)'), {'chave': PG_LOCK_KEY})
+        yield connection
+
+
+def _registrar(connection, versao, nome):
+    connection.execute(schema_version.insert().values(
+        versao=versao, nome=nome, aplicada_em=datetime.utcnow()
+    ))
+
+
+def upgrade(alvo=None, engine=None, log=print):
+    """Aplica as migrações pendentes até `alvo` (padrão: a mais recente).
+
+    Banco vazio: a 0001 cria o esquema atual dos models de uma vez e as
+    demais são só registradas, como já contidas nele. Banco criado pelo
+    antigo db.create_all() (tabelas sem schema_version): roda todas a
+    partir da 0001, que cria apenas o que faltar. Retorna as versões aplicadas.
+    """
+    engine = engine or db.engine
+    scripts = [(v, n) for v, n in available() if alvo is None or v <= alvo]
+    aplicadas = []
+    for indice, (versao, nome) in enumerate(scripts):
+        with _transacao_exclusiva(engine) as connection:
+            # Relido sob o lock: outro processo pode ter acabado de aplicar
+            if current_version(connection) >= versao:
+                continue
+            vazio = versao == 1 and not inspect(connection).get_table_names()
+            schema_version.create(connection, checkfirst=True)
+            log(f"→ {versao:04d}_{nome}")
+            _carregar(versao, nome).upgrade(connection)
+            _registrar(connection, versao, nome)
+            aplicadas.append(versao)
+            if vazio:
+                for seguinte, nome_seguinte in scripts[indice + 1:]:
+                    _registrar(connection, seguinte, nome_seguinte)
+                    aplicadas.append(seguinte)
+                log(f"  banco novo: {len(scripts) - 1} migração(ões) seguinte(s) já contida(s) no esquema")
+                break
+    return aplicadas
+
+
+def status(engine=None):
+    """(versão atual, versão mais recente, [(versao, nome, aplicada_em)])"""
+    engine = engine or db.engine
+    with engine.connect() as connection:
+        atual = current_version(connection)
+        historico = connection.execute(
+            select(schema_version).order_by(schema_version.c.versao)
+        ).all() if atual else []
+    return atual, head(), [tuple(linha) for linha in historico]
+
+
+def check_schema(app):
+    """Verificação barata da inicialização: compara a versão do banco com a
+    dos scripts. Conforme DB_SCHEMA_CHECK:
+
+    - 'upgrade': aplica as pendentes (desenvolvimento; seguro com vários processos)
+    - 'error': loga e responde 503 até alguém rodar `flask semapa db upgrade`
+      (reconfere a cada SCHEMA_RECHECK_SECONDS, sem reiniciar os workers)
+    - 'warn': só loga
+    """
+    modo = app.config.get('DB_SCHEMA_CHECK', 'error')
+    mais_recente = head()
+    with db.engine.connect() as connection:
+        atual = current_version(connection)
+    if atual >= mais_recente:
+        return atual
+    if modo == 'upgrade':
+        upgrade(log=app.logger.info)
+        return mais_recente
+
+    mensagem = (f"Esquema do banco na versão {atual}, esperada {mais_recente}: "
+                f"rode `flask semapa db upgrade`")
+    app.logger.error(mensagem)
+    if modo == 'error':
+        from flask import abort
+        estado = {'ok': False, 'conferido_em': time.monotonic()}
+
+        @app.before_request
+        def _esquema_desatualizado():
+            if estado['ok']:
+                return
+            if time.monotonic() - estado['conferido_em'] >= SCHEMA_RECHECK_SECONDS:
+                estado['conferido_em'] = time.monotonic()
+                with db.engine.connect() as connection:
+                    estado['ok'] = current_version(connection) >= mais_recente
+                if estado['ok']:
+                    return
+            abort(503, description=mensagem)
+    return atual
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Preload
+Modo preload para vários workers (gunicorn --preload, ver config/gunicorn.py):
+a app é montada e aquecida uma vez no processo mestre e os workers a herdam
+por fork, compartilhando as páginas de memória enquanto ninguém escreve
+nelas (copy-on-write).
+"""
+
+import gc
+from sqlalchemy.orm import configure_mappers
+from core.database import db
+from core.templates import precompile_templates
+
+
+def warm_up(app):
+    """Carrega no mestre o que cada worker carregaria na primeira requisição:
+    controllers e rotas, mapeamentos do ORM, templates e módulos adiados."""
+    from app import register_blueprints
+
+    register_blueprints(app)
+    configure_mappers()
+    with app.app_context():
+        _, falhas = precompile_templates(app)
+    for nome, erro in falhas:
+        app.logger.error(f"Template {nome} não compila: {erro}")
+
+    # Imports adiados no modo normal; no mestre ficam compartilhados
+    import bcrypt  # noqa: F401
+    try:
+        from PIL import Image  # noqa: F401
+    except ImportError:
+        pass
+
+
+def before_fork(app):
+    """Última etapa no mestre, antes de criar os workers.
+
+    Fecha as conexões do pool (um socket ou arquivo SQLite herdado seria
+    usado por dois processos) e congela o heap: gc.freeze() move os objetos
+    atuais para a geração permanente, que o coletor dos workers não percorre
+    — percorrer também escreve nos cabeçalhos dos objetos e desfaria o
+    compartilhamento das páginas.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork(app):
+    """No worker recém-criado: garante pools vazios, sem tocar em conexões
+    que ainda pertençam ao mestre (close=False)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
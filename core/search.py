@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Search
+Índice de busca textual único para várias entidades: FTS5 no SQLite e
+tsvector + GIN no PostgreSQL. Acentos e maiúsculas são ignorados
+("remoção" encontra "remocao").
+"""
+
+import re
+import unicodedata
+from types import SimpleNamespace
+from sqlalchemy import DDL, Integer, event, inspect, or_, text
+from sqlalchemy.orm import Session
+from core.database import db
+
+# classe do modelo -> (entidade, código, atributo do título, atributos indexados)
+_entidades = {}
+# URL do engine -> índice disponível?
+_disponivel = {}
+
+MAX_TERMOS = 8
+# No FTS5 o rowid é ref_id * ROWID_ENTIDADES + código da entidade, para que
+# atualizar/apagar um documento não exija varrer as colunas UNINDEXED
+ROWID_ENTIDADES = 16
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS busca_fts USING fts5("
+    "entidade UNINDEXED, ref_id UNINDEXED, titulo, conteudo, "
+    "tokenize = 'unicode61 remove_diacritics 2')",
+]
+
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS busca_indice ("
+    "entidade VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, titulo TEXT, "
+    "conteudo TEXT, documento TSVECTOR NOT NULL, PRIMARY KEY (entidade, ref_id))",
+    "CREATE INDEX IF NOT EXISTS ix_busca_indice_documento ON busca_indice USING GIN (documento)",
+]
+
+for _ddl in SQLITE_DDL:
+    event.listen(db.metadata, 'after_create', DDL(_ddl).execute_if(dialect='sqlite'))
+for _ddl in POSTGRES_DDL:
+    event.listen(db.metadata, 'after_create', DDL(_ddl).execute_if(dialect='postgresql'))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _limpar_disponibilidade(target, connection, **kw):
+    _disponivel.pop(str(connection.engine.url), None)
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos"""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def termos(consulta):
+    """Palavras da consulta, normalizadas (no máximo MAX_TERMOS)"""
+    return re.findall(r'\w+', normalizar(consulta))[:MAX_TERMOS]
+
+
+def registrar_busca(modelo, entidade, codigo, titulo, campos):
+    """Inclui o modelo no índice.
+
+    `codigo` é um inteiro fixo e único por entidade (1 a 15); `titulo` e
+    `campos` são nomes de atributos do modelo.
+    """
+    assert 0 < codigo < ROWID_ENTIDADES
+    _entidades[modelo] = (entidade, codigo, titulo, tuple(campos))
+
+
+def busca_disponivel(connection=None):
+    """Indica se o banco possui o índice de busca (cacheado por engine)"""
+    engine = connection.engine if connection is not None else db.engine
+    chave = str(engine.url)
+    if chave not in _disponivel:
+        dialeto = engine.dialect.name
+        if dialeto == 'sqlite':
+            sql = text("SELECT 1 FROM sqlite_master WHERE name = 'busca_fts'")
+            if connection is not None:
+                existe = connection.execute(sql).first() is not None
+            else:
+                with engine.connect() as conn:
+                    existe = conn.execute(sql).first() is not None
+        elif dialeto == 'postgresql':
+            existe = inspect(connection if connection is not None else engine).has_table('busca_indice')
+        else:
+            existe = False
+        _disponivel[chave] = existe
+    return _disponivel[chave]
+
+
+def _chave(obj, modelo=None):
+    entidade, codigo = _entidades[modelo or type(obj)][:2]
+    return {'entidade': entidade, 'ref_id': obj.id, 'rowid': obj.id * ROWID_ENTIDADES + codigo}
+
+
+def _documento(obj, modelo=None):
+    entidade, codigo, titulo, campos = _entidades[modelo or type(obj)]
+    valores = [getattr(obj, campo, None) for campo in campos]
+    conteudo = ' '.join(normalizar(v) for v in valores if v not in (None, ''))
+    return {
+        **_chave(obj, modelo),
+        'titulo': getattr(obj, titulo, None),
+        'titulo_norm': normalizar(getattr(obj, titulo, None)),
+        'conteudo': conteudo,
+    }
+
+
+def _sql(dialeto):
+    if dialeto == 'postgresql':
+        apagar = "DELETE FROM busca_indice WHERE entidade = :entidade AND ref_id = :ref_id"
+        inserir = (
+            "INSERT INTO busca_indice (entidade, ref_id, titulo, conteudo, documento) "
+            "VALUES (:entidade, :ref_id, :titulo, :conteudo, "
+            "setweight(to_tsvector('simple', :titulo_norm), 'A') || "
+            "setweight(to_tsvector('simple', :conteudo), 'B'))"
+        )
+    else:
+        apagar = "DELETE FROM busca_fts WHERE rowid = :rowid"
+        inserir = (
+            "INSERT INTO busca_fts (rowid, entidade, ref_id, titulo, conteudo) "
+            "VALUES (:rowid, :entidade, :ref_id, :titulo, :conteudo)"
+        )
+    return text(apagar), text(inserir)
+
+
+def _campos_alterados(obj):
+    entidade, codigo, titulo, campos = _entidades[type(obj)]
+    estado = inspect(obj)
+    return any(estado.attrs[campo].history.has_changes() for campo in (titulo,) + campos)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sincronizar(session, flush_context):
+    """Atualiza o índice na mesma transação do flush"""
+    alterados = [o for o in session.new if type(o) in _entidades]
+    alterados += [o for o in session.dirty if type(o) in _entidades and _campos_alterados(o)]
+    removidos = [o for o in session.deleted if type(o) in _entidades]
+    if not alterados and not removidos:
+        return
+
+    connection = session.connection()
+    if not busca_disponivel(connection):
+        return
+    apagar, inserir = _sql(connection.dialect.name)
+    for obj in removidos:
+        connection.execute(apagar, _chave(obj))
+    documentos = [_documento(o) for o in alterados]
+    if documentos:
+        connection.execute(apagar, documentos)
+        connection.execute(inserir, documentos)
+
+
+def indexar(modelo, registros, connection=None):
+    """Indexa linhas novas gravadas fora do ORM (ex.: INSERT em lote).
+
+    `registros` são dicionários com 'id' e os campos indexados do modelo.
+    """
+    connection = connection if connection is not None else db.session.connection()
+    if modelo not in _entidades or not registros or not busca_disponivel(connection):
+        return
+    _, inserir = _sql(connection.dialect.name)
+    connection.execute(inserir, [_documento(SimpleNamespace(**r), modelo) for r in registros])
+
+
+def reconstruir_indice(batch_size=1000):
+    """Apaga e repopula o índice a partir das tabelas. Retorna o total indexado."""
+    connection = db.session.connection()
+    dialeto = connection.dialect.name
+    if dialeto not in ('sqlite', 'postgresql'):
+        raise RuntimeError("Índice de busca requer SQLite (FTS5) ou PostgreSQL")
+    for sql in (POSTGRES_DDL if dialeto == 'postgresql' else SQLITE_DDL):
+        connection.execute(text(sql))
+    _disponivel.clear()
+
+    connection.execute(text('DELETE FROM busca_indice' if dialeto == 'postgresql' else 'DELETE FROM busca_fts'))
+    _, inserir = _sql(dialeto)
+
+    total = 0
+    for modelo in _entidades:
+        lote = []
+        for obj in modelo.query.order_by(modelo.id).yield_per(batch_size):
+            lote.append(_documento(obj))
+            if len(lote) >= batch_size:
+                connection.execute(inserir, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            connection.execute(inserir, lote)
+            total += len(lote)
+    db.session.commit()
+    return total
+
+
+def _consulta(dialeto, palavras):
+    if dialeto == 'postgresql':
+        return ' & '.join(f'{p}:*' for p in palavras)
+    return ' '.join(f'"{p}"*' for p in palavras)
+
+
+def filtro_busca(modelo, consulta, *colunas):
+    """Expressão para filtrar `modelo` pelo texto: usa o índice quando houver,
+    senão cai num ILIKE nas `colunas` informadas"""
+    palavras = termos(consulta)
+    if palavras and modelo in _entidades and busca_disponivel():
+        dialeto = db.engine.dialect.name
+        if dialeto == 'postgresql':
+            sql = ("SELECT ref_id FROM busca_indice WHERE entidade = :entidade "
+                   "AND documento @@ to_tsquery('simple', :consulta)")
+        else:
+            sql = ("SELECT ref_id FROM busca_fts WHERE busca_fts MATCH :consulta "
+                   "AND entidade = :entidade")
+        ids = text(sql).bindparams(
+            entidade=_entidades[modelo][0], consulta=_consulta(dialeto, palavras)
+        ).columns(ref_id=Integer)
+        return modelo.id.in_(ids)
+    return or_(*[coluna.ilike(f'%{consulta}%') for coluna in colunas])
+
+
+def buscar(consulta, limit=20, entidades=None):
+    """Busca ranqueada em todas as entidades numa única consulta.
+
+    Retorna [{'entidade', 'id', 'titulo', 'score'}], mais relevantes primeiro.
+    """
+    palavras = termos(consulta)
+    if not palavras or not busca_disponivel():
+        return []
+
+    dialeto = db.engine.dialect.name
+    params = {'consulta': _consulta(dialeto, palavras), 'limit': limit}
+    filtro = ''
+    if entidades:
+        marcadores = []
+        for i, entidade in enumerate(entidades):
+            params[f'e{i}'] = entidade
+            marcadores.append(f':e{i}')
+        filtro = f" AND entidade IN ({', '.join(marcadores)})"
+
+    if dialeto == 'postgresql':
+        sql = ("SELECT entidade, ref_id, titulo, ts_rank(documento, q) AS score "
+               "FROM busca_indice, to_tsquery('simple', :consulta) AS q "
+               f"WHERE documento @@ q{filtro} ORDER BY score DESC LIMIT :limit")
+    else:
+        # bm25 é negativo (menor = melhor); o título pesa 10x o conteúdo
+        sql = ("SELECT entidade, ref_id, titulo, -bm25(busca_fts, 0, 0, 10.0, 1.0) AS score "
+               f"FROM busca_fts WHERE busca_fts MATCH :consulta{filtro} "
+               "ORDER BY score DESC LIMIT :limit")
+
+    linhas = db.session.execute(text(sql), params)
+    return [
+        {'entidade': e, 'id': int(ref_id), 'titulo': titulo, 'score': round(float(score), 4)}
+        for e, ref_id, titulo, score in linhas
+    ]
@@ -9,7 +9,6 @@ from flask_wtf.csrf import CSRFProtect
 from functools import wraps
 from flask import abort
 from flask_login import current_user
-import bcrypt  # MUDANÇA: Usar bcrypt em vez de werkzeug
 
 # Instâncias globais
 login_manager = LoginManager()
@@ -44,10 +43,12 @@ class SecurityMixin:
     
     def hash_password(self, password):
         """CORRIGIDO: Usa bcrypt para compatibilidade com banco legado"""
+        import bcrypt  # só nos caminhos de autenticação (fora da inicialização)
         return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
     
     def check_password(self, password):
         """CORRIGIDO: Usa bcrypt para verificar senha"""
+        import bcrypt
         try:
             return bcrypt.checkpw(password.encode(), self.password.encode())
         except Exception:
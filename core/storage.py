@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Storage
+Armazenamento de arquivos (blobs) endereçado por conteúdo (SHA-256)
+
+Conteúdos idênticos viram um único blob, compartilhado por todas as fotos
+com o mesmo sha256; por isso os backends não removem blobs.
+"""
+
+import hashlib
+import io
+import mimetypes
+import os
+import tempfile
+import unicodedata
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import quote
+
+CHUNK_SIZE = 64 * 1024
+
+# Assinaturas de formatos de imagem comuns (primeiros bytes)
+_ASSINATURAS = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF', 'application/pdf'),
+]
+
+
+def detect_mime_type(nome=None, cabecalho=b''):
+    """Descobre o mime type pelos bytes iniciais e, na falta, pelo nome do arquivo"""
+    for assinatura, mime in _ASSINATURAS:
+        if cabecalho.startswith(assinatura):
+            return mime
+    if cabecalho[:4] == b'RIFF' and cabecalho[8:12] == b'WEBP':
+        return 'image/webp'
+    if nome:
+        mime, _ = mimetypes.guess_type(nome)
+        if mime:
+            return mime
+    return 'application/octet-stream'
+
+
+class BlobStore(ABC):
+    """Interface do armazenamento de blobs endereçados por SHA-256"""
+
+    @abstractmethod
+    def put(self, stream):
+        """Grava o conteúdo de `stream` (bytes ou file-like). Retorna (sha256, tamanho)."""
+
+    @abstractmethod
+    def open(self, sha256):
+        """Abre o blob para leitura binária (file-like)"""
+
+    @abstractmethod
+    def exists(self, sha256):
+        """Indica se o blob está armazenado"""
+
+    def local_path(self, sha256):
+        """Caminho no disco, quando o backend for local; senão None"""
+        return None
+
+    def open_range(self, sha256, inicio):
+        """Abre o blob posicionado no byte `inicio`"""
+        arquivo = self.open(sha256)
+        _avancar(arquivo, inicio)
+        return arquivo
+
+    @staticmethod
+    def _as_stream(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return io.BytesIO(data)
+        return data
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs no sistema de arquivos, em <raiz>/ab/cd/<sha256>"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, sha256):
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def put(self, stream):
+        stream = self._as_stream(stream)
+        digest = hashlib.sha256()
+        tamanho = 0
+        # Grava num temporário da própria raiz (mesmo filesystem) e renomeia no final
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    tamanho += len(chunk)
+                    tmp.write(chunk)
+            sha256 = digest.hexdigest()
+            destino = self.local_path(sha256)
+            if destino.exists():
+                os.unlink(tmp_path)  # conteúdo idêntico já armazenado
+            else:
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, destino)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return sha256, tamanho
+
+    def open(self, sha256):
+        return open(self.local_path(sha256), 'rb')
+
+    def exists(self, sha256):
+        return self.local_path(sha256).exists()
+
+
+class S3BlobStore(BlobStore):
+    """Blobs num bucket S3 ou compatível (ex.: MinIO local via endpoint_url)"""
+
+    def __init__(self, bucket, endpoint_url=None, access_key=None, secret_key=None,
+                 region=None, prefix='blobs/'):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("Backend 's3' requer o pacote boto3 instalado") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region
+        )
+
+    def _key(self, sha256):
+        return f"{self.prefix}{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def put(self, stream):
+        stream = self._as_stream(stream)
+        # O hash precisa ser conhecido antes do upload: bufferiza em disco temporário
+        digest = hashlib.sha256()
+        tamanho = 0
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tamanho += len(chunk)
+                tmp.write(chunk)
+            sha256 = digest.hexdigest()
+            if not self.exists(sha256):
+                tmp.seek(0)
+                self.client.upload_fileobj(tmp, self.bucket, self._key(sha256))
+        return sha256, tamanho
+
+    def open(self, sha256):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(sha256))['Body']
+
+    def open_range(self, sha256, inicio):
+        if not inicio:
+            return self.open(sha256)
+        return self.client.get_object(
+            Bucket=self.bucket, Key=self._key(sha256), Range=f'bytes={inicio}-'
+        )['Body']
+
+    def exists(self, sha256):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(sha256))
+            return True
+        except ClientError:
+            return False
+
+
+def create_blob_store(config):
+    """Cria o backend configurado em BLOB_STORE_BACKEND ('local' ou 's3')"""
+    backend = config.get('BLOB_STORE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalBlobStore(config['BLOB_STORE_PATH'])
+    if backend == 's3':
+        return S3BlobStore(
+            bucket=config['BLOB_STORE_S3_BUCKET'],
+            endpoint_url=config.get('BLOB_STORE_S3_ENDPOINT'),
+            access_key=config.get('BLOB_STORE_S3_ACCESS_KEY'),
+            secret_key=config.get('BLOB_STORE_S3_SECRET_KEY'),
+            region=config.get('BLOB_STORE_S3_REGION')
+        )
+    raise ValueError(f"BLOB_STORE_BACKEND desconhecido: {backend}")
+
+
+def get_blob_store(app=None):
+    """Retorna o blob store da aplicação (criado uma vez por processo)"""
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+    store = app.extensions.get('blob_store')
+    if store is None:
+        store = app.extensions['blob_store'] = create_blob_store(app.config)
+    return store
+
+
+def _avancar(arquivo, inicio):
+    """Posiciona o file-like em `inicio`, lendo e descartando se não for seekable"""
+    if not inicio:
+        return
+    if getattr(arquivo, 'seekable', lambda: False)():
+        arquivo.seek(inicio)
+        return
+    restante = inicio
+    while restante > 0:
+        pulado = arquivo.read(min(CHUNK_SIZE, restante))
+        if not pulado:
+            break
+        restante -= len(pulado)
+
+
+def _iter_chunks(arquivo, restante):
+    try:
+        while restante > 0:
+            chunk = arquivo.read(min(CHUNK_SIZE, restante))
+            if not chunk:
+                break
+            restante -= len(chunk)
+            yield chunk
+    finally:
+        arquivo.close()
+
+
+def nome_para_download(nome):
+    """Nome original do upload sem caminho nem caracteres de controle
+    (pode vir qualquer coisa do navegador); None se nada sobrar"""
+    if not nome:
+        return None
+    nome = ''.join(c for c in nome if c.isprintable()).replace('\\', '/').rsplit('/', 1)[-1].strip()
+    return nome or None
+
+
+def set_content_disposition(response, nome, tipo='inline'):
+    """Content-Disposition com o nome sanitizado; nomes não ASCII vão
+    também em filename* (RFC 6266)"""
+    nome = nome_para_download(nome)
+    if not nome:
+        response.headers['Content-Disposition'] = tipo
+        return
+    ascii_ = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    opcoes = {'filename': ascii_ or 'arquivo'}
+    if ascii_ != nome:
+        opcoes['filename*'] = "UTF-8''" + quote(nome, safe="!#$&+-.^_`|~")
+    response.headers.set('Content-Disposition', tipo, **opcoes)
+
+
+def send_stream(abrir, tamanho, mimetype, etag=None, max_age=None, download_name=None):
+    """Resposta em streaming com suporte a Range e If-None-Match.
+
+    `abrir(inicio)` deve retornar um file-like posicionado no byte `inicio`.
+    """
+    from flask import request, Response
+    from werkzeug.datastructures import ContentRange
+
+    response = Response(mimetype=mimetype)
+    response.accept_ranges = 'bytes'
+    if etag:
+        response.set_etag(etag)
+        if max_age is not None:
+            response.cache_control.private = True
+            response.cache_control.max_age = max_age
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            return response
+    if download_name:
+        set_content_disposition(response, download_name)
+
+    inicio, fim = 0, tamanho
+    intervalo = request.range
+    if intervalo is not None and request.if_range.etag in (None, etag):
+        limites = intervalo.range_for_length(tamanho)
+        if limites is None:
+            response.status_code = 416
+            response.content_range = ContentRange('bytes', None, None, tamanho)
+            return response
+        inicio, fim = limites
+        response.status_code = 206
+        response.content_range = ContentRange('bytes', inicio, fim, tamanho)
+
+    response.response = _iter_chunks(abrir(inicio), fim - inicio)
+    response.content_length = fim - inicio
+    response.direct_passthrough = True
+    return response
+
+
+def send_blob(sha256, mimetype, tamanho, download_name=None, store=None):
+    """Serve um blob: delega ao nginx (X-Accel-Redirect) ou ao servidor (X-Sendfile)
+    quando configurado, senão transmite em pedaços com suporte a Range"""
+    from flask import current_app, request, send_file, Response
+
+    store = store or get_blob_store()
+    download_name = nome_para_download(download_name)
+    config = current_app.config
+    max_age = config.get('IMAGE_CACHE_MAX_AGE')
+    caminho = store.local_path(sha256)
+
+    if caminho is not None:
+        prefixo = config.get('BLOB_ACCEL_REDIRECT_PREFIX')
+        if prefixo:
+            # O nginx entrega o arquivo (inclusive Range); o worker não lê nada
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = (
+                prefixo.rstrip('/') + '/' + caminho.relative_to(store.root).as_posix()
+            )
+            response.set_etag(sha256)
+            response.cache_control.private = True
+            response.cache_control.max_age = max_age
+            return response.make_conditional(request)
+        # send_file usa X-Sendfile quando USE_X_SENDFILE está ligado
+        response = send_file(
+            caminho, mimetype=mimetype, conditional=True, etag=sha256,
+            max_age=max_age, download_name=download_name
+        )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+
+    return send_stream(
+        lambda inicio: store.open_range(sha256, inicio), tamanho, mimetype,
+        etag=sha256, max_age=max_age, download_name=download_name
+    )
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Core Templates
+Compilação antecipada dos templates Jinja e tempo de render por template.
+
+- Cache de bytecode em disco (TEMPLATE_CACHE_DIR), compartilhado pelos
+  workers: `flask semapa compile-templates` compila tudo no deploy e cada
+  worker só lê o código pronto em vez de compilar na primeira requisição.
+- Aquecimento: os templates de TEMPLATE_WARMUP (base, macros, navbar...)
+  são carregados em create_app.
+- Com TEMPLATE_TIMING, mede o tempo de cada template, bloco e macro
+  (GET /api/templates/stats) para achar o que pesa em shared/macros.html.
+"""
+
+import threading
+import time
+from pathlib import Path
+from jinja2 import FileSystemBytecodeCache, Template
+from jinja2.runtime import Macro
+
+
+class TemplateTimer:
+    """Tempo acumulado de render por chave, desde o início do processo.
+
+    Chaves: 'pasta/template.html' (render completo, incluindo o que ele
+    estende e inclui), 'template.html#bloco' e 'template.html:macro()'.
+    Os tempos são inclusivos: o de uma macro conta também as que ela chama.
+    """
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def record(self, chave, segundos):
+        with self._lock:
+            metrica = self._metricas.get(chave)
+            if metrica is None:
+                self._metricas[chave] = [1, segundos, segundos]
+            else:
+                metrica[0] += 1
+                metrica[1] += segundos
+                metrica[2] = max(metrica[2], segundos)
+
+    def reset(self):
+        with self._lock:
+            self._metricas.clear()
+
+    def stats(self):
+        """Lista por tempo total decrescente"""
+        with self._lock:
+            itens = [(chave, *metrica) for chave, metrica in self._metricas.items()]
+        return [
+            {
+                'nome': chave,
+                'renders': quantidade,
+                'total_ms': round(total * 1000, 3),
+                'medio_ms': round(total * 1000 / quantidade, 3),
+                'max_ms': round(maximo * 1000, 3),
+            }
+            for chave, quantidade, total, maximo in sorted(itens, key=lambda item: -item[2])
+        ]
+
+
+def _cronometrar(timer, chave, render):
+    """Envolve uma função de render do Jinja (um gerador de trechos de texto)
+    somando só o tempo gasto dentro dela, não o de quem consome os trechos"""
+    def medido(*args, **kwargs):
+        gerador = render(*args, **kwargs)
+        gasto = 0.0
+        try:
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    trecho = next(gerador)
+                except StopIteration:
+                    return
+                finally:
+                    gasto += time.perf_counter() - inicio
+                yield trecho
+        finally:
+            timer.record(chave, gasto)
+    return medido
+
+
+class _MacroCronometrada(Macro):
+    """Macro que registra o tempo de cada chamada (template e timer vêm da
+    subclasse criada em TimedTemplate._from_namespace)"""
+    template = None
+    timer = None
+
+    def _invoke(self, arguments, autoescape):
+        if self.name == 'caller':  # corpo do {% call %}: já conta para quem chamou
+            return super()._invoke(arguments, autoescape)
+        inicio = time.perf_counter()
+        try:
+            return super()._invoke(arguments, autoescape)
+        finally:
+            self.timer.record(f"{self.template}:{self.name}()", time.perf_counter() - inicio)
+
+
+class TimedTemplate(Template):
+    """Template cujas funções de render são cronometradas ao carregar.
+
+    Vale também para o que vem do cache de bytecode: o código é o mesmo, só
+    as funções do namespace são envolvidas. Sem timer no ambiente, é um
+    Template comum.
+    """
+
+    @classmethod
+    def _from_namespace(cls, environment, namespace, globals):
+        timer = getattr(environment, 'template_timer', None)
+        nome = namespace.get('name')
+        if timer is not None and nome:
+            namespace['root'] = _cronometrar(timer, nome, namespace['root'])
+            namespace['blocks'] = {
+                bloco: _cronometrar(timer, f"{nome}#{bloco}", render)
+                for bloco, render in namespace['blocks'].items()
+            }
+            # O código compilado cria as macros com o nome global `Macro`
+            namespace['Macro'] = type('Macro', (_MacroCronometrada,), {'template': nome, 'timer': timer})
+        return super()._from_namespace(environment, namespace, globals)
+
+
+def init_templates(app):
+    """Liga o cache de bytecode e a medição conforme a configuração e aquece
+    os templates mais usados. Chamar antes de qualquer render."""
+    env = app.jinja_env
+    diretorio = app.config.get('TEMPLATE_CACHE_DIR')
+    if diretorio:
+        try:
+            Path(diretorio).mkdir(parents=True, exist_ok=True)
+            env.bytecode_cache = FileSystemBytecodeCache(str(diretorio))
+        except OSError as e:
+            app.logger.warning(f"Cache de bytecode dos templates desligado ({diretorio}): {e}")
+
+    if app.config.get('TEMPLATE_TIMING'):
+        env.template_timer = app.extensions['template_timer'] = TemplateTimer()
+        env.template_class = TimedTemplate
+
+    for nome in app.config.get('TEMPLATE_WARMUP', ()):
+        try:
+            env.get_template(nome)
+        except Exception as e:
+            app.logger.warning(f"Template {nome} não aquecido: {e}")
+
+
+def get_template_timer(app):
+    """TemplateTimer da app (None com TEMPLATE_TIMING desligado)"""
+    return app.extensions.get('template_timer')
+
+
+def precompile_templates(app):
+    """Compila todos os templates .html (para o cache do ambiente e, se
+    houver, o de bytecode). Retorna (quantidade, [(nome, erro)])."""
+    nomes = [nome for nome in app.jinja_env.list_templates() if nome.endswith('.html')]
+    falhas = []
+    for nome in nomes:
+        try:
+            app.jinja_env.get_template(nome)
+        except Exception as e:
+            falhas.append((nome, e))
+    return len(nomes) - len(falhas), falhas
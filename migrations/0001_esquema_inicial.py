@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+Esquema inicial: tabelas dos models, índice de busca textual (busca_fts no
+SQLite, busca_indice no PostgreSQL) e R*Tree de árvores com seus triggers.
+
+Exceção à regra de não usar os models: é a linha de base. Em banco vazio
+cria o esquema atual inteiro (as migrações seguintes ficam só registradas);
+em banco do antigo db.create_all() cria apenas as tabelas que faltam.
+"""
+
+
+def upgrade(connection):
+    import models  # noqa: F401 - registra as tabelas em db.metadata
+    from core.database import db
+
+    db.metadata.create_all(connection)
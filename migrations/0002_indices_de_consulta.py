@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Colunas e índices das consultas em bancos criados antes das migrações
+(create_all não altera tabelas existentes). Primeiro as colunas novas de
+tabelas antigas, com as coordenadas numéricas das árvores preenchidas a
+partir do texto e tamanho/tipo das fotos ainda gravadas no banco; depois os
+índices: chaves estrangeiras, busca por prefixo
+em lower(), paginação por cursor e os compostos filtro + ordem das
+listagens. Remove os índices simples cobertos pelos compostos e, no SQLite,
+cria e preenche o R*Tree de árvores.
+"""
+
+from sqlalchemy import text
+from core.migrations import add_columns
+from core.storage import detect_mime_type
+
+# Colunas acrescentadas a tabelas que já existiam no esquema original
+COLUNAS = {
+    'arvores': {'latitude_num': 'FLOAT', 'longitude_num': 'FLOAT'},
+    'vistoria_foto': {'sha256': 'VARCHAR(64)', 'tamanho': 'INTEGER', 'mime_type': 'VARCHAR(100)'},
+}
+
+INDICES = [
+    "ix_especies_nome_cientifico ON especies (nome_cientifico)",
+    "ix_especies_nome_cientifico_lower ON especies (lower(nome_cientifico))",
+    "ix_especies_nome_popular_lower ON especies (lower(nome_popular))",
+    "ix_users_nome_lower ON users (lower(nome))",
+    "ix_arvores_endereco_id ON arvores (endereco, id)",
+    "ix_arvores_endereco_lower ON arvores (lower(endereco))",
+    "ix_arvores_bairro_endereco_id ON arvores (bairro, endereco, id)",
+    "ix_arvores_especie_endereco_id ON arvores (especie_id, endereco, id)",
+    "ix_arvores_lat_lng ON arvores (latitude_num, longitude_num)",
+    "ix_ordens_servico_data_emissao_id ON ordens_servico (data_emissao, id)",
+    "ix_ordens_servico_status_data_emissao_id ON ordens_servico (status, data_emissao, id)",
+    "ix_requerentes_nome_id ON requerentes (nome, id)",
+    "ix_requerentes_nome_lower ON requerentes (lower(nome))",
+    "ix_requerimentos_arvore_id ON requerimentos (arvore_id)",
+    "ix_requerimentos_data_abertura_id ON requerimentos (data_abertura, id)",
+    "ix_requerimentos_status_data_abertura_id ON requerimentos (status, data_abertura, id)",
+    "ix_requerimentos_tipo_data_abertura_id ON requerimentos (tipo, data_abertura, id)",
+    "ix_requerimentos_requerente_data_abertura_id ON requerimentos (requerente_id, data_abertura, id)",
+    "ix_ordem_servico_requerimento_requerimento_id ON ordem_servico_requerimento (requerimento_id)",
+    "ix_vistoria_requerimento_id ON vistoria (requerimento_id)",
+    "ix_vistoria_data_id ON vistoria (vistoria_data, id)",
+    "ix_vistoria_status_data_id ON vistoria (status, vistoria_data, id)",
+    "ix_vistoria_user_data_id ON vistoria (user_id, vistoria_data, id)",
+    "ix_vistoria_foto_vistoria_id ON vistoria_foto (vistoria_id)",
+    "ix_vistoria_foto_sha256 ON vistoria_foto (sha256)",
+]
+
+# Cobertos pelos compostos (requerente_id, ...) e (especie_id, ...)
+OBSOLETOS = ['ix_requerimentos_requerente_id', 'ix_arvores_especie_id']
+
+ARVORES_RTREE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS arvores_rtree "
+    "USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    "CREATE TRIGGER IF NOT EXISTS arvores_rtree_ai AFTER INSERT ON arvores "
+    "WHEN new.latitude_num IS NOT NULL AND new.longitude_num IS NOT NULL BEGIN "
+    "INSERT INTO arvores_rtree VALUES (new.id, new.latitude_num, new.latitude_num, "
+    "new.longitude_num, new.longitude_num); END",
+    "CREATE TRIGGER IF NOT EXISTS arvores_rtree_au AFTER UPDATE OF latitude_num, longitude_num "
+    "ON arvores BEGIN "
+    "DELETE FROM arvores_rtree WHERE id = old.id; "
+    "INSERT INTO arvores_rtree SELECT new.id, new.latitude_num, new.latitude_num, "
+    "new.longitude_num, new.longitude_num "
+    "WHERE new.latitude_num IS NOT NULL AND new.longitude_num IS NOT NULL; END",
+    "CREATE TRIGGER IF NOT EXISTS arvores_rtree_ad AFTER DELETE ON arvores BEGIN "
+    "DELETE FROM arvores_rtree WHERE id = old.id; END",
+    "INSERT INTO arvores_rtree "
+    "SELECT id, latitude_num, latitude_num, longitude_num, longitude_num FROM arvores "
+    "WHERE latitude_num IS NOT NULL AND longitude_num IS NOT NULL "
+    "AND id NOT IN (SELECT id FROM arvores_rtree)",
+]
+
+
+def _numero(valor):
+    """Mesma regra de Arvore._sync_coordenada_numerica"""
+    try:
+        return float(valor) if valor not in (None, '') else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _preencher_coordenadas(connection, lote=1000):
+    """latitude_num/longitude_num das árvores gravadas antes da cópia numérica"""
+    valores = []
+    for id, latitude, longitude in connection.exec_driver_sql(
+        "SELECT id, latitude, longitude FROM arvores "
+        "WHERE latitude_num IS NULL AND longitude_num IS NULL "
+        "AND (latitude IS NOT NULL OR longitude IS NOT NULL)"
+    ):
+        lat, lng = _numero(latitude), _numero(longitude)
+        if lat is not None or lng is not None:
+            valores.append({'id': id, 'lat': lat, 'lng': lng})
+    atualizar = text("UPDATE arvores SET latitude_num = :lat, longitude_num = :lng WHERE id = :id")
+    for inicio in range(0, len(valores), lote):
+        connection.execute(atualizar, valores[inicio:inicio + lote])
+
+
+def _preencher_fotos(connection, lote=1000):
+    """tamanho e mime_type das fotos legadas (bytes em vistoria_foto.arquivo),
+    lendo só o tamanho e os primeiros bytes de cada uma; sha256 fica vazio
+    até `flask semapa migrate-fotos` movê-las para o blob store"""
+    valores = [
+        {'id': id, 'tamanho': tamanho or 0, 'mime': detect_mime_type(nome, bytes(cabecalho or b''))}
+        for id, nome, tamanho, cabecalho in connection.exec_driver_sql(
+            "SELECT id, arquivo_nome, length(arquivo), substr(arquivo, 1, 16) FROM vistoria_foto "
+            "WHERE sha256 IS NULL AND tamanho IS NULL"
+        )
+    ]
+    atualizar = text("UPDATE vistoria_foto SET tamanho = :tamanho, mime_type = :mime WHERE id = :id")
+    for inicio in range(0, len(valores), lote):
+        connection.execute(atualizar, valores[inicio:inicio + lote])
+
+
+def upgrade(connection):
+    for tabela, colunas in COLUNAS.items():
+        add_columns(connection, tabela, colunas)
+    _preencher_coordenadas(connection)
+    _preencher_fotos(connection)
+    for indice in INDICES:
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {indice}")
+    for nome in OBSOLETOS:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {nome}")
+    if connection.dialect.name == 'sqlite':
+        for comando in ARVORES_RTREE:
+            connection.exec_driver_sql(comando)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Busca por prefixo sem acentos nos campos de seleção remota (LookupService):
+colunas *_busca com o texto em minúsculas e sem acentos (core.search.normalizar),
+preenchidas a partir do original e indexadas no lugar dos antigos índices de
+lower(), que só ignoravam maiúsculas ("ipe" não encontrava "Ipê").
+"""
+
+from sqlalchemy import text
+from core.migrations import add_columns
+from core.search import normalizar
+
+# tabela -> {coluna de busca: (coluna original, tipo SQL)}
+COLUNAS = {
+    'requerentes': {'nome_busca': ('nome', 'VARCHAR(100)')},
+    'arvores': {'endereco_busca': ('endereco', 'VARCHAR(200)')},
+    'especies': {
+        'nome_popular_busca': ('nome_popular', 'VARCHAR(100)'),
+        'nome_cientifico_busca': ('nome_cientifico', 'VARCHAR(150)'),
+    },
+    'users': {'nome_busca': ('nome', 'VARCHAR(100)')},
+}
+
+INDICES = [
+    "ix_requerentes_nome_busca ON requerentes (nome_busca, id)",
+    "ix_arvores_endereco_busca ON arvores (endereco_busca, id)",
+    "ix_especies_nome_popular_busca ON especies (nome_popular_busca)",
+    "ix_especies_nome_cientifico_busca ON especies (nome_cientifico_busca)",
+    "ix_users_nome_busca ON users (nome_busca, id)",
+]
+
+# Substituídos pelos índices das colunas *_busca
+OBSOLETOS = [
+    'ix_requerentes_nome_lower', 'ix_arvores_endereco_lower', 'ix_especies_nome_popular_lower',
+    'ix_especies_nome_cientifico_lower', 'ix_users_nome_lower',
+]
+
+
+def _preencher(connection, tabela, destino, origem, lote=1000):
+    """destino = normalizar(origem) nas linhas ainda sem a coluna de busca"""
+    valores = [
+        {'id': id, 'valor': normalizar(valor) or None}
+        for id, valor in connection.exec_driver_sql(
+            f"SELECT id, {origem} FROM {tabela} WHERE {destino} IS NULL AND {origem} IS NOT NULL"
+        )
+    ]
+    atualizar = text(f"UPDATE {tabela} SET {destino} = :valor WHERE id = :id")
+    for inicio in range(0, len(valores), lote):
+        connection.execute(atualizar, valores[inicio:inicio + lote])
+
+
+def upgrade(connection):
+    for tabela, colunas in COLUNAS.items():
+        add_columns(connection, tabela, {destino: tipo for destino, (_, tipo) in colunas.items()})
+        for destino, (origem, _) in colunas.items():
+            _preencher(connection, tabela, destino, origem)
+    for indice in INDICES:
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {indice}")
+    for nome in OBSOLETOS:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {nome}")
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Migrations
+Scripts NNNN_nome.py com upgrade(connection), aplicados por
+`flask semapa db upgrade` (ver core/migrations.py).
+
+Cada script roda numa transação com o lock de migração; use SQL idempotente
+(IF [NOT] EXISTS) quando o objeto puder já existir em bancos antigos. Não
+importe models para montar DDL de migrações novas: o script deve continuar
+produzindo o mesmo esquema depois que os models mudarem.
+"""
@@ -12,7 +12,10 @@ from .requerimento_model import Requerimento
 from .ordem_servico_model import OrdemServico
 from .vistoria_model import Vistoria
 from .vistoria_foto_model import VistoriaFoto
+from .dashboard_stats_model import DashboardStat
+from .sequence_model import Sequencia
 from .associations import ordem_servico_requerimento
+from .counters import load_counts
 
 __all__ = [
     'User',
@@ -23,5 +26,8 @@ __all__ = [
     'OrdemServico',
     'Vistoria',
     'VistoriaFoto',
-    'ordem_servico_requerimento'
+    'DashboardStat',
+    'Sequencia',
+    'ordem_servico_requerimento',
+    'load_counts'
 ]
@@ -5,8 +5,10 @@ Modelo de árvore ajustado conforme DDL da tabela arvores
 """
 
 from core.database import db, BaseModel
+from core.search import registrar_busca, filtro_busca, normalizar
 from datetime import datetime
-from sqlalchemy import or_
+from sqlalchemy import event, DDL
+from sqlalchemy.orm import validates
 
 
 class Arvore(BaseModel):
@@ -15,9 +17,14 @@ class Arvore(BaseModel):
 
     id = db.Column(db.Integer, primary_key=True)
     endereco = db.Column(db.String(200), nullable=True)
+    # endereço em minúsculas e sem acentos, para a busca por prefixo (LookupService)
+    endereco_busca = db.Column(db.String(200), nullable=True)
     bairro = db.Column(db.String(100), nullable=True)
     latitude = db.Column(db.String(20), nullable=True)  # varchar conforme DDL
     longitude = db.Column(db.String(20), nullable=True)  # varchar conforme DDL
+    # Cópia numérica das coordenadas, usada pelo índice espacial
+    latitude_num = db.Column(db.Float, nullable=True)
+    longitude_num = db.Column(db.Float, nullable=True)
     data_plantio = db.Column(db.DateTime, nullable=True)
     foto = db.Column(db.String(200), nullable=True)
     observacao = db.Column(db.Text, nullable=True)
@@ -27,6 +34,16 @@ class Arvore(BaseModel):
     atualizado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     especie_id = db.Column(db.Integer, db.ForeignKey('especies.id'), nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_arvores_lat_lng', 'latitude_num', 'longitude_num'),
+        db.Index('ix_arvores_endereco_id', 'endereco', 'id'),
+        # Busca por prefixo sem diferenciar maiúsculas nem acentos (LookupService)
+        db.Index('ix_arvores_endereco_busca', 'endereco_busca', 'id'),
+        # Filtros por bairro/espécie na ordem da listagem (endereco, id)
+        db.Index('ix_arvores_bairro_endereco_id', 'bairro', 'endereco', 'id'),
+        db.Index('ix_arvores_especie_endereco_id', 'especie_id', 'endereco', 'id'),
+    )
+
     # Relacionamentos
     requerimentos = db.relationship('Requerimento', backref='arvore', lazy=True)
 
@@ -44,36 +61,46 @@ class Arvore(BaseModel):
         self.data_criacao = datetime.utcnow()
         self.criado_por = criado_por
 
+    @validates('latitude', 'longitude')
+    def _sync_coordenada_numerica(self, key, value):
+        """Mantém latitude_num/longitude_num em sincronia com o texto"""
+        try:
+            numero = float(value) if value not in (None, '') else None
+        except (ValueError, TypeError):
+            numero = None
+        setattr(self, f'{key}_num', numero)
+        return value
+
+    @validates('endereco')
+    def _sync_endereco_busca(self, key, value):
+        self.endereco_busca = normalizar(value) or None
+        return value
+
+    @classmethod
+    def search_query(cls, query):
+        """Consulta (não executada) de árvores por endereço ou bairro"""
+        return cls.query.filter(filtro_busca(cls, query, cls.endereco, cls.bairro))
+
     @classmethod
     def search(cls, query):
         """Busca árvores por endereço ou bairro"""
-        return cls.query.filter(
-            or_(
-                cls.endereco.contains(query),
-                cls.bairro.contains(query)
-            )
-        ).all()
+        return cls.search_query(query).all()
 
     @classmethod
     def get_by_bairro(cls, bairro):
         """Retorna árvores por bairro"""
-        return cls.query.filter_by(bairro=bairro).all()
+        return cls.query.filter_by(bairro=bairro).order_by(cls.endereco, cls.id).all()
 
     @classmethod  
     def get_by_especie(cls, especie_id):
         """Retorna árvores por espécie"""
-        return cls.query.filter_by(especie_id=especie_id).all()
+        return cls.query.filter_by(especie_id=especie_id).order_by(cls.endereco, cls.id).all()
 
     @property
     def has_coordinates(self):
         """Verifica se a árvore possui coordenadas"""
         return self.latitude is not None and self.longitude is not None
 
-    @property
-    def total_requerimentos(self):
-        """Retorna total de requerimentos para esta árvore"""
-        return len(self.requerimentos)
-
     @property
     def localizacao_completa(self):
         """Retorna localização completa da árvore"""
@@ -86,6 +113,8 @@ class Arvore(BaseModel):
 
     def get_coordenadas_float(self):
         """Retorna coordenadas como float para uso em mapas"""
+        if self.latitude_num is not None and self.longitude_num is not None:
+            return self.latitude_num, self.longitude_num
         try:
             lat = float(self.latitude) if self.latitude else None
             lng = float(self.longitude) if self.longitude else None
@@ -116,3 +145,28 @@ class Arvore(BaseModel):
 
     def __repr__(self):
         return f'<Arvore {self.id} - {self.localizacao_completa}>'
+
+
+# Índice espacial R*Tree (somente SQLite), mantido por triggers
+ARVORES_RTREE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS arvores_rtree "
+    "USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    "CREATE TRIGGER IF NOT EXISTS arvores_rtree_ai AFTER INSERT ON arvores "
+    "WHEN new.latitude_num IS NOT NULL AND new.longitude_num IS NOT NULL BEGIN "
+    "INSERT INTO arvores_rtree VALUES (new.id, new.latitude_num, new.latitude_num, "
+    "new.longitude_num, new.longitude_num); END",
+    "CREATE TRIGGER IF NOT EXISTS arvores_rtree_au AFTER UPDATE OF latitude_num, longitude_num "
+    "ON arvores BEGIN "
+    "DELETE FROM arvores_rtree WHERE id = old.id; "
+    "INSERT INTO arvores_rtree SELECT new.id, new.latitude_num, new.latitude_num, "
+    "new.longitude_num, new.longitude_num "
+    "WHERE new.latitude_num IS NOT NULL AND new.longitude_num IS NOT NULL; END",
+    "CREATE TRIGGER IF NOT EXISTS arvores_rtree_ad AFTER DELETE ON arvores BEGIN "
+    "DELETE FROM arvores_rtree WHERE id = old.id; END",
+]
+
+for _ddl in ARVORES_RTREE_DDL:
+    event.listen(Arvore.__table__, 'after_create', DDL(_ddl).execute_if(dialect='sqlite'))
+
+registrar_busca(Arvore, 'arvore', 3, titulo='endereco',
+                campos=('endereco', 'bairro', 'observacao'))
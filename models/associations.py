@@ -10,5 +10,7 @@ from core.database import db
 ordem_servico_requerimento = db.Table(
     'ordem_servico_requerimento',
     db.Column('ordem_servico_id', db.Integer, db.ForeignKey('ordens_servico.id'), primary_key=True),
-    db.Column('requerimento_id', db.Integer, db.ForeignKey('requerimentos.id'), primary_key=True)
+    db.Column('requerimento_id', db.Integer, db.ForeignKey('requerimentos.id'), primary_key=True),
+    # A PK cobre buscas por ordem_servico_id; este índice cobre o caminho inverso
+    db.Index('ix_ordem_servico_requerimento_requerimento_id', 'requerimento_id')
 )
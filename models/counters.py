@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Contadores
+Totais de registros filhos (total_requerimentos, total_fotos, ...) calculados
+no banco em vez de len() sobre o relacionamento.
+
+Cada total é um column_property adiado com subconsulta correlacionada: ler
+`arvore.total_requerimentos` executa só um COUNT. Para uma lista inteira,
+load_counts() preenche os totais com um GROUP BY por contador, ou use
+undefer(Modelo.total_x) na consulta para trazê-los junto com as linhas.
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
+from sqlalchemy.orm.attributes import set_committed_value
+from core.database import db
+from .arvore_model import Arvore
+from .especie_model import Especie
+from .requerente_model import Requerente
+from .requerimento_model import Requerimento
+from .ordem_servico_model import OrdemServico
+from .vistoria_model import Vistoria
+from .vistoria_foto_model import VistoriaFoto
+from .associations import ordem_servico_requerimento
+
+# (modelo pai, atributo) -> coluna do filho que aponta para o pai
+COUNTERS = {}
+
+
+def _counter(modelo, nome, coluna_filho):
+    """Registra `modelo.nome` como COUNT(*) dos filhos com coluna_filho = modelo.id"""
+    subconsulta = (
+        select(func.count())
+        .where(coluna_filho == modelo.id)
+        .correlate_except(coluna_filho.table)
+        .scalar_subquery()
+    )
+    setattr(modelo, nome, column_property(subconsulta, deferred=True))
+    COUNTERS[(modelo, nome)] = coluna_filho
+
+
+_counter(Arvore, 'total_requerimentos', Requerimento.__table__.c.arvore_id)
+_counter(Especie, 'total_arvores', Arvore.__table__.c.especie_id)
+_counter(Requerente, 'total_requerimentos', Requerimento.__table__.c.requerente_id)
+_counter(Requerimento, 'total_vistorias', Vistoria.__table__.c.requerimento_id)
+_counter(Requerimento, 'total_ordens_servico', ordem_servico_requerimento.c.requerimento_id)
+_counter(OrdemServico, 'total_requerimentos', ordem_servico_requerimento.c.ordem_servico_id)
+_counter(Vistoria, 'total_fotos', VistoriaFoto.__table__.c.vistoria_id)
+
+
+def load_counts(objetos, *nomes):
+    """Preenche os totais de uma lista de objetos do mesmo modelo.
+
+    Executa um `SELECT fk, COUNT(*) ... GROUP BY fk` por contador, em vez de
+    uma subconsulta por objeto. Sem `nomes`, preenche todos os do modelo.
+    Retorna a própria lista.
+    """
+    persistidos = [obj for obj in objetos if obj.id is not None]
+    if not persistidos:
+        return objetos
+    modelo = type(persistidos[0])
+    nomes = nomes or [nome for (classe, nome) in COUNTERS if classe is modelo]
+    ids = {obj.id for obj in persistidos}
+
+    for nome in nomes:
+        coluna = COUNTERS[(modelo, nome)]
+        contagens = dict(db.session.execute(
+            select(coluna, func.count()).where(coluna.in_(ids)).group_by(coluna)
+        ).all())
+        for obj in persistidos:
+            set_committed_value(obj, nome, contagens.get(obj.id, 0))
+    return objetos
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - DashboardStat Model
+Contadores materializados do dashboard (tabela dashboard_stats)
+"""
+
+from core.database import db, BaseModel
+
+
+class DashboardStat(BaseModel):
+    """Um contador do dashboard: 'arvores', 'requerimento.status:aprovado', ..."""
+    __tablename__ = 'dashboard_stats'
+
+    chave = db.Column(db.String(100), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DashboardStat {self.chave}={self.valor}>'
@@ -5,7 +5,8 @@ Modelo de espécie ajustado conforme DDL da tabela especies
 """
 
 from core.database import db, BaseModel
-from sqlalchemy import or_
+from core.search import registrar_busca, filtro_busca, normalizar
+from sqlalchemy.orm import validates
 
 
 class Especie(BaseModel):
@@ -15,6 +16,9 @@ class Especie(BaseModel):
     id = db.Column(db.Integer, primary_key=True)
     nome_popular = db.Column(db.String(100), nullable=False, unique=True, index=True)
     nome_cientifico = db.Column(db.String(150), nullable=False, index=True)
+    # Nomes em minúsculas e sem acentos, para a busca por prefixo (LookupService)
+    nome_popular_busca = db.Column(db.String(100), nullable=True)
+    nome_cientifico_busca = db.Column(db.String(150), nullable=True)
     porte = db.Column(db.String(20), nullable=False)
     altura_min = db.Column(db.Float, nullable=True)
     altura_max = db.Column(db.Float, nullable=True)
@@ -30,6 +34,12 @@ class Especie(BaseModel):
     observacoes = db.Column(db.Text, nullable=True)
     link_foto = db.Column(db.String(200), nullable=True)
 
+    # Busca por prefixo sem diferenciar maiúsculas nem acentos (LookupService)
+    __table_args__ = (
+        db.Index('ix_especies_nome_popular_busca', 'nome_popular_busca'),
+        db.Index('ix_especies_nome_cientifico_busca', 'nome_cientifico_busca'),
+    )
+
     # Relacionamentos
     arvores = db.relationship('Arvore', backref='especie', lazy=True)
     vistorias = db.relationship('Vistoria', backref='especie', lazy=True)
@@ -55,14 +65,16 @@ class Especie(BaseModel):
         self.observacoes = observacoes
         self.link_foto = link_foto
 
+    @validates('nome_popular', 'nome_cientifico')
+    def _sync_nome_busca(self, key, value):
+        setattr(self, f'{key}_busca', normalizar(value) or None)
+        return value
+
     @classmethod
     def search(cls, query):
         """Busca espécies por nome científico ou popular"""
         return cls.query.filter(
-            or_(
-                cls.nome_cientifico.contains(query),
-                cls.nome_popular.contains(query)
-            )
+            filtro_busca(cls, query, cls.nome_cientifico, cls.nome_popular)
         ).all()
 
     @classmethod
@@ -70,11 +82,6 @@ class Especie(BaseModel):
         """Retorna espécies por porte"""
         return cls.query.filter_by(porte=porte).order_by(cls.nome_popular).all()
 
-    @property
-    def total_arvores(self):
-        """Retorna total de árvores desta espécie"""
-        return len(self.arvores)
-
     @property
     def altura_media(self):
         """Retorna altura média se ambos os valores estiverem definidos"""
@@ -91,3 +98,7 @@ class Especie(BaseModel):
 
     def __repr__(self):
         return f'<Especie {self.nome_popular}>'
+
+
+registrar_busca(Especie, 'especie', 4, titulo='nome_popular',
+                campos=('nome_popular', 'nome_cientifico', 'observacoes'))
@@ -17,12 +17,18 @@ class OrdemServico(BaseModel):
     data_emissao = db.Column(db.DateTime, nullable=True)
     data_execucao = db.Column(db.DateTime, nullable=True)
     responsavel = db.Column(db.String(100), nullable=True)
-    status = db.Column(db.String(30), nullable=True)
+    # active_history: o valor anterior é conhecido no flush (contadores do dashboard)
+    status = db.column_property(db.Column(db.String(30), nullable=True), active_history=True)
     observacao = db.Column(db.Text, nullable=True)
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     data_atualizacao = db.Column(db.DateTime, nullable=True)
     atualizado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_ordens_servico_data_emissao_id', 'data_emissao', 'id'),
+        db.Index('ix_ordens_servico_status_data_emissao_id', 'status', 'data_emissao', 'id'),
+    )
+
     # Relacionamento many-to-many com Requerimento
     requerimentos = db.relationship(
         'Requerimento',
@@ -41,16 +47,15 @@ class OrdemServico(BaseModel):
         self.criado_por = criado_por
 
     @classmethod
-    def generate_numero(cls):
-        """Gera número sequencial para ordem de serviço"""
-        last_ordem = cls.query.order_by(cls.id.desc()).first()
-        if last_ordem and last_ordem.numero:
-            try:
-                last_num = int(last_ordem.numero.split('/')[-1])
-                return f"OS/{datetime.now().year}/{last_num + 1:04d}"
-            except Exception:
-                return f"OS/{datetime.now().year}/0001"
-        return f"OS/{datetime.now().year}/0001"
+    def generate_numero(cls, quantidade=None):
+        """Gera número sequencial para ordem de serviço (OS/<ano>/<n>), reiniciando a cada ano.
+
+        Com `quantidade`, reserva um bloco e retorna a lista de números.
+        """
+        from .sequence_model import Sequencia
+        if quantidade is None:
+            return Sequencia.next('OS', coluna=cls.numero)
+        return Sequencia.reserve('OS', quantidade, coluna=cls.numero)
 
     @classmethod
     def get_by_status(cls, status):
@@ -83,11 +88,6 @@ class OrdemServico(BaseModel):
         """Verifica se a ordem pode ser editada"""
         return self.status in ['pendente', 'em_andamento']
 
-    @property
-    def total_requerimentos(self):
-        """Retorna total de requerimentos vinculados"""
-        return len(self.requerimentos)
-
     def to_dict(self):
         """Converte para dicionário"""
         data = super().to_dict()
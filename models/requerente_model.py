@@ -5,8 +5,9 @@ Modelo de requerente ajustado conforme DDL da tabela requerentes
 """
 
 from core.database import db, BaseModel
+from core.search import registrar_busca, filtro_busca, normalizar
 from datetime import datetime
-from sqlalchemy import or_
+from sqlalchemy.orm import validates
 
 
 class Requerente(BaseModel):
@@ -15,6 +16,8 @@ class Requerente(BaseModel):
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=True)
+    # nome em minúsculas e sem acentos, para a busca por prefixo (LookupService)
+    nome_busca = db.Column(db.String(100), nullable=True)
     telefone = db.Column(db.String(20), nullable=True)
     observacao = db.Column(db.Text, nullable=True)
     data_criacao = db.Column(db.DateTime, nullable=True)
@@ -22,6 +25,13 @@ class Requerente(BaseModel):
     data_atualizacao = db.Column(db.DateTime, nullable=True)
     atualizado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
+    # Índice da ordenação das listagens (nome, id): paginação sem ordenar a tabela toda
+    __table_args__ = (
+        db.Index('ix_requerentes_nome_id', 'nome', 'id'),
+        # Busca por prefixo sem diferenciar maiúsculas nem acentos (LookupService)
+        db.Index('ix_requerentes_nome_busca', 'nome_busca', 'id'),
+    )
+
     # Relacionamentos
     requerimentos = db.relationship('Requerimento', backref='requerente', lazy=True)
 
@@ -32,26 +42,21 @@ class Requerente(BaseModel):
         self.data_criacao = datetime.utcnow()
         self.criado_por = criado_por
 
+    @validates('nome')
+    def _sync_nome_busca(self, key, value):
+        self.nome_busca = normalizar(value) or None
+        return value
+
     @classmethod
     def search(cls, query):
         """Busca requerentes por nome ou telefone"""
-        return cls.query.filter(
-            or_(
-                cls.nome.contains(query),
-                cls.telefone.contains(query)
-            )
-        ).all()
+        return cls.query.filter(filtro_busca(cls, query, cls.nome, cls.telefone)).all()
 
     @classmethod
     def find_by_telefone(cls, telefone):
         """Busca requerente por telefone"""
         return cls.query.filter_by(telefone=telefone).first()
 
-    @property
-    def total_requerimentos(self):
-        """Retorna total de requerimentos do requerente"""
-        return len(self.requerimentos)
-
     @property
     def ultimo_requerimento(self):
         """Retorna o requerimento mais recente"""
@@ -67,3 +72,7 @@ class Requerente(BaseModel):
 
     def __repr__(self):
         return f'<Requerente {self.nome}>'
+
+
+registrar_busca(Requerente, 'requerente', 2, titulo='nome',
+                campos=('nome', 'telefone', 'observacao'))
@@ -5,6 +5,7 @@ Modelo de requerimento ajustado conforme DDL da tabela requerimentos
 """
 
 from core.database import db, BaseModel
+from core.search import registrar_busca
 from datetime import datetime
 
 
@@ -17,16 +18,27 @@ class Requerimento(BaseModel):
     data_abertura = db.Column(db.DateTime, nullable=True)
     tipo = db.Column(db.Text, nullable=True)
     motivo = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(30), nullable=True)
+    # active_history: o valor anterior é conhecido no flush (contadores do dashboard)
+    status = db.column_property(db.Column(db.String(30), nullable=True), active_history=True)
     prioridade = db.Column(db.String(20), nullable=True)
     requerente_id = db.Column(db.Integer, db.ForeignKey('requerentes.id'), nullable=True)
-    arvore_id = db.Column(db.Integer, db.ForeignKey('arvores.id'), nullable=True)
+    arvore_id = db.Column(db.Integer, db.ForeignKey('arvores.id'), nullable=True, index=True)
     observacao = db.Column(db.Text, nullable=True)
     data_criacao = db.Column(db.DateTime, nullable=True)
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     data_atualizacao = db.Column(db.DateTime, nullable=True)
     atualizado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
+    __table_args__ = (
+        # Paginação por cursor da listagem (data_abertura DESC, id DESC)
+        db.Index('ix_requerimentos_data_abertura_id', 'data_abertura', 'id'),
+        # Filtros por igualdade da listagem + a mesma ordem: busca e ordena no
+        # índice. O de requerente_id também atende a FK.
+        db.Index('ix_requerimentos_status_data_abertura_id', 'status', 'data_abertura', 'id'),
+        db.Index('ix_requerimentos_tipo_data_abertura_id', 'tipo', 'data_abertura', 'id'),
+        db.Index('ix_requerimentos_requerente_data_abertura_id', 'requerente_id', 'data_abertura', 'id'),
+    )
+
     # Relacionamento many-to-many com OrdemServico
     ordens_servico = db.relationship(
         'OrdemServico',
@@ -54,16 +66,15 @@ class Requerimento(BaseModel):
         self.criado_por = criado_por
 
     @classmethod
-    def generate_numero(cls):
-        """Gera número sequencial para requerimento"""
-        last_req = cls.query.order_by(cls.id.desc()).first()
-        if last_req and last_req.numero:
-            try:
-                last_num = int(last_req.numero.split('/')[-1])
-                return f"REQ/{datetime.now().year}/{last_num + 1:04d}"
-            except Exception:
-                return f"REQ/{datetime.now().year}/0001"
-        return f"REQ/{datetime.now().year}/0001"
+    def generate_numero(cls, quantidade=None):
+        """Gera número sequencial para requerimento (REQ/<ano>/<n>), reiniciando a cada ano.
+
+        Com `quantidade`, reserva um bloco e retorna a lista de números.
+        """
+        from .sequence_model import Sequencia
+        if quantidade is None:
+            return Sequencia.next('REQ', coluna=cls.numero)
+        return Sequencia.reserve('REQ', quantidade, coluna=cls.numero)
 
     @classmethod
     def get_by_status(cls, status):
@@ -98,16 +109,6 @@ class Requerimento(BaseModel):
         """Verifica se o requerimento pode ser editado"""
         return self.status == 'pendente'
 
-    @property
-    def total_ordens_servico(self):
-        """Retorna total de ordens de serviço vinculadas"""
-        return len(self.ordens_servico)
-
-    @property
-    def total_vistorias(self):
-        """Retorna total de vistorias realizadas"""
-        return len(self.vistorias)
-
     def to_dict(self):
         """Converte para dicionário"""
         data = super().to_dict()
@@ -118,3 +119,7 @@ class Requerimento(BaseModel):
 
     def __repr__(self):
         return f'<Requerimento {self.numero}>'
+
+
+registrar_busca(Requerimento, 'requerimento', 1, titulo='numero',
+                campos=('numero', 'tipo', 'status', 'motivo', 'observacao', 'prioridade'))
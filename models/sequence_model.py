@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Sequence Model
+Contadores por (prefixo, ano) para a numeração REQ/2025/0001, OS/2025/0001...
+"""
+
+from datetime import datetime
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from core.database import db, BaseModel, upsert_insert
+
+
+class Sequencia(BaseModel):
+    """Último número entregue para um prefixo num ano"""
+    __tablename__ = 'sequences'
+
+    prefixo = db.Column(db.String(20), primary_key=True)
+    ano = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def reserve(cls, prefixo, quantidade=1, ano=None, coluna=None):
+        """Reserva `quantidade` números consecutivos e retorna-os formatados.
+
+        O incremento é um único UPDATE ... RETURNING (ou upsert, na primeira
+        vez do ano): dois processos nunca recebem o mesmo número. No
+        PostgreSQL e demais bancos roda numa transação própria, já
+        confirmada, e o contador não fica preso à transação de quem chamou
+        (números de transações desfeitas se perdem). No SQLite, que tem um
+        único escritor, usa a transação da sessão: outra conexão ficaria
+        bloqueada pela escrita da própria sessão, e o número só é confirmado
+        junto com ela. Para tentar de novo após um número repetido, desfaça
+        só o INSERT (session.begin_nested()), não a sessão inteira.
+
+        `coluna` (ex.: Requerimento.numero) é consultada só na criação do
+        contador do ano, para continuar de onde a numeração antiga parou.
+        """
+        if quantidade < 1:
+            raise ValueError("quantidade deve ser >= 1")
+        ano = ano or datetime.now().year
+        if db.engine.dialect.name == 'sqlite':
+            fim = cls._alocar(db.session.connection(), prefixo, ano, quantidade, coluna)
+        else:
+            with db.engine.begin() as connection:
+                fim = cls._alocar(connection, prefixo, ano, quantidade, coluna)
+        return [f"{prefixo}/{ano}/{n:04d}" for n in range(fim - quantidade + 1, fim + 1)]
+
+    @classmethod
+    def _alocar(cls, connection, prefixo, ano, quantidade, coluna):
+        fim = cls._incrementar(connection, prefixo, ano, quantidade)
+        if fim is None:
+            inicial = cls._maior_existente(connection, coluna, prefixo, ano)
+            fim = cls._criar(connection, prefixo, ano, inicial + quantidade, quantidade)
+        return fim
+
+    @classmethod
+    def next(cls, prefixo, ano=None, coluna=None):
+        """Próximo número formatado do prefixo"""
+        return cls.reserve(prefixo, 1, ano=ano, coluna=coluna)[0]
+
+    @classmethod
+    def _incrementar(cls, connection, prefixo, ano, quantidade):
+        tabela = cls.__table__
+        comando = (
+            update(tabela)
+            .where(tabela.c.prefixo == prefixo, tabela.c.ano == ano)
+            .values(valor=tabela.c.valor + quantidade)
+        )
+        if connection.dialect.update_returning:
+            return connection.execute(comando.returning(tabela.c.valor)).scalar()
+        # Sem RETURNING: a linha já está bloqueada pelo UPDATE nesta transação
+        if connection.execute(comando).rowcount == 0:
+            return None
+        return connection.execute(
+            select(tabela.c.valor).where(tabela.c.prefixo == prefixo, tabela.c.ano == ano)
+        ).scalar()
+
+    @classmethod
+    def _criar(cls, connection, prefixo, ano, valor, quantidade):
+        tabela = cls.__table__
+        dialeto = connection.dialect.name
+        if dialeto in ('sqlite', 'postgresql'):
+            # Se outro processo criou o contador no meio tempo, apenas incrementa
+            comando = upsert_insert(dialeto)(tabela).values(prefixo=prefixo, ano=ano, valor=valor)
+            comando = comando.on_conflict_do_update(
+                index_elements=[tabela.c.prefixo, tabela.c.ano],
+                set_={'valor': tabela.c.valor + quantidade}
+            ).returning(tabela.c.valor)
+            return connection.execute(comando).scalar()
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(tabela).values(prefixo=prefixo, ano=ano, valor=valor))
+            return valor
+        except IntegrityError:
+            return cls._incrementar(connection, prefixo, ano, quantidade)
+
+    @staticmethod
+    def _maior_existente(connection, coluna, prefixo, ano):
+        """Maior número já usado em `coluna` para o prefixo/ano (0 se nenhum)"""
+        if coluna is None:
+            return 0
+        inicio = f"{prefixo}/{ano}/"
+        ultimo = connection.execute(
+            select(coluna).where(coluna.startswith(inicio, autoescape=True))
+            .order_by(func.length(coluna).desc(), coluna.desc())
+            .limit(1)
+        ).scalar()
+        try:
+            return int(ultimo[len(inicio):]) if ultimo else 0
+        except ValueError:
+            return 0
+
+    def __repr__(self):
+        return f'<Sequencia {self.prefixo}/{self.ano}={self.valor}>'
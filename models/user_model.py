@@ -6,6 +6,8 @@ Modelo de usuario corrigido para funcionar com autenticação
 from core.database import db, BaseModel
 from flask_login import UserMixin
 from core.security import SecurityMixin
+from core.search import normalizar
+from sqlalchemy.orm import validates
 from datetime import datetime
 
 
@@ -17,11 +19,18 @@ class User(BaseModel, UserMixin, SecurityMixin):
     email = db.Column(db.String(100), unique=True, nullable=False, index=True)
     password = db.Column(db.String(200), nullable=False)  # CORRIGIDO: sempre 'password'
     nome = db.Column(db.String(100), nullable=True)
+    # nome em minúsculas e sem acentos, para a busca por prefixo (LookupService)
+    nome_busca = db.Column(db.String(100), nullable=True)
     telefone = db.Column(db.String(20), nullable=True)
     nivel = db.Column(db.Integer, nullable=False, default=1)
     ativo = db.Column(db.Boolean, nullable=True, default=True)
     ultimo_login = db.Column(db.DateTime, nullable=True)
 
+    # Busca por prefixo sem diferenciar maiúsculas nem acentos (LookupService)
+    __table_args__ = (
+        db.Index('ix_users_nome_busca', 'nome_busca', 'id'),
+    )
+
     # Relacionamentos com foreign_keys especificadas para evitar ambiguidade
     requerimentos_criados = db.relationship(
         'Requerimento',
@@ -91,6 +100,11 @@ class User(BaseModel, UserMixin, SecurityMixin):
         self.nivel = nivel
         self.ativo = ativo
 
+    @validates('nome')
+    def _sync_nome_busca(self, key, value):
+        self.nome_busca = normalizar(value) or None
+        return value
+
     def update_last_login(self):
         """Atualiza timestamp do último login"""
         self.ultimo_login = datetime.utcnow()
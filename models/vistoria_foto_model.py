@@ -4,7 +4,9 @@ SEMAPA3 - VistoriaFoto Model
 Modelo para fotos de vistoria conforme DDL da tabela vistoria_foto
 """
 
+from sqlalchemy import func, select
 from core.database import db, BaseModel
+from core.storage import get_blob_store, detect_mime_type
 
 
 class VistoriaFoto(BaseModel):
@@ -12,32 +14,120 @@ class VistoriaFoto(BaseModel):
     __tablename__ = 'vistoria_foto'
 
     id = db.Column(db.Integer, primary_key=True)
-    vistoria_id = db.Column(db.Integer, db.ForeignKey('vistoria.id', ondelete='CASCADE'), nullable=False)
+    vistoria_id = db.Column(db.Integer, db.ForeignKey('vistoria.id', ondelete='CASCADE'), nullable=False, index=True)
     arquivo_nome = db.Column(db.String(255), nullable=True)
-    arquivo = db.Column(db.LargeBinary, nullable=False)
+    # Legado: bytes da foto dentro do banco. Fotos novas ficam no blob store e
+    # gravam b'' aqui (a coluna é NOT NULL no DDL original). Carregado sob demanda.
+    arquivo = db.deferred(db.Column(db.LargeBinary, nullable=False, default=b''))
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
+    tamanho = db.Column(db.Integer, nullable=True)
+    mime_type = db.Column(db.String(100), nullable=True)
 
-    def __init__(self, vistoria_id, arquivo, arquivo_nome=None):
+    def __init__(self, vistoria_id, arquivo=None, arquivo_nome=None, sha256=None,
+                 tamanho=None, mime_type=None):
         self.vistoria_id = vistoria_id
-        self.arquivo = arquivo
+        self.arquivo = arquivo if arquivo is not None else b''
         self.arquivo_nome = arquivo_nome
+        self.sha256 = sha256
+        self.tamanho = tamanho
+        self.mime_type = mime_type
+
+    @classmethod
+    def from_upload(cls, vistoria_id, stream, arquivo_nome=None, mime_type=None):
+        """Grava o conteúdo no blob store e retorna a foto (ainda não salva)"""
+        if mime_type is None:
+            mime_type = detect_mime_type(arquivo_nome, stream.read(16))
+            stream.seek(0)
+        sha256, tamanho = get_blob_store().put(stream)
+        return cls(
+            vistoria_id=vistoria_id,
+            arquivo_nome=arquivo_nome,
+            sha256=sha256,
+            tamanho=tamanho,
+            mime_type=mime_type
+        )
 
     @classmethod
     def get_by_vistoria(cls, vistoria_id):
         """Retorna fotos por vistoria"""
         return cls.query.filter_by(vistoria_id=vistoria_id).all()
 
+    @property
+    def no_blob_store(self):
+        """Indica se o conteúdo já está fora do banco"""
+        return self.sha256 is not None
+
+    def open(self):
+        """Abre o conteúdo da foto para leitura binária"""
+        if self.no_blob_store:
+            return get_blob_store().open(self.sha256)
+        return _LeitorLegado(db.engine, self.id, self.tamanho_arquivo)
+
     @property
     def tamanho_arquivo(self):
-        """Retorna tamanho do arquivo em bytes"""
-        return len(self.arquivo) if self.arquivo else 0
+        """Retorna tamanho do arquivo em bytes (length() no banco, sem ler a coluna)"""
+        if self.tamanho is not None:
+            return self.tamanho
+        tabela = self.__table__
+        return db.session.execute(
+            select(func.length(tabela.c.arquivo)).where(tabela.c.id == self.id)
+        ).scalar() or 0
 
     def to_dict(self):
         """Converte para dicionário"""
-        data = super().to_dict()
+        # Exclui o campo binário para não carregá-lo do banco
+        data = super().to_dict(exclude_fields=['arquivo'])
         data['tamanho_arquivo'] = self.tamanho_arquivo
-        # Remove o campo arquivo binário do dicionário por ser muito grande
-        data.pop('arquivo', None)
         return data
 
     def __repr__(self):
         return f'<VistoriaFoto {self.id} - {self.arquivo_nome}>'
+
+
+
+class _LeitorLegado:
+    """File-like sobre vistoria_foto.arquivo: cada read() busca só a fatia
+    pedida com substr(), numa conexão própria (o streaming da resposta roda
+    depois que a requisição, e a sessão, já terminaram)"""
+
+    def __init__(self, engine, foto_id, tamanho):
+        self._engine = engine
+        self._foto_id = foto_id
+        self._tamanho = tamanho
+        self._posicao = 0
+
+    def seekable(self):
+        return True
+
+    def seek(self, posicao, whence=0):
+        base = {0: 0, 1: self._posicao, 2: self._tamanho}[whence]
+        self._posicao = max(0, base + posicao)
+        return self._posicao
+
+    def tell(self):
+        return self._posicao
+
+    def read(self, n=-1):
+        restante = self._tamanho - self._posicao
+        if n is None or n < 0 or n > restante:
+            n = restante
+        if n <= 0:
+            return b''
+        tabela = VistoriaFoto.__table__
+        with self._engine.connect() as connection:
+            fatia = connection.execute(
+                select(func.substr(tabela.c.arquivo, self._posicao + 1, n))
+                .where(tabela.c.id == self._foto_id)
+            ).scalar()
+        fatia = bytes(fatia or b'')
+        self._posicao += len(fatia)
+        return fatia
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -13,7 +13,7 @@ class Vistoria(BaseModel):
     __tablename__ = 'vistoria'
 
     id = db.Column(db.Integer, primary_key=True)
-    requerimento_id = db.Column(db.Integer, db.ForeignKey('requerimentos.id', ondelete='CASCADE'), nullable=False)
+    requerimento_id = db.Column(db.Integer, db.ForeignKey('requerimentos.id', ondelete='CASCADE'), nullable=False, index=True)
     vistoria_data = db.Column(db.DateTime, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=False)
     status = db.Column(db.String(30), nullable=False, default='Pendente')
@@ -29,6 +29,13 @@ class Vistoria(BaseModel):
     medidas_seguranca = db.Column(db.Text, nullable=True)
     observacoes_tecnicas = db.Column(db.Text, nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_vistoria_data_id', 'vistoria_data', 'id'),
+        # Filtros da listagem por status e técnico, na ordem da paginação
+        db.Index('ix_vistoria_status_data_id', 'status', 'vistoria_data', 'id'),
+        db.Index('ix_vistoria_user_data_id', 'user_id', 'vistoria_data', 'id'),
+    )
+
     # Relacionamento com fotos
     fotos = db.relationship('VistoriaFoto', backref='vistoria', lazy=True, cascade='all, delete-orphan')
 
@@ -81,11 +88,6 @@ class Vistoria(BaseModel):
         self.status = 'Cancelada'
         self.save()
 
-    @property
-    def total_fotos(self):
-        """Retorna total de fotos da vistoria"""
-        return len(self.fotos)
-
     @property
     def pode_editar(self):
         """Verifica se a vistoria pode ser editada"""
@@ -4,9 +4,39 @@ SEMAPA3 - Arvore Service
 Serviço de gerenciamento de árvores
 """
 
-from models.arvore_model import Arvore
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect, insert, select, table, column, text, func, cast, Integer
+from sqlalchemy.orm import joinedload
+from models.arvore_model import Arvore, ARVORES_RTREE_DDL
 from models.especie_model import Especie
+from core.cache import get_cache
+from core.database import (
+    db, after_commit, defer_after_commit, paginate_query, paginate_cursor, read_only, suspend_unit_of_work
+)
+from core.search import indexar, normalizar
+from services.dashboard_service import DashboardService
 from core.exceptions import ValidationError, NotFoundError
+from utils.helpers import distancia_metros, bbox_por_raio, tile_bounds
+
+# Tabela virtual R*Tree criada em models/arvore_model.py (somente SQLite)
+arvores_rtree = table(
+    'arvores_rtree',
+    column('id'), column('min_lat'), column('max_lat'), column('min_lng'), column('max_lng')
+)
+
+# Cache em processo dos tiles de clusters: (versão de arvores, z, x, y) ->
+# (expira_em, payload). A versão vem de core.cache (compartilhada entre os
+# workers com Redis): qualquer alteração de árvore, em qualquer worker, muda
+# a chave, e os tiles antigos saem pelo LRU/TTL
+_tile_cache = OrderedDict()
+_tile_lock = threading.Lock()
+_spatial_index = {}
 
 class ArvoreService:
     """Serviço de gerenciamento de árvores"""
@@ -77,26 +107,219 @@ class ArvoreService:
         return arvore
 
     @staticmethod
+    @read_only
     def search(query, page=1, per_page=10):
-        """Busca árvores com paginação"""
-        if query:
-            arvores = Arvore.search(query)
-        else:
-            arvores = Arvore.query.order_by(Arvore.endereco).all()
+        """Busca árvores com paginação no banco. Retorna (itens, total)."""
+        consulta = Arvore.search_query(query) if query else Arvore.query
+        consulta = consulta.options(joinedload(Arvore.especie)).order_by(Arvore.endereco, Arvore.id)
+        return paginate_query(consulta, page=page, per_page=per_page)
 
-        # Paginação manual
-        start = (page - 1) * per_page
-        end = start + per_page
-        return arvores[start:end], len(arvores)
+    @staticmethod
+    @read_only
+    def get_cursor_page(cursor=None, per_page=50):
+        """Página por cursor em (endereco, id) — usa o índice ix_arvores_endereco_id"""
+        consulta = Arvore.query.options(joinedload(Arvore.especie))
+        return paginate_cursor(consulta, Arvore.endereco, Arvore.id,
+                               cursor=cursor, per_page=per_page, descending=False)
 
     @staticmethod
     def get_with_coordinates():
         """Retorna árvores com coordenadas para mapa"""
-        return Arvore.query.filter(
+        return Arvore.query.options(joinedload(Arvore.especie)).filter(
             Arvore.latitude.isnot(None),
             Arvore.longitude.isnot(None)
         ).all()
 
+    @staticmethod
+    def has_spatial_index():
+        """Indica se o banco atual possui o índice R*Tree de árvores"""
+        engine = db.engine
+        key = str(engine.url)
+        if key not in _spatial_index:
+            _spatial_index[key] = (
+                engine.dialect.name == 'sqlite' and inspect(engine).has_table('arvores_rtree')
+            )
+        return _spatial_index[key]
+
+    @staticmethod
+    def _filter_bbox(query, min_lat, min_lng, max_lat, max_lng):
+        """Aplica o filtro de retângulo usando o R*Tree quando disponível"""
+        if ArvoreService.has_spatial_index():
+            # O R*Tree guarda float32 arredondado para fora; o refinamento exato usa
+            # "coluna + 0" para que o SQLite não troque o R*Tree pelo índice B-tree
+            return query.join(arvores_rtree, arvores_rtree.c.id == Arvore.id).filter(
+                arvores_rtree.c.max_lat >= min_lat,
+                arvores_rtree.c.min_lat <= max_lat,
+                arvores_rtree.c.max_lng >= min_lng,
+                arvores_rtree.c.min_lng <= max_lng,
+                (Arvore.latitude_num + 0).between(min_lat, max_lat),
+                (Arvore.longitude_num + 0).between(min_lng, max_lng)
+            )
+        return query.filter(
+            Arvore.latitude_num.between(min_lat, max_lat),
+            Arvore.longitude_num.between(min_lng, max_lng)
+        )
+
+    @staticmethod
+    def get_in_bbox(min_lat, min_lng, max_lat, max_lng, limit=2000):
+        """Retorna árvores dentro do retângulo (viewport do mapa)"""
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValidationError("Retângulo de busca inválido")
+
+        query = ArvoreService._filter_bbox(
+            Arvore.query.options(joinedload(Arvore.especie)),
+            min_lat, min_lng, max_lat, max_lng
+        )
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def get_within_radius(lat, lng, metros, limit=500):
+        """Retorna [(arvore, distancia_m)] a até `metros` do ponto, mais próximas primeiro"""
+        if metros <= 0:
+            raise ValidationError("Raio deve ser positivo")
+
+        # Pré-filtro pelo retângulo envolvente (usa o índice), refinado por haversine
+        candidatas = ArvoreService.get_in_bbox(*bbox_por_raio(lat, lng, metros), limit=None)
+        resultado = []
+        for arvore in candidatas:
+            distancia = distancia_metros(lat, lng, arvore.latitude_num, arvore.longitude_num)
+            if distancia <= metros:
+                resultado.append((arvore, distancia))
+
+        resultado.sort(key=lambda item: item[1])
+        return resultado[:limit] if limit else resultado
+
+    @staticmethod
+    def rebuild_spatial_index(batch_size=1000):
+        """Recalcula as coordenadas numéricas e reconstrói o R*Tree. Retorna total indexado."""
+        def _to_float(value):
+            try:
+                return float(value) if value not in (None, '') else None
+            except (ValueError, TypeError):
+                return None
+
+        arvores = Arvore.__table__
+        rows = db.session.execute(
+            select(arvores.c.id, arvores.c.latitude, arvores.c.longitude)
+        ).fetchall()
+
+        update = arvores.update().where(arvores.c.id == db.bindparam('_id')).values(
+            latitude_num=db.bindparam('_lat'),
+            longitude_num=db.bindparam('_lng')
+        )
+        for start in range(0, len(rows), batch_size):
+            params = [
+                {'_id': row.id, '_lat': _to_float(row.latitude), '_lng': _to_float(row.longitude)}
+                for row in rows[start:start + batch_size]
+            ]
+            db.session.execute(update, params)
+
+        if db.engine.dialect.name == 'sqlite':
+            for ddl in ARVORES_RTREE_DDL:
+                db.session.execute(text(ddl))
+            db.session.execute(text("DELETE FROM arvores_rtree"))
+            db.session.execute(text(
+                "INSERT INTO arvores_rtree "
+                "SELECT id, latitude_num, latitude_num, longitude_num, longitude_num FROM arvores "
+                "WHERE latitude_num IS NOT NULL AND longitude_num IS NOT NULL"
+            ))
+
+        db.session.commit()
+        _spatial_index.pop(str(db.engine.url), None)
+        get_cache().invalidate(Arvore.__tablename__)
+        ArvoreService.clear_tile_cache()
+        return Arvore.query.filter(
+            Arvore.latitude_num.isnot(None),
+            Arvore.longitude_num.isnot(None)
+        ).count()
+
+    @staticmethod
+    def get_tile(z, x, y):
+        """Retorna os clusters do tile XYZ como GeoJSON, usando o cache de tiles"""
+        max_zoom = current_app.config.get('TILE_MAX_ZOOM', 22)
+        if not (0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise NotFoundError("Tile inexistente")
+
+        key = (get_cache().version(Arvore.__tablename__), z, x, y)
+        agora = time.monotonic()
+        with _tile_lock:
+            cached = _tile_cache.get(key)
+            if cached and cached[0] > agora:
+                _tile_cache.move_to_end(key)
+                return cached[1]
+
+        payload = ArvoreService._build_tile(z, x, y)
+
+        ttl = current_app.config.get('TILE_CACHE_TTL', 300)
+        max_size = current_app.config.get('TILE_CACHE_SIZE', 2048)
+        with _tile_lock:
+            _tile_cache[key] = (agora + ttl, payload)
+            _tile_cache.move_to_end(key)
+            while len(_tile_cache) > max_size:
+                _tile_cache.popitem(last=False)
+        return payload
+
+    @staticmethod
+    def _build_tile(z, x, y):
+        """Agrega as árvores do tile numa grade GRID x GRID, com contagem por espécie"""
+        grid = current_app.config.get('TILE_GRID', 64)
+        min_lat, min_lng, max_lat, max_lng = tile_bounds(z, x, y)
+        cell_lat = (max_lat - min_lat) / grid
+        cell_lng = (max_lng - min_lng) / grid
+
+        linha = cast((Arvore.latitude_num - min_lat) / cell_lat, Integer).label('linha')
+        coluna = cast((Arvore.longitude_num - min_lng) / cell_lng, Integer).label('coluna')
+        query = db.session.query(
+            linha, coluna, Arvore.especie_id,
+            func.count(Arvore.id), func.avg(Arvore.latitude_num),
+            func.avg(Arvore.longitude_num), func.min(Arvore.id)
+        )
+        query = ArvoreService._filter_bbox(query, min_lat, min_lng, max_lat, max_lng)
+        rows = query.group_by(linha, coluna, Arvore.especie_id).all()
+
+        nomes = {}
+        if rows:
+            ids = {row[2] for row in rows if row[2] is not None}
+            if ids:
+                nomes = dict(db.session.query(Especie.id, Especie.nome_popular)
+                             .filter(Especie.id.in_(ids)).all())
+
+        # Junta as linhas (célula, espécie) numa feature por célula
+        celulas = {}
+        for lin, col, especie_id, total, lat, lng, menor_id in rows:
+            cel = celulas.setdefault((min(lin, grid - 1), min(col, grid - 1)),
+                                     {'total': 0, 'lat': 0.0, 'lng': 0.0, 'id': menor_id, 'especies': {}})
+            cel['total'] += total
+            cel['lat'] += lat * total
+            cel['lng'] += lng * total
+            nome = nomes.get(especie_id, 'Não informada')
+            cel['especies'][nome] = cel['especies'].get(nome, 0) + total
+
+        features = []
+        for cel in celulas.values():
+            propriedades = {'total': cel['total'], 'especies': cel['especies']}
+            if cel['total'] == 1:
+                propriedades['id'] = cel['id']
+            features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': [cel['lng'] / cel['total'], cel['lat'] / cel['total']]
+                },
+                'properties': propriedades
+            })
+
+        return {'type': 'FeatureCollection', 'tile': [z, x, y], 'features': features}
+
+    @staticmethod
+    def clear_tile_cache():
+        """Esvazia o cache de tiles deste worker (os demais deixam de usar os
+        seus quando a versão de arvores muda)"""
+        with _tile_lock:
+            _tile_cache.clear()
+
     @staticmethod
     def generate_kml(arvores=None):
         """Gera arquivo KML das árvores"""
@@ -110,7 +333,319 @@ class ArvoreService:
 
         return kml_data
     
+    # === Exportação em streaming (memória constante, uma query por lote) ===
+
+    EXPORT_CSV_CAMPOS = [
+        'id', 'endereco', 'bairro', 'latitude', 'longitude', 'especie_id',
+        'especie', 'nome_cientifico', 'data_plantio', 'observacao'
+    ]
+
+    @staticmethod
+    def iter_export_rows(batch_size=1000, somente_georreferenciadas=False):
+        """Percorre árvores + espécie em lotes por keyset (id), uma query por lote"""
+        arvores = Arvore.__table__
+        especies = Especie.__table__
+        base = select(
+            arvores.c.id, arvores.c.endereco, arvores.c.bairro,
+            arvores.c.latitude, arvores.c.longitude,
+            arvores.c.latitude_num, arvores.c.longitude_num,
+            arvores.c.especie_id, arvores.c.data_plantio, arvores.c.observacao,
+            especies.c.nome_popular.label('especie'),
+            especies.c.nome_cientifico
+        ).select_from(
+            arvores.outerjoin(especies, especies.c.id == arvores.c.especie_id)
+        ).order_by(arvores.c.id).limit(batch_size)
+
+        ultimo_id = 0
+        while True:
+            rows = db.session.execute(base.where(arvores.c.id > ultimo_id)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                lat, lng = ArvoreService._export_coordenadas(row)
+                if somente_georreferenciadas and (lat is None or lng is None):
+                    continue
+                yield row, lat, lng
+            ultimo_id = rows[-1].id
+
+    @staticmethod
+    def _export_coordenadas(row):
+        if row.latitude_num is not None and row.longitude_num is not None:
+            return row.latitude_num, row.longitude_num
+        try:
+            return float(row.latitude), float(row.longitude)
+        except (ValueError, TypeError):
+            return None, None
+
+    @staticmethod
+    def stream_kml(batch_size=1000):
+        """Gera o documento KML das árvores em pedaços"""
+        from xml.sax.saxutils import escape  # só na exportação
+
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+               '<name>SEMAPA3 - Árvores</name>\n')
+        buffer = []
+        for row, lat, lng in ArvoreService.iter_export_rows(batch_size, somente_georreferenciadas=True):
+            buffer.append(
+                '<Placemark><name>{nome}</name><description>{descricao}</description>'
+                '<Point><coordinates>{lng},{lat}</coordinates></Point></Placemark>\n'.format(
+                    nome=escape(row.especie or f'Árvore {row.id}'),
+                    descricao=escape(', '.join(p for p in (row.endereco, row.bairro, row.observacao) if p)),
+                    lat=lat, lng=lng
+                )
+            )
+            if len(buffer) >= batch_size:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+        yield '</Document></kml>\n'
+
+    @staticmethod
+    def stream_geojson(batch_size=1000):
+        """Gera a FeatureCollection GeoJSON das árvores em pedaços"""
+        yield '{"type": "FeatureCollection", "features": ['
+        primeiro = True
+        buffer = []
+        for row, lat, lng in ArvoreService.iter_export_rows(batch_size, somente_georreferenciadas=True):
+            feature = json.dumps({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+                'properties': {
+                    'id': row.id,
+                    'endereco': row.endereco,
+                    'bairro': row.bairro,
+                    'especie_id': row.especie_id,
+                    'especie': row.especie,
+                    'nome_cientifico': row.nome_cientifico,
+                    'observacao': row.observacao
+                }
+            }, ensure_ascii=False)
+            buffer.append(feature if primeiro else ',' + feature)
+            primeiro = False
+            if len(buffer) >= batch_size:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+        yield ']}\n'
+
+    @staticmethod
+    def stream_csv(batch_size=1000):
+        """Gera o CSV de todas as árvores em pedaços"""
+        import csv
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(ArvoreService.EXPORT_CSV_CAMPOS)
+        linhas = 0
+        for row, lat, lng in ArvoreService.iter_export_rows(batch_size):
+            writer.writerow([
+                row.id, row.endereco, row.bairro, lat, lng, row.especie_id,
+                row.especie, row.nome_cientifico,
+                row.data_plantio.isoformat() if row.data_plantio else '',
+                row.observacao
+            ])
+            linhas += 1
+            if linhas % batch_size == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        yield output.getvalue()
+
+    # === Importação em lote (CSV/GeoJSON, mesmas colunas da exportação) ===
+
+    IMPORT_FORMATOS = ('csv', 'geojson')
+    IMPORT_MAX_ERROS = 1000  # linhas com erro detalhadas no relatório
+
+    @staticmethod
+    def iter_import_records(stream, formato):
+        """Lê o arquivo e gera (número da linha, dicionário de campos).
+
+        O CSV é lido em streaming (separador ',', ';' ou tab; UTF-8 com ou
+        sem BOM). O GeoJSON é carregado inteiro: a geometria Point vira
+        latitude/longitude. Shapefiles devem ser convertidos antes, ex.:
+        `ogr2ogr -f GeoJSON arvores.geojson arvores.shp`.
+        """
+        import csv
+
+        if isinstance(stream, (bytes, bytearray)):
+            stream = io.BytesIO(stream)
+        texto = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        if formato == 'csv':
+            cabecalho = texto.readline()
+            try:
+                dialeto = csv.Sniffer().sniff(cabecalho, delimiters=',;\t')
+            except csv.Error:
+                dialeto = csv.excel
+            leitor = csv.DictReader(_encadear(cabecalho, texto), dialect=dialeto)
+            for numero, linha in enumerate(leitor, start=2):
+                yield numero, {(chave or '').strip().lower(): valor for chave, valor in linha.items()}
+        elif formato == 'geojson':
+            dados = json.load(texto)
+            for numero, feature in enumerate(dados.get('features') or [], start=1):
+                campos = {k.lower(): v for k, v in (feature.get('properties') or {}).items()}
+                geometria = feature.get('geometry') or {}
+                if geometria.get('type') == 'Point':
+                    coordenadas = geometria.get('coordinates') or []
+                    if len(coordenadas) >= 2:
+                        campos['longitude'], campos['latitude'] = coordenadas[0], coordenadas[1]
+                yield numero, campos
+        else:
+            raise ValidationError(f"Formato de importação não suportado: {formato}")
+
+    @staticmethod
+    def import_records(registros, criado_por=None, batch_size=1000, dry_run=False):
+        """Valida e insere árvores em lotes (um INSERT executemany por lote).
+
+        `registros` é um iterável de (linha, campos), como iter_import_records.
+        Cada lote é confirmado separadamente, mesmo numa requisição (fora da
+        unidade de trabalho): se um lote falhar, os anteriores ficam gravados.
+        Linhas inválidas são puladas e relatadas. Retorna {'total',
+        'importadas', 'com_erro', 'erros'}.
+        """
+        especies = ArvoreService._mapa_especies()
+        relatorio = {'total': 0, 'importadas': 0, 'com_erro': 0, 'erros': [], 'dry_run': dry_run}
+        lote = []
+
+        def gravar():
+            if not dry_run:
+                ArvoreService._inserir_lote(lote)
+            relatorio['importadas'] += len(lote)
+            lote.clear()
+
+        with suspend_unit_of_work():
+            for numero, campos in registros:
+                relatorio['total'] += 1
+                valores, erros = ArvoreService._validar_importacao(campos, especies)
+                if erros:
+                    relatorio['com_erro'] += 1
+                    if len(relatorio['erros']) < ArvoreService.IMPORT_MAX_ERROS:
+                        relatorio['erros'].append({'linha': numero, 'erros': erros})
+                    continue
+                valores['criado_por'] = criado_por
+                lote.append(valores)
+                if len(lote) >= batch_size:
+                    gravar()
+            if lote:
+                gravar()
+        return relatorio
+
+    @staticmethod
+    def _mapa_especies():
+        """Nome popular/científico normalizado -> id, e os ids válidos"""
+        mapa = {}
+        for id, popular, cientifico in db.session.execute(
+            select(Especie.id, Especie.nome_popular, Especie.nome_cientifico)
+        ):
+            mapa.setdefault(normalizar(cientifico), id)
+            mapa[normalizar(popular)] = id
+            mapa[id] = id
+        return mapa
+
+    @staticmethod
+    def _validar_importacao(campos, especies):
+        """Converte uma linha para as colunas de `arvores`; retorna (valores, erros)"""
+        def texto(nome, tamanho):
+            valor = campos.get(nome)
+            valor = str(valor).strip() if valor is not None else ''
+            if len(valor) > tamanho:
+                erros.append(f"{nome} excede {tamanho} caracteres")
+            return valor or None
+
+        erros = []
+        valores = {
+            'endereco': texto('endereco', 200),
+            'bairro': texto('bairro', 100),
+            'observacao': texto('observacao', 10000),
+        }
+        # O INSERT em lote não passa pelo @validates do modelo
+        valores['endereco_busca'] = normalizar(valores['endereco']) or None
+
+        # Espécie: especie_id, ou o nome popular/científico cadastrado
+        especie_id = None
+        bruto = campos.get('especie_id')
+        if bruto not in (None, ''):
+            try:
+                especie_id = especies.get(int(bruto))
+            except (TypeError, ValueError):
+                pass
+            if especie_id is None:
+                erros.append(f"especie_id inexistente: {bruto}")
+        else:
+            for nome in ('especie', 'nome_popular', 'nome_cientifico'):
+                if campos.get(nome):
+                    especie_id = especies.get(normalizar(campos[nome]).strip())
+                    if especie_id is None:
+                        erros.append(f"espécie não cadastrada: {campos[nome]}")
+                    break
+        valores['especie_id'] = especie_id
+
+        # Coordenadas: ambas ou nenhuma, dentro dos limites
+        lat, lng = campos.get('latitude'), campos.get('longitude')
+        valores.update(latitude=None, longitude=None, latitude_num=None, longitude_num=None)
+        if lat not in (None, '') or lng not in (None, ''):
+            try:
+                lat_num = float(str(lat).replace(',', '.'))
+                lng_num = float(str(lng).replace(',', '.'))
+            except (TypeError, ValueError):
+                erros.append("latitude/longitude inválidas")
+            else:
+                if not (-90 <= lat_num <= 90 and -180 <= lng_num <= 180):
+                    erros.append("coordenadas fora do intervalo válido")
+                valores.update(latitude=str(lat_num), longitude=str(lng_num),
+                               latitude_num=lat_num, longitude_num=lng_num)
+        if not valores['endereco'] and valores['latitude_num'] is None:
+            erros.append("informe endereço ou coordenadas")
+
+        plantio = campos.get('data_plantio')
+        valores['data_plantio'] = None
+        if plantio not in (None, ''):
+            for formato in ('%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y'):
+                try:
+                    valores['data_plantio'] = datetime.strptime(str(plantio).strip()[:19], formato)
+                    break
+                except ValueError:
+                    continue
+            else:
+                erros.append(f"data_plantio inválida: {plantio}")
+
+        return valores, erros
+
+    @staticmethod
+    def _inserir_lote(lote):
+        """INSERT em lote + índice de busca + contadores do dashboard, num commit"""
+        agora = datetime.utcnow()
+        for valores in lote:
+            valores['data_criacao'] = agora
+        try:
+            ids = db.session.execute(
+                insert(Arvore.__table__).returning(Arvore.__table__.c.id, sort_by_parameter_order=True),
+                lote
+            ).scalars().all()
+            indexar(Arvore, [{**valores, 'id': id} for valores, id in zip(lote, ids)])
+            DashboardService.incrementar({'arvores': len(lote)})
+            # INSERT direto não dispara os eventos do ORM: invalida após o commit
+            defer_after_commit(db.session(), 'cache', Arvore.__tablename__)
+            defer_after_commit(db.session(), 'tiles', None)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
     @staticmethod
     def get_all():
         """Retorna todas as árvores ordenadas por endereço"""
         return Arvore.query.order_by(Arvore.endereco).all()
+
+
+@after_commit('tiles')
+def _limpar_tiles(_valores):
+    ArvoreService.clear_tile_cache()
+
+
+def _encadear(primeira, resto):
+    """Devolve a linha já lida (amostra do Sniffer) antes do restante do arquivo"""
+    yield primeira
+    yield from resto
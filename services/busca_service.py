@@ -0,0 +1,27 @@
+from flask import url_for
+from core.database import read_only
+from core.search import buscar, reconstruir_indice
+
+# Entidade do índice -> endpoint da página de detalhes
+DETALHES = {
+    'requerimento': 'requerimento.detalhes',
+    'requerente': 'requerente.detail',
+    'arvore': 'arvore.detalhes',
+    'especie': 'especie.detalhes',
+}
+
+class BuscaService:
+    @staticmethod
+    @read_only
+    def search(query, limit=20, entidades=None):
+        """Busca ranqueada em requerimentos, requerentes, árvores e espécies"""
+        if entidades:
+            entidades = [e for e in entidades if e in DETALHES]
+        resultados = buscar(query, limit=limit, entidades=entidades)
+        for item in resultados:
+            item['url'] = url_for(DETALHES[item['entidade']], id=item['id'])
+        return resultados
+
+    @staticmethod
+    def rebuild_index():
+        return reconstruir_indice()
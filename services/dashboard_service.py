@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Dashboard Service
+Estatísticas do dashboard lidas da tabela materializada dashboard_stats
+"""
+
+import time
+from flask import current_app
+from sqlalchemy import event, func, inspect, insert, select, update
+from models import (
+    DashboardStat, User, Requerente, Arvore, Especie, Requerimento, OrdemServico, Vistoria
+)
+from core.database import (db, read_only, upsert_insert, after_commit, defer_after_commit,
+                           discard_after_commit, SemapaSession)
+
+# Modelo -> chave do total
+TOTAIS = {
+    User: 'usuarios',
+    Requerente: 'requerentes',
+    Arvore: 'arvores',
+    Especie: 'especies',
+    Requerimento: 'requerimentos',
+    OrdemServico: 'ordens_servico',
+    Vistoria: 'vistorias',
+}
+# Modelos com contagem por status: 'requerimento.status:<valor>'
+POR_STATUS = {
+    Requerimento: 'requerimento.status',
+    OrdemServico: 'ordem_servico.status',
+}
+RECONCILIADO_EM = '_reconciliado_em'
+
+stats_table = DashboardStat.__table__
+
+
+def _chave_status(modelo, status):
+    return f'{POR_STATUS[modelo]}:{status or ""}'
+
+
+class DashboardService:
+    @staticmethod
+    def get_stats():
+        """Todos os contadores numa única leitura. Só lê: a recontagem roda
+        fora das requisições (flask semapa reconcile-stats, no deploy e no cron)"""
+        return DashboardService._montar(DashboardService._ler())
+
+    @staticmethod
+    def reconciliado_em():
+        """Timestamp da última reconciliação, ou None se nunca houve"""
+        return DashboardService._ler().get(RECONCILIADO_EM)
+
+    @staticmethod
+    @read_only
+    def _ler():
+        return dict(db.session.execute(select(stats_table.c.chave, stats_table.c.valor)).all())
+
+    @staticmethod
+    def reconcile():
+        """Reconta tudo a partir das tabelas e regrava dashboard_stats.
+
+        Sobrescreve com upsert (sem DELETE + INSERT): duas reconciliações ao
+        mesmo tempo só disputam as linhas, sem violar a chave única.
+        """
+        valores = {}
+        for modelo, chave in TOTAIS.items():
+            valores[chave] = db.session.execute(select(func.count()).select_from(modelo)).scalar()
+        for modelo in POR_STATUS:
+            contagens = db.session.execute(
+                select(modelo.status, func.count()).group_by(modelo.status)
+            ).all()
+            for status, total in contagens:
+                chave = _chave_status(modelo, status)
+                valores[chave] = valores.get(chave, 0) + total
+        valores[RECONCILIADO_EM] = int(time.time())
+
+        # A recontagem já inclui o que esta transação gravou
+        discard_after_commit(db.session(), DELTAS_KEY)
+        db.session.execute(
+            update(stats_table).where(stats_table.c.chave.notin_(valores)).values(valor=0)
+        )
+        _aplicar(db.session.connection(), valores, somar=False)
+        db.session.commit()
+        return valores
+
+    @staticmethod
+    def incrementar(deltas):
+        """Soma deltas ({'arvores': 500, ...}) após o commit da transação atual;
+        para gravações fora do ORM, que não passam pelo after_flush"""
+        if deltas:
+            session = db.session()
+            defer_after_commit(session, DELTAS_KEY, (session.connection().engine, deltas))
+
+    @staticmethod
+    def _montar(linhas):
+        """Formato usado pelo template: stats (totais) e req_stats (requerimentos)"""
+        prefixo = POR_STATUS[Requerimento] + ':'
+        por_status = {
+            chave[len(prefixo):]: valor for chave, valor in linhas.items()
+            if chave.startswith(prefixo)
+        }
+        stats = {f'total_{chave}': linhas.get(chave, 0) for chave in TOTAIS.values()}
+        # Mesmos critérios de RequerimentoService.get_statistics()
+        req_stats = {
+            'total': linhas.get('requerimentos', 0),
+            'pendentes': sum(v for s, v in por_status.items() if s not in ('', 'Concluído')),
+            'aprovados': por_status.get('aprovado', 0),
+            'negados': por_status.get('negado', 0),
+            'concluidos': por_status.get('Concluído', 0),
+        }
+        return stats, req_stats
+
+
+# === Atualização incremental ===
+# Cada flush converte inserções, remoções e trocas de status em deltas; depois
+# do commit eles são somados numa transação curta e separada (valor = valor +
+# delta). Aplicá-los dentro da transação de quem grava faria todas as
+# escritas (a requisição inteira, na unidade de trabalho) esperarem pela
+# mesma linha de dashboard_stats. Deltas perdidos (queda entre os dois
+# commits) e alterações feitas fora do ORM (UPDATE em massa, SQL direto) só
+# aparecem na próxima reconciliação.
+
+DELTAS_KEY = 'dashboard_stats'
+
+def _deltas(session):
+    deltas = {}
+
+    def somar(chave, valor):
+        deltas[chave] = deltas.get(chave, 0) + valor
+
+    for obj in session.new:
+        modelo = type(obj)
+        if modelo in TOTAIS:
+            somar(TOTAIS[modelo], 1)
+        if modelo in POR_STATUS:
+            somar(_chave_status(modelo, obj.status), 1)
+    for obj in session.deleted:
+        modelo = type(obj)
+        if modelo in TOTAIS:
+            somar(TOTAIS[modelo], -1)
+        if modelo in POR_STATUS:
+            historico = inspect(obj).attrs.status.history
+            for status in historico.deleted or historico.unchanged:
+                somar(_chave_status(modelo, status), -1)
+    for obj in session.dirty:
+        modelo = type(obj)
+        if modelo in POR_STATUS:
+            historico = inspect(obj).attrs.status.history
+            if historico.added:
+                for status in historico.deleted:
+                    somar(_chave_status(modelo, status), -1)
+                for status in historico.added:
+                    somar(_chave_status(modelo, status), 1)
+    return {chave: delta for chave, delta in deltas.items() if delta}
+
+
+def _aplicar(connection, deltas, somar=True):
+    """Soma os deltas aos contadores (ou, com somar=False, grava os valores)"""
+    dialeto = connection.dialect.name
+    for chave, delta in deltas.items():
+        if dialeto in ('sqlite', 'postgresql'):
+            comando = upsert_insert(dialeto)(stats_table).values(chave=chave, valor=delta)
+            comando = comando.on_conflict_do_update(
+                index_elements=[stats_table.c.chave],
+                set_={'valor': stats_table.c.valor + comando.excluded.valor if somar
+                      else comando.excluded.valor}
+            )
+            connection.execute(comando)
+        else:
+            resultado = connection.execute(
+                update(stats_table).where(stats_table.c.chave == chave)
+                .values(valor=stats_table.c.valor + delta if somar else delta)
+            )
+            if resultado.rowcount == 0:
+                connection.execute(insert(stats_table).values(chave=chave, valor=delta))
+
+
+@event.listens_for(SemapaSession, 'after_flush')
+def _registrar_contadores(session, flush_context):
+    deltas = _deltas(session)
+    if deltas:
+        defer_after_commit(session, DELTAS_KEY, (session.connection().engine, deltas))
+
+
+@after_commit(DELTAS_KEY)
+def _atualizar_contadores(pendentes):
+    """Soma os deltas da transação confirmada, agrupados por engine"""
+    por_engine = {}
+    for engine, deltas in pendentes:
+        soma = por_engine.setdefault(engine, {})
+        for chave, delta in deltas.items():
+            soma[chave] = soma.get(chave, 0) + delta
+    for engine, soma in por_engine.items():
+        # Sempre na mesma ordem: duas transações nunca esperam uma pela outra
+        soma = {chave: delta for chave, delta in sorted(soma.items()) if delta}
+        if not soma:
+            continue
+        try:
+            with engine.begin() as connection:
+                _aplicar(connection, soma)
+        except Exception:
+            # A gravação principal já foi confirmada: não a transforma em erro
+            current_app.logger.exception("Falha ao atualizar dashboard_stats; "
+                                         "corrigido na próxima reconciliação")
@@ -1,5 +1,6 @@
 from models.especie_model import Especie
-from core.database import db
+from core.database import db, paginate_cursor, read_only
+from core.cache import cached
 from utils.validators import validate_especie
 
 class EspecieService:
@@ -7,6 +8,25 @@ class EspecieService:
     def list_all():
         return Especie.query.order_by(Especie.nome_cientifico).all()
 
+    @staticmethod
+    @cached(models=(Especie,))
+    def get_all():
+        """Opções para os selects de espécie (cacheado)"""
+        linhas = db.session.execute(
+            db.select(Especie.id, Especie.nome_popular, Especie.nome_cientifico)
+            .order_by(Especie.nome_cientifico)
+        ).all()
+        return [
+            {'id': id, 'nome_popular': popular, 'nome_cientifico': cientifico}
+            for id, popular, cientifico in linhas
+        ]
+
+    @staticmethod
+    @read_only
+    def get_cursor_page(cursor=None, per_page=50):
+        return paginate_cursor(Especie.query, Especie.nome_cientifico, Especie.id,
+                               cursor=cursor, per_page=per_page, descending=False)
+
     @staticmethod
     def create(data):
         validate_especie(data)
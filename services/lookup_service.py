@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Lookup Service
+Busca por prefixo para os campos de seleção remota dos formulários
+(requerentes, árvores, espécies e técnicos)
+"""
+
+from sqlalchemy import and_, or_, select
+from models import Requerente, Arvore, Especie, User
+from core.cache import cached
+from core.database import db, read_only
+from core.search import normalizar
+
+LOOKUP_LIMIT = 10
+LOOKUP_MAX_LIMIT = 20
+LOOKUP_TTL = 60  # segundos; as alterações invalidam antes via eventos do ORM
+
+
+def _prefixo(expressao, prefixo):
+    """`expressao` começa com `prefixo`, como intervalo [p, p') para usar o índice.
+
+    LIKE 'p%' só usa índice em condições específicas de collation; o
+    intervalo funciona com o índice comum da coluna *_busca (minúsculas e
+    sem acentos, mantida pelos modelos) em SQLite e PostgreSQL.
+    """
+    limite = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+    return and_(expressao >= prefixo, expressao < limite)
+
+
+class LookupService:
+    """Consultas curtas e cacheadas; retornam [{'id', 'texto'}]"""
+
+    @staticmethod
+    @read_only
+    def search(entidade, consulta, limit=LOOKUP_LIMIT):
+        buscar = LOOKUPS.get(entidade)
+        if buscar is None:
+            return None
+        termo = ' '.join(normalizar(consulta).split())
+        if not termo:
+            return []
+        limit = min(max(int(limit or LOOKUP_LIMIT), 1), LOOKUP_MAX_LIMIT)
+        return buscar(termo, limit)
+
+    @staticmethod
+    @cached(ttl=LOOKUP_TTL, models=(Requerente,))
+    def requerentes(termo, limit):
+        linhas = db.session.execute(
+            select(Requerente.id, Requerente.nome)
+            .where(_prefixo(Requerente.nome_busca, termo))
+            .order_by(Requerente.nome_busca, Requerente.id)
+            .limit(limit)
+        ).all()
+        return [{'id': id, 'texto': nome} for id, nome in linhas]
+
+    @staticmethod
+    @cached(ttl=LOOKUP_TTL, models=(Arvore,))
+    def arvores(termo, limit):
+        """Por número (id exato) ou início do endereço"""
+        filtro = _prefixo(Arvore.endereco_busca, termo)
+        if termo.isdigit():
+            filtro = or_(Arvore.id == int(termo), filtro)
+        linhas = db.session.execute(
+            select(Arvore.id, Arvore.endereco, Arvore.bairro)
+            .where(filtro)
+            .order_by(Arvore.endereco_busca, Arvore.id)
+            .limit(limit)
+        ).all()
+        return [
+            {'id': id, 'texto': f"{id} - {endereco or ''}" + (f" ({bairro})" if bairro else '')}
+            for id, endereco, bairro in linhas
+        ]
+
+    @staticmethod
+    @cached(ttl=LOOKUP_TTL, models=(Especie,))
+    def especies(termo, limit):
+        """Pelo início do nome popular ou do científico"""
+        linhas = db.session.execute(
+            select(Especie.id, Especie.nome_popular, Especie.nome_cientifico)
+            .where(or_(
+                _prefixo(Especie.nome_popular_busca, termo),
+                _prefixo(Especie.nome_cientifico_busca, termo),
+            ))
+            .order_by(Especie.nome_popular)
+            .limit(limit)
+        ).all()
+        return [
+            {'id': id, 'texto': f"{popular} ({cientifico})"}
+            for id, popular, cientifico in linhas
+        ]
+
+    @staticmethod
+    @cached(ttl=LOOKUP_TTL, models=(User,))
+    def tecnicos(termo, limit):
+        """Usuários ativos de nível 2+ pelo início do nome ou do e-mail"""
+        linhas = db.session.execute(
+            select(User.id, User.nome, User.email)
+            .where(
+                User.nivel >= 2, User.ativo.isnot(False),
+                or_(_prefixo(User.nome_busca, termo), _prefixo(User.email, termo)),
+            )
+            .order_by(User.nome_busca, User.id)
+            .limit(limit)
+        ).all()
+        return [{'id': id, 'texto': nome or email} for id, nome, email in linhas]
+
+
+LOOKUPS = {
+    'requerentes': LookupService.requerentes,
+    'arvores': LookupService.arvores,
+    'especies': LookupService.especies,
+    'tecnicos': LookupService.tecnicos,
+}
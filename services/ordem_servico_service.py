@@ -1,8 +1,21 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from models.ordem_servico_model import OrdemServico
-from core.database import db
+from models.requerimento_model import Requerimento
+from core.database import db, paginate_cursor, apply_profile, read_only
 from utils.validators import validate_ordem_servico
 
+# Tentativas de gravação quando o número gerado já existe (ex.: digitado à mão)
+NUMERO_TENTATIVAS = 3
+
 class OrdemServicoService:
+    PROFILES = {
+        'list': lambda: (
+            selectinload(OrdemServico.requerimentos).joinedload(Requerimento.requerente),
+            joinedload(OrdemServico.criador),
+        ),
+    }
+
     @staticmethod
     def list_all(status=None):
         query = OrdemServico.query
@@ -10,13 +23,51 @@ class OrdemServicoService:
             query = query.filter_by(status=status)
         return query.all()
 
+    @staticmethod
+    @read_only
+    def get_paginated(cursor=None, per_page=20, status=None, prioridade=None,
+                      responsavel_id=None, data_inicio=None, data_fim=None, search=None,
+                      profile='list'):
+        """Lista por cursor (data_emissao DESC, id DESC). Retorna CursorPage.
+
+        `prioridade` e `responsavel_id` são aceitos pela tela mas não existem
+        colunas correspondentes no DDL (responsavel é texto livre).
+        """
+        query = OrdemServico.query
+        if status:
+            query = query.filter_by(status=status)
+        if data_inicio:
+            query = query.filter(OrdemServico.data_emissao >= data_inicio)
+        if data_fim:
+            query = query.filter(OrdemServico.data_emissao <= data_fim)
+        if search:
+            query = query.filter(OrdemServico.numero.ilike(f"%{search}%"))
+        query = apply_profile(query, OrdemServicoService.PROFILES, profile)
+        return paginate_cursor(query, OrdemServico.data_emissao, OrdemServico.id,
+                               cursor=cursor, per_page=per_page,
+                               nulos=False if data_inicio or data_fim else None)
+
     @staticmethod
     def create(data):
         validate_ordem_servico(data)
-        ordem = OrdemServico(**data)
-        db.session.add(ordem)
-        db.session.commit()
-        return ordem
+        if data.get('numero'):
+            ordem = OrdemServico(**data)
+            db.session.add(ordem)
+            db.session.commit()
+            return ordem
+        for _ in range(NUMERO_TENTATIVAS):
+            ordem = OrdemServico(**{**data, 'numero': OrdemServico.generate_numero()})
+            try:
+                # Número repetido desfaz só o SAVEPOINT, não a unidade de trabalho
+                with db.session.begin_nested():
+                    db.session.add(ordem)
+            except IntegrityError:
+                if not OrdemServico.query.filter_by(numero=ordem.numero).first():
+                    raise
+                continue
+            db.session.commit()
+            return ordem
+        raise ValueError("Não foi possível gerar um número único para a ordem de serviço")
 
     @staticmethod
     def update(ordem_id, data):
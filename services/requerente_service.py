@@ -1,6 +1,8 @@
 from models.requerente_model import Requerente
+from core.database import db, paginate_query, paginate_cursor, read_only
+from core.cache import cached
 from core.exceptions import ValidationError, NotFoundError
-from sqlalchemy import or_
+from core.search import filtro_busca
 
 class RequerenteService:
     """Serviço de gerenciamento de requerentes"""
@@ -49,28 +51,34 @@ class RequerenteService:
         return requerente
 
     @staticmethod
+    @read_only
     def search(query, page=1, per_page=10):
         """Busca requerentes com paginação e case-insensitive"""
 
+        consulta = Requerente.query
         if query:
-            ilike_query = f"%{query}%"
-            requerentes = Requerente.query.filter(
-                or_(
-                    Requerente.nome.ilike(ilike_query),
-                    Requerente.telefone.ilike(ilike_query),
-                    Requerente.observacao.ilike(ilike_query)
-                )
-            ).order_by(Requerente.nome).all()
-        else:
-            requerentes = Requerente.query.order_by(Requerente.nome).all()
-
-        start = (page - 1) * per_page
-        end = start + per_page
-        return requerentes[start:end], len(requerentes)
+            consulta = consulta.filter(filtro_busca(
+                Requerente, query, Requerente.nome, Requerente.telefone, Requerente.observacao
+            ))
+
+        return paginate_query(consulta.order_by(Requerente.nome, Requerente.id), page=page, per_page=per_page)
 
     @staticmethod
     def get_all(page=1, per_page=10):
-        pagination = Requerente.query.order_by(Requerente.nome).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        return pagination.items, pagination.total
+        consulta = Requerente.query.order_by(Requerente.nome, Requerente.id)
+        return paginate_query(consulta, page=page, per_page=per_page)
+
+    @staticmethod
+    @cached(models=(Requerente,))
+    def get_options():
+        """Id e nome de todos os requerentes, para os selects (cacheado)"""
+        linhas = db.session.execute(
+            db.select(Requerente.id, Requerente.nome).order_by(Requerente.nome, Requerente.id)
+        ).all()
+        return [{'id': id, 'nome': nome} for id, nome in linhas]
+
+    @staticmethod
+    @read_only
+    def get_cursor_page(cursor=None, per_page=50):
+        return paginate_cursor(Requerente.query, Requerente.nome, Requerente.id,
+                               cursor=cursor, per_page=per_page, descending=False)
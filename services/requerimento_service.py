@@ -2,12 +2,35 @@ from models.requerimento_model import Requerimento
 from models.requerente_model import Requerente
 from models.arvore_model import Arvore
 from models.user_model import User
+from core.database import db, paginate_cursor, apply_profile, read_only
+from core.search import filtro_busca
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from core.exceptions import ValidationError, NotFoundError
-from sqlalchemy import or_
+
+# Tentativas de gravação quando o número gerado já existe (ex.: digitado à mão)
+NUMERO_TENTATIVAS = 3
 
 class RequerimentoService:
     """Serviço de gerenciamento de requerimentos"""
 
+    # Opções de carregamento por tela: evitam N+1 nas relações usadas por cada uma
+    PROFILES = {
+        'list': lambda: (
+            joinedload(Requerimento.requerente),
+            joinedload(Requerimento.arvore).joinedload(Arvore.especie),
+            joinedload(Requerimento.criador),
+        ),
+        'detail': lambda: (
+            joinedload(Requerimento.requerente),
+            joinedload(Requerimento.arvore).joinedload(Arvore.especie),
+            joinedload(Requerimento.criador),
+            joinedload(Requerimento.atualizador),
+            selectinload(Requerimento.ordens_servico),
+            selectinload(Requerimento.vistorias),
+        ),
+    }
+
     @staticmethod
     def create(data):
         """Cria novo requerimento - data é dict com campos"""
@@ -33,19 +56,30 @@ class RequerimentoService:
         if not User.query.get(usuario_id):
             raise ValidationError("Usuário não encontrado")
 
-        numero = Requerimento.generate_numero()
-        requerimento = Requerimento(
-            numero=numero,
-            requerente_id=requerente_id,
-            arvore_id=arvore_id,
-            criado_por=usuario_id,
-            tipo=tipo,
-            motivo=descricao,
-            observacao=observacoes,
-            status='aberto',
-            data_abertura=None
-        )
-        return requerimento.save()
+        for _ in range(NUMERO_TENTATIVAS):
+            requerimento = Requerimento(
+                numero=Requerimento.generate_numero(),
+                requerente_id=requerente_id,
+                arvore_id=arvore_id,
+                criado_por=usuario_id,
+                tipo=tipo,
+                motivo=descricao,
+                observacao=observacoes,
+                status='aberto',
+                data_abertura=None
+            )
+            try:
+                # Só o SAVEPOINT é desfeito se o número já existir: o contador
+                # já incrementado e o resto da transação (unidade de trabalho)
+                # continuam valendo
+                with db.session.begin_nested():
+                    db.session.add(requerimento)
+            except IntegrityError:
+                if not Requerimento.query.filter_by(numero=requerimento.numero).first():
+                    raise
+                continue
+            return requerimento.save()
+        raise ValidationError("Não foi possível gerar um número único para o requerimento")
 
     @staticmethod
     def update(requerimento_id, data):
@@ -63,8 +97,9 @@ class RequerimentoService:
         return requerimento.save()
 
     @staticmethod
-    def get_by_id(requerimento_id):
-        requerimento = Requerimento.query.get(requerimento_id)
+    def get_by_id(requerimento_id, profile=None):
+        consulta = apply_profile(Requerimento.query, RequerimentoService.PROFILES, profile)
+        requerimento = consulta.filter(Requerimento.id == requerimento_id).first()
         if not requerimento:
             raise NotFoundError("Requerimento não encontrado")
         return requerimento
@@ -75,26 +110,34 @@ class RequerimentoService:
         return requerimento and requerimento.pode_editar
 
     @staticmethod
+    @read_only
     def search(term, limit=50):
         query = Requerimento.query
         if term and len(term) >= 2:
-            ilike_term = f"%{term}%"
-            query = query.filter(
-                or_(
-                    Requerimento.numero.ilike(ilike_term),
-                    Requerimento.tipo.ilike(ilike_term),
-                    Requerimento.status.ilike(ilike_term),
-                    Requerimento.motivo.ilike(ilike_term),
-                    Requerimento.observacao.ilike(ilike_term),
-                    Requerimento.prioridade.ilike(ilike_term)
-                )
-            )
+            query = query.filter(filtro_busca(
+                Requerimento, term,
+                Requerimento.numero, Requerimento.tipo, Requerimento.status,
+                Requerimento.motivo, Requerimento.observacao, Requerimento.prioridade
+            ))
         # Se o termo estiver vazio, retorna todos (limitados)
         return query.order_by(Requerimento.data_abertura.desc()).limit(limit).all()
     
     @staticmethod
-    def get_paginated(page=1, per_page=10, status=None, tipo=None, requerente_id=None,
-                      data_inicio=None, data_fim=None, search=None):
+    @read_only
+    def get_paginated(cursor=None, per_page=10, status=None, tipo=None, requerente_id=None,
+                      data_inicio=None, data_fim=None, search=None, profile='list'):
+        """Lista por cursor (data_abertura DESC, id DESC). Retorna CursorPage."""
+        query = RequerimentoService._filtered_query(
+            status, tipo, requerente_id, data_inicio, data_fim, search
+        )
+        query = apply_profile(query, RequerimentoService.PROFILES, profile)
+        return paginate_cursor(query, Requerimento.data_abertura, Requerimento.id,
+                               cursor=cursor, per_page=per_page,
+                               nulos=False if data_inicio or data_fim else None)
+
+    @staticmethod
+    def _filtered_query(status=None, tipo=None, requerente_id=None,
+                        data_inicio=None, data_fim=None, search=None):
         query = Requerimento.query
 
         if status:
@@ -116,7 +159,7 @@ class RequerimentoService:
             ilike_query = f"%{search}%"
             query = query.filter(Requerimento.numero.ilike(ilike_query))
 
-        return query.order_by(Requerimento.data_abertura.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        return query
 
     @staticmethod
     def get_tipos():
@@ -127,6 +170,7 @@ class RequerimentoService:
         return ['pendente', 'aprovado', 'negado', 'concluido']
 
     @staticmethod
+    @read_only
     def get_statistics():
         """Retorna estatísticas dos requerimentos"""
         return {
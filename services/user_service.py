@@ -1,5 +1,6 @@
 from models.user_model import User
 from core.database import db
+from core.cache import cached
 from utils.validators import validate_user
 
 class UserService:
@@ -11,6 +12,17 @@ class UserService:
     def get_by_email(email):
         return User.query.filter_by(email=email).first()
 
+    @staticmethod
+    @cached(models=(User,))
+    def get_technicians():
+        """Usuários ativos com nível técnico (2+) para os selects (cacheado)"""
+        linhas = db.session.execute(
+            db.select(User.id, User.nome, User.email)
+            .where(User.nivel >= 2, User.ativo.isnot(False))
+            .order_by(User.nome, User.id)
+        ).all()
+        return [{'id': id, 'nome': nome or email, 'email': email} for id, nome, email in linhas]
+
     @staticmethod
     def create(data):
         validate_user(data)
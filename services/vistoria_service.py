@@ -1,13 +1,58 @@
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
 from models.vistoria_model import Vistoria
-from core.database import db
-from utils.helpers import handle_upload
+from models.vistoria_foto_model import VistoriaFoto
+from core.database import db, paginate_cursor, apply_profile, read_only
+from core.storage import get_blob_store, detect_mime_type
+from utils.images import agendar_variantes_blob
+from utils.helpers import allowed_file
 from utils.validators import validate_vistoria
 
 class VistoriaService:
+    # Extensões aceitas nas fotos de vistoria
+    EXTENSOES_FOTO = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+    PROFILES = {
+        'list': lambda: (
+            joinedload(Vistoria.requerimento),
+            joinedload(Vistoria.usuario),
+        ),
+        'detail': lambda: (
+            joinedload(Vistoria.requerimento),
+            joinedload(Vistoria.usuario),
+            joinedload(Vistoria.especie),
+            selectinload(Vistoria.fotos),
+        ),
+    }
+
     @staticmethod
     def list_by_ordem_servico(ordem_id):
         return Vistoria.query.filter_by(ordem_servico_id=ordem_id).all()
 
+    @staticmethod
+    @read_only
+    def get_paginated(cursor=None, per_page=20, status=None, tipo=None, tecnico_id=None,
+                      data_inicio=None, data_fim=None, search=None, profile='list'):
+        """Lista por cursor (vistoria_data DESC, id DESC). Retorna CursorPage.
+
+        `tipo` é aceito pela tela mas não existe coluna correspondente no DDL.
+        """
+        query = Vistoria.query
+        if status:
+            query = query.filter_by(status=status)
+        if tecnico_id:
+            query = query.filter_by(user_id=tecnico_id)
+        if data_inicio:
+            query = query.filter(Vistoria.vistoria_data >= data_inicio)
+        if data_fim:
+            query = query.filter(Vistoria.vistoria_data <= data_fim)
+        if search:
+            query = query.filter(Vistoria.observacoes.ilike(f"%{search}%"))
+        query = apply_profile(query, VistoriaService.PROFILES, profile)
+        return paginate_cursor(query, Vistoria.vistoria_data, Vistoria.id,
+                               cursor=cursor, per_page=per_page)
+
     @staticmethod
     def create(data, files):
         validate_vistoria(data)
@@ -15,7 +60,7 @@ class VistoriaService:
         db.session.add(vistoria)
         db.session.commit()
         if files:
-            handle_upload(files, vistoria.id, 'vistoria')
+            VistoriaService.add_fotos(vistoria.id, files)
         return vistoria
 
     @staticmethod
@@ -31,3 +76,68 @@ class VistoriaService:
         vistoria = Vistoria.query.get_or_404(vistoria_id)
         db.session.delete(vistoria)
         db.session.commit()
+
+    @staticmethod
+    def add_foto(vistoria_id, file):
+        """Grava uma foto enviada (FileStorage) no blob store e a vincula à vistoria"""
+        foto = VistoriaFoto.from_upload(
+            vistoria_id,
+            file.stream,
+            arquivo_nome=file.filename,
+            mime_type=file.mimetype or None
+        )
+        db.session.add(foto)
+        db.session.commit()
+        if foto.mime_type.startswith('image/'):
+            agendar_variantes_blob(get_blob_store(), current_app.config['IMAGE_VARIANTS_PATH'], foto.sha256)
+        return foto
+
+    @staticmethod
+    def add_fotos(vistoria_id, files):
+        """Grava no blob store as fotos enviadas com extensão de imagem (as
+        demais são ignoradas). Retorna as fotos gravadas."""
+        return [
+            VistoriaService.add_foto(vistoria_id, file) for file in files
+            if file and file.filename and allowed_file(file.filename, VistoriaService.EXTENSOES_FOTO)
+        ]
+
+    @staticmethod
+    def migrate_fotos_to_blob_store(batch_size=50):
+        """Move os blobs legados de vistoria_foto.arquivo para o blob store.
+
+        Lê um blob por vez (nunca o lote inteiro) e faz commit a cada lote.
+        Retorna o total de fotos migradas.
+        """
+        store = get_blob_store()
+        tabela = VistoriaFoto.__table__
+        migradas = 0
+        ultimo_id = 0
+        while True:
+            ids = db.session.execute(
+                select(tabela.c.id)
+                .where(tabela.c.id > ultimo_id, tabela.c.sha256.is_(None))
+                .order_by(tabela.c.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                return migradas
+
+            for foto_id in ids:
+                nome, conteudo = db.session.execute(
+                    select(tabela.c.arquivo_nome, tabela.c.arquivo).where(tabela.c.id == foto_id)
+                ).one()
+                conteudo = conteudo or b''
+                sha256, tamanho = store.put(conteudo)
+                db.session.execute(
+                    tabela.update().where(tabela.c.id == foto_id).values(
+                        sha256=sha256,
+                        tamanho=tamanho,
+                        mime_type=detect_mime_type(nome, conteudo[:16]),
+                        arquivo=b''
+                    )
+                )
+                del conteudo
+
+            db.session.commit()
+            migradas += len(ids)
+            ultimo_id = ids[-1]
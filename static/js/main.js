@@ -34,6 +34,43 @@ document.addEventListener('DOMContentLoaded', function () {
     });
   });
 
+  // Campos de busca remota (macro lookup_field): consulta a API enquanto o
+  // usuário digita e grava o id da opção escolhida no campo oculto
+  document.querySelectorAll('input[data-lookup]').forEach(function (campo) {
+    const oculto = document.getElementById(campo.dataset.target);
+    const lista = document.getElementById(campo.getAttribute('list'));
+    let opcoes = {};
+    let espera = null;
+
+    function validar() {
+      campo.setCustomValidity(oculto.value || !campo.value && !campo.required ? '' : 'Selecione uma opção da lista');
+    }
+
+    campo.addEventListener('input', function () {
+      oculto.value = opcoes[campo.value] || '';
+      validar();
+      clearTimeout(espera);
+      const termo = campo.value.trim();
+      if (oculto.value || !termo) return;
+      espera = setTimeout(function () {
+        fetch(campo.dataset.lookup + '?q=' + encodeURIComponent(termo), { credentials: 'same-origin' })
+          .then(function (resposta) { return resposta.ok ? resposta.json() : { items: [] }; })
+          .then(function (dados) {
+            opcoes = {};
+            lista.innerHTML = '';
+            dados.items.forEach(function (item) {
+              opcoes[item.texto] = item.id;
+              const opcao = document.createElement('option');
+              opcao.value = item.texto;
+              lista.appendChild(opcao);
+            });
+            oculto.value = opcoes[campo.value] || '';
+            validar();
+          });
+      }, 200);
+    });
+  });
+
   // Você pode adicionar seus scripts personalizados abaixo...
   
 });
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Fixtures dos testes
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+@pytest.fixture
+def banco_original(tmp_path):
+    """Engine de um SQLite com o esquema do antigo db.create_all() (sem schema_version)"""
+    caminho = tmp_path / 'original.db'
+    with sqlite3.connect(caminho) as conexao:
+        conexao.executescript((FIXTURES / 'esquema_original.sql').read_text(encoding='utf-8'))
+    engine = create_engine(f'sqlite:///{caminho}')
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def banco_vazio(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'novo.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App com banco, blob store e variantes em diretório temporário"""
+    from config.settings import Config, engine_options
+    from app import create_app
+
+    uri = f"sqlite:///{tmp_path / 'app.db'}"
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = uri
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options(uri)
+        SQLALCHEMY_BINDS = {}
+        SQLALCHEMY_ECHO = False
+        DB_SCHEMA_CHECK = 'upgrade'
+        WTF_CSRF_ENABLED = False
+        LAZY_BLUEPRINTS = False
+        BLOB_STORE_BACKEND = 'local'
+        BLOB_STORE_PATH = tmp_path / 'blobs'
+        IMAGE_VARIANTS_PATH = tmp_path / 'variantes'
+        TEMPLATE_CACHE_DIR = ''
+        CACHE_BACKEND = 'memory'
+
+    from core.database import db
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def admin(app):
+    from core.database import db
+    from models.user_model import User
+
+    usuario = User(email='admin@semapa.test', password='senha-de-teste', nome='Admin', nivel=3)
+    db.session.add(usuario)
+    db.session.commit()
+    return usuario
+
+
+@pytest.fixture
+def cliente(app, admin):
+    """Test client com a sessão do administrador"""
+    client = app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['_user_id'] = str(admin.id)
+        sessao['_fresh'] = True
+    return client
@@ -0,0 +1,156 @@
+-- Esquema criado pelo db.create_all() da versão anterior às migrações
+-- (banco legado, sem schema_version), para os testes de upgrade
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	email VARCHAR(100) NOT NULL, 
+	password VARCHAR(200) NOT NULL, 
+	nome VARCHAR(100), 
+	telefone VARCHAR(20), 
+	nivel INTEGER NOT NULL, 
+	ativo BOOLEAN, 
+	ultimo_login DATETIME, 
+	PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+
+CREATE TABLE especies (
+	id INTEGER NOT NULL, 
+	nome_popular VARCHAR(100) NOT NULL, 
+	nome_cientifico VARCHAR(150) NOT NULL, 
+	porte VARCHAR(20) NOT NULL, 
+	altura_min FLOAT, 
+	altura_max FLOAT, 
+	longevidade_min INTEGER, 
+	longevidade_max INTEGER, 
+	deciduidade VARCHAR(30), 
+	cor_flor VARCHAR(50), 
+	epoca_floracao VARCHAR(50), 
+	fruto_comestivel VARCHAR(10), 
+	epoca_frutificacao VARCHAR(50), 
+	necessidade_rega VARCHAR(20), 
+	atrai_fauna VARCHAR(10), 
+	observacoes TEXT, 
+	link_foto VARCHAR(200), 
+	PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX ix_especies_nome_popular ON especies (nome_popular);
+
+CREATE INDEX ix_especies_nome_cientifico ON especies (nome_cientifico);
+
+CREATE TABLE requerentes (
+	id INTEGER NOT NULL, 
+	nome VARCHAR(100), 
+	telefone VARCHAR(20), 
+	observacao TEXT, 
+	data_criacao DATETIME, 
+	criado_por INTEGER, 
+	data_atualizacao DATETIME, 
+	atualizado_por INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(criado_por) REFERENCES users (id), 
+	FOREIGN KEY(atualizado_por) REFERENCES users (id)
+);
+
+CREATE TABLE arvores (
+	id INTEGER NOT NULL, 
+	endereco VARCHAR(200), 
+	bairro VARCHAR(100), 
+	latitude VARCHAR(20), 
+	longitude VARCHAR(20), 
+	data_plantio DATETIME, 
+	foto VARCHAR(200), 
+	observacao TEXT, 
+	data_criacao DATETIME, 
+	criado_por INTEGER, 
+	data_atualizacao DATETIME, 
+	atualizado_por INTEGER, 
+	especie_id INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(criado_por) REFERENCES users (id), 
+	FOREIGN KEY(atualizado_por) REFERENCES users (id), 
+	FOREIGN KEY(especie_id) REFERENCES especies (id)
+);
+
+CREATE TABLE ordens_servico (
+	id INTEGER NOT NULL, 
+	numero VARCHAR(20), 
+	data_emissao DATETIME, 
+	data_execucao DATETIME, 
+	responsavel VARCHAR(100), 
+	status VARCHAR(30), 
+	observacao TEXT, 
+	criado_por INTEGER, 
+	data_atualizacao DATETIME, 
+	atualizado_por INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(criado_por) REFERENCES users (id), 
+	FOREIGN KEY(atualizado_por) REFERENCES users (id)
+);
+
+CREATE UNIQUE INDEX ix_ordens_servico_numero ON ordens_servico (numero);
+
+CREATE TABLE requerimentos (
+	id INTEGER NOT NULL, 
+	numero VARCHAR(20), 
+	data_abertura DATETIME, 
+	tipo TEXT, 
+	motivo TEXT, 
+	status VARCHAR(30), 
+	prioridade VARCHAR(20), 
+	requerente_id INTEGER, 
+	arvore_id INTEGER, 
+	observacao TEXT, 
+	data_criacao DATETIME, 
+	criado_por INTEGER, 
+	data_atualizacao DATETIME, 
+	atualizado_por INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(requerente_id) REFERENCES requerentes (id), 
+	FOREIGN KEY(arvore_id) REFERENCES arvores (id), 
+	FOREIGN KEY(criado_por) REFERENCES users (id), 
+	FOREIGN KEY(atualizado_por) REFERENCES users (id)
+);
+
+CREATE UNIQUE INDEX ix_requerimentos_numero ON requerimentos (numero);
+
+CREATE TABLE vistoria (
+	id INTEGER NOT NULL, 
+	requerimento_id INTEGER NOT NULL, 
+	vistoria_data DATETIME NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	status VARCHAR(30) NOT NULL, 
+	observacoes TEXT, 
+	especie_id INTEGER, 
+	condicoes TEXT, 
+	conflitos TEXT, 
+	risco_queda VARCHAR(10), 
+	diagnostico TEXT, 
+	acao_recomendada VARCHAR(20), 
+	tipo_poda TEXT, 
+	galhos_cortar TEXT, 
+	medidas_seguranca TEXT, 
+	observacoes_tecnicas TEXT, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(requerimento_id) REFERENCES requerimentos (id) ON DELETE CASCADE, 
+	FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE SET NULL, 
+	FOREIGN KEY(especie_id) REFERENCES especies (id)
+);
+
+CREATE TABLE ordem_servico_requerimento (
+	ordem_servico_id INTEGER NOT NULL, 
+	requerimento_id INTEGER NOT NULL, 
+	PRIMARY KEY (ordem_servico_id, requerimento_id), 
+	FOREIGN KEY(ordem_servico_id) REFERENCES ordens_servico (id), 
+	FOREIGN KEY(requerimento_id) REFERENCES requerimentos (id)
+);
+
+CREATE TABLE vistoria_foto (
+	id INTEGER NOT NULL, 
+	vistoria_id INTEGER NOT NULL, 
+	arquivo_nome VARCHAR(255), 
+	arquivo BLOB NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(vistoria_id) REFERENCES vistoria (id) ON DELETE CASCADE
+);
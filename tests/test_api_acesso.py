@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes de acesso às rotas de busca, exportação, mapa e listagens da API
+"""
+
+import pytest
+
+from core.database import db
+from models.user_model import User
+
+ROTAS = [
+    '/api/search?q=ipe',
+    '/api/arvores/export.csv',
+    '/api/arvores/bbox?min_lat=-24&min_lng=-47&max_lat=-23&max_lng=-46',
+    '/api/arvores/raio?lat=-23.5&lng=-46.6&metros=100',
+    '/api/arvores/tiles/0/0/0.json',
+    '/api/requerimentos',
+]
+
+
+@pytest.mark.parametrize('url', ROTAS)
+def test_exige_login(app, url):
+    response = app.test_client().get(url)
+
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+@pytest.mark.parametrize('url', ROTAS)
+def test_administrador_acessa(cliente, url):
+    assert cliente.get(url).status_code == 200
+
+
+def test_exportacao_exige_nivel_2(app):
+    usuario = User(email='leitor@semapa.test', password='senha-de-teste', nome='Leitor', nivel=1)
+    db.session.add(usuario)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['_user_id'] = str(usuario.id)
+
+    assert client.get('/api/arvores/export.csv').status_code == 403
+    assert client.get('/api/search?q=ipe').status_code == 200
+
+
+def test_tile_nao_fica_em_cache_compartilhado(cliente):
+    response = cliente.get('/api/arvores/tiles/0/0/0.json')
+
+    assert response.cache_control.private and not response.cache_control.public
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes das métricas do cache (core/cache.py)
+"""
+
+import fnmatch
+
+from core.cache import Cache, MemoryBackend, get_cache
+from core.cli import semapa_cli
+from core.database import db
+from models import Especie
+
+
+class _BackendCompartilhado(MemoryBackend):
+    """Faz as vezes do Redis: mesmo armazenamento visto por dois Cache"""
+    compartilhado = True
+
+    def __init__(self):
+        super().__init__()
+        self.envios = 0
+
+    def incr_many(self, quantidades):
+        self.envios += 1
+        with self._lock:
+            for chave, n in quantidades.items():
+                expira, valor = self._itens.get(chave, (None, 0))
+                self._itens[chave] = (expira, int(valor) + n)
+
+    def scan(self, padrao):
+        with self._lock:
+            return {chave: str(valor) for chave, (_, valor) in self._itens.items()
+                    if fnmatch.fnmatchcase(chave, padrao)}
+
+
+class _BackendForaDoAr(MemoryBackend):
+    def get_many(self, chaves):
+        raise ConnectionError('redis fora do ar')
+
+    def add(self, chave, valor):
+        raise ConnectionError('redis fora do ar')
+
+
+def test_metricas_somadas_entre_workers():
+    backend = _BackendCompartilhado()
+    worker_a, worker_b = Cache(backend), Cache(backend)
+
+    worker_a.remember('lookup', [1], lambda: 'x')
+    worker_b.remember('lookup', [1], lambda: 'y')
+    for worker in (worker_a, worker_b):
+        worker.flush_metrics()
+
+    for worker in (worker_a, worker_b):
+        assert worker.stats()['por_nome'] == {'lookup': {'hits': 1, 'misses': 1, 'hit_ratio': 0.5}}
+
+
+def test_metricas_enviadas_em_lote():
+    backend = _BackendCompartilhado()
+    cache = Cache(backend, metrics_flush=3600)
+
+    for _ in range(50):
+        cache.remember('lookup', [1], lambda: 'x')
+
+    assert backend.envios == 0
+    assert cache.stats()['por_nome']['lookup'] == {'hits': 49, 'misses': 1, 'hit_ratio': 0.98}
+    assert backend.envios == 1
+
+
+def test_backend_fora_do_ar_vira_erro_de_cache():
+    cache = Cache(_BackendForaDoAr())
+
+    assert cache.remember('lookup', [1], lambda: 'x', tabelas=('especies',)) == 'x'
+
+
+def test_invalidacao_com_falha_nao_derruba_a_gravacao(app, monkeypatch):
+    def falhar(*tabelas):
+        raise ConnectionError('redis fora do ar')
+
+    monkeypatch.setattr(get_cache(), 'invalidate', falhar)
+    db.session.add(Especie(nome_popular='Ipê-Roxo', nome_cientifico='Handroanthus impetiginosus', porte='grande'))
+    db.session.commit()
+
+    assert Especie.query.filter_by(nome_popular='Ipê-Roxo').count() == 1
+
+
+def test_cache_stats_recusa_backend_em_memoria(app):
+    resultado = app.test_cli_runner().invoke(semapa_cli, ['cache-stats'])
+
+    assert resultado.exit_code != 0
+    assert 'por processo' in resultado.output
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes do orçamento de consultas por endpoint (check-queries)
+"""
+
+from core.cli import semapa_cli
+from core.metrics import _descrever_parametros
+
+
+def test_paginas_dentro_do_orcamento(app, admin):
+    resultado = app.test_cli_runner().invoke(semapa_cli, ['check-queries'])
+
+    assert resultado.exit_code == 0, resultado.output
+    assert '❌' not in resultado.output
+
+
+def test_sem_usuario_falha(app):
+    resultado = app.test_cli_runner().invoke(semapa_cli, ['check-queries'])
+
+    assert resultado.exit_code != 0
+    assert 'Usuário não encontrado' in resultado.output
+
+
+def test_log_de_consulta_lenta_nao_expoe_valores():
+    hash_senha = '$2b$12$abcdefghijklmnopqrstuv'
+
+    assert _descrever_parametros(('ana@x.test', hash_senha, 3), False) == '(str, str, int)'
+    assert _descrever_parametros({'telefone': '11999990000'}, False) == '{telefone: str}'
+    assert _descrever_parametros([(1, hash_senha)] * 2, True) == '2 linhas × (int, str)'
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes dos contadores materializados do dashboard
+"""
+
+import pytest
+from sqlalchemy import select
+
+from core.cache import get_cache
+from core.cli import semapa_cli
+from core.database import db, unit_of_work
+from models import Requerente
+from services.dashboard_service import DashboardService, stats_table
+
+
+def _contador(chave):
+    # Conexão própria: enxerga só o que já foi confirmado
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(stats_table.c.valor).where(stats_table.c.chave == chave)
+        ).scalar()
+
+
+@pytest.fixture
+def reconciliado(app):
+    DashboardService.reconcile()
+    return _contador('requerentes')
+
+
+def test_deltas_somados_so_depois_do_commit(reconciliado):
+    with unit_of_work():
+        Requerente(nome='Ana').save()
+        Requerente(nome='Bia').save()
+        assert _contador('requerentes') == reconciliado
+
+    assert _contador('requerentes') == reconciliado + 2
+
+
+def test_savepoint_desfeito_descarta_so_os_proprios_deltas(reconciliado):
+    versao = get_cache().version(Requerente.__tablename__)
+    with unit_of_work():
+        Requerente(nome='Ana').save()
+        with pytest.raises(RuntimeError):
+            with db.session.begin_nested():
+                db.session.add(Requerente(nome='Bia'))
+                db.session.flush()
+                raise RuntimeError
+
+    assert _contador('requerentes') == reconciliado + 1
+    assert get_cache().version(Requerente.__tablename__) != versao
+
+
+def test_rollback_descarta_os_deltas(reconciliado):
+    db.session.add(Requerente(nome='Ana'))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert _contador('requerentes') == reconciliado
+
+
+def test_reconcile_na_mesma_transacao_nao_conta_duas_vezes(reconciliado):
+    db.session.add(Requerente(nome='Ana'))
+    db.session.flush()
+    DashboardService.reconcile()
+
+    assert _contador('requerentes') == reconciliado + 1
+
+
+def test_get_stats_so_le_os_contadores(app):
+    db.session.add(Requerente(nome='Ana'))
+    db.session.commit()
+    db.session.execute(stats_table.delete())
+    db.session.commit()
+
+    stats, _ = DashboardService.get_stats()
+
+    assert stats['total_requerentes'] == 0
+    assert DashboardService.reconciliado_em() is None
+
+
+def test_reconcile_sobrescreve_os_contadores(reconciliado):
+    db.session.execute(stats_table.update().values(valor=stats_table.c.valor + 10))
+    db.session.execute(stats_table.insert().values(chave='requerimento.status:extinto', valor=3))
+    db.session.commit()
+
+    DashboardService.reconcile()
+
+    assert _contador('requerentes') == reconciliado
+    assert _contador('requerimento.status:extinto') == 0
+
+
+def test_db_upgrade_calcula_os_contadores_na_primeira_vez(app):
+    db.session.add(Requerente(nome='Ana'))
+    db.session.commit()
+
+    resultado = app.test_cli_runner().invoke(semapa_cli, ['db', 'upgrade'])
+
+    assert resultado.exit_code == 0, resultado.output
+    assert _contador('requerentes') == 1
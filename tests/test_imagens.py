@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes das URLs de variantes de imagens em static/
+"""
+
+import os
+
+from flask import current_app
+
+from utils.images import imagem_variante
+
+
+def _gravar(raiz, relativo, conteudo=b'x'):
+    caminho = raiz / relativo
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.write_bytes(conteudo)
+    return caminho
+
+
+def test_variante_usa_url_versionada_e_cache_imutavel(app, tmp_path):
+    app.static_folder = str(tmp_path)
+    _gravar(tmp_path, 'uploads/arvores/ipe.jpg')
+    variante = _gravar(tmp_path, 'uploads/arvores/variantes/ipe.jpg.thumb.webp')
+
+    with app.test_request_context():
+        url = imagem_variante('uploads/arvores/ipe.jpg', 'thumb', 'webp')
+    assert url == f'/static/uploads/arvores/variantes/ipe.jpg.thumb.webp?v={variante.stat().st_mtime_ns:x}'
+
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == current_app.config['IMAGE_CACHE_MAX_AGE']
+    assert not response.cache_control.no_cache
+
+
+def test_novo_upload_com_mesmo_nome_muda_a_url(app, tmp_path):
+    app.static_folder = str(tmp_path)
+    original = _gravar(tmp_path, 'uploads/arvores/ipe.jpg')
+
+    with app.test_request_context():
+        antes = imagem_variante('uploads/arvores/ipe.jpg')
+        os.utime(original, ns=(original.stat().st_atime_ns, original.stat().st_mtime_ns + 10**9))
+        depois = imagem_variante('uploads/arvores/ipe.jpg')
+    assert antes.startswith('/static/uploads/arvores/ipe.jpg?v=') and antes != depois
+
+
+def test_static_sem_versao_mantem_revalidacao(app, tmp_path):
+    app.static_folder = str(tmp_path)
+    _gravar(tmp_path, 'css/site.css')
+
+    response = app.test_client().get('/static/css/site.css')
+    assert not response.cache_control.immutable
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes da conferência de índices (assert_indexed / check-indexes)
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from core import database
+from core.cli import _consultas_indexadas, semapa_cli
+from core.database import assert_indexed, explain_plan
+from services.requerimento_service import RequerimentoService
+
+CONSULTAS = _consultas_indexadas()
+
+
+@pytest.mark.parametrize('indice, consulta', [c[1:] for c in CONSULTAS], ids=[c[0] for c in CONSULTAS])
+def test_listagem_usa_o_indice(app, indice, consulta):
+    # Sem full scan nem B-tree temporário para ordenar, em cada listagem do check-indexes
+    with assert_indexed(indice) as contador:
+        consulta()
+    assert contador.count and not contador.unsupported
+
+
+def test_indice_nao_usado_falha(app):
+    with pytest.raises(AssertionError, match='ix_inexistente'):
+        with assert_indexed('ix_inexistente'):
+            RequerimentoService.get_paginated()
+
+
+def test_explain_plan_de_dialeto_nao_suportado():
+    conexao = SimpleNamespace(dialect=SimpleNamespace(name='mysql'))
+    assert explain_plan(conexao, 'SELECT 1') is None
+
+
+def test_dialeto_nao_suportado_e_informado(app, monkeypatch):
+    monkeypatch.setattr(database, 'explain_plan', lambda *args: None)
+
+    with assert_indexed('ix_inexistente') as contador:
+        RequerimentoService.get_paginated()
+    assert contador.unsupported == {'sqlite'}
+
+    resultado = app.test_cli_runner().invoke(semapa_cli, ['check-indexes'])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'dialeto não suportado (sqlite)' in resultado.output
+    assert '✅' not in resultado.output
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes da busca por prefixo dos campos de seleção remota
+"""
+
+from core.database import db
+from models import Arvore, Especie, Requerente
+from services.lookup_service import LookupService
+
+
+def test_busca_ignora_acentos_e_maiusculas(app):
+    db.session.add_all([
+        Especie(nome_popular='Ipê-Amarelo', nome_cientifico='Handroanthus albus', porte='médio'),
+        Especie(nome_popular='Jacarandá', nome_cientifico='Jacaranda mimosifolia', porte='grande'),
+        Requerente(nome='José Conceição'),
+        Arvore(endereco='Avenida São João, 100'),
+    ])
+    db.session.commit()
+
+    assert [e['texto'] for e in LookupService.search('especies', 'ipe')] == ['Ipê-Amarelo (Handroanthus albus)']
+    assert len(LookupService.search('especies', 'JACARANDÁ')) == 1
+    assert [r['texto'] for r in LookupService.search('requerentes', 'jose con')] == ['José Conceição']
+    assert len(LookupService.search('arvores', 'avenida sao')) == 1
+
+
+def test_coluna_de_busca_acompanha_alteracoes(app):
+    requerente = Requerente(nome='Ana')
+    db.session.add(requerente)
+    db.session.commit()
+
+    requerente.nome = 'Ângela'
+    db.session.commit()
+
+    assert requerente.nome_busca == 'angela'
+    assert LookupService.search('requerentes', 'ang')[0]['id'] == requerente.id
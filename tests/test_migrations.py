@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes das migrações versionadas (core/migrations.py)
+"""
+
+import warnings
+
+from sqlalchemy import inspect
+
+from core import migrations
+
+
+def _colunas(engine, tabela):
+    return {coluna['name'] for coluna in inspect(engine).get_columns(tabela)}
+
+
+def _indices(engine, tabela):
+    with warnings.catch_warnings():  # índices de expressão (lower()) não são refletidos
+        warnings.simplefilter('ignore')
+        return {indice['name'] for indice in inspect(engine).get_indexes(tabela)}
+
+
+def test_upgrade_de_banco_original(banco_original):
+    aplicadas = migrations.upgrade(engine=banco_original, log=lambda *_: None)
+
+    assert aplicadas == [versao for versao, _ in migrations.available()]
+    assert {'latitude_num', 'longitude_num'} <= _colunas(banco_original, 'arvores')
+    assert {'sha256', 'tamanho', 'mime_type'} <= _colunas(banco_original, 'vistoria_foto')
+    assert 'ix_arvores_lat_lng' in _indices(banco_original, 'arvores')
+    assert 'ix_vistoria_foto_sha256' in _indices(banco_original, 'vistoria_foto')
+    assert 'ix_especies_nome_popular_busca' in _indices(banco_original, 'especies')
+    assert {'sequences', 'dashboard_stats'} <= set(inspect(banco_original).get_table_names())
+
+
+def test_upgrade_de_banco_original_e_idempotente(banco_original):
+    migrations.upgrade(engine=banco_original, log=lambda *_: None)
+
+    assert migrations.upgrade(engine=banco_original, log=lambda *_: None) == []
+    with banco_original.connect() as connection:
+        assert migrations.current_version(connection) == migrations.head()
+
+
+def test_upgrade_de_banco_vazio(banco_vazio):
+    migrations.upgrade(engine=banco_vazio, log=lambda *_: None)
+
+    assert {'latitude_num', 'longitude_num'} <= _colunas(banco_vazio, 'arvores')
+    with banco_vazio.connect() as connection:
+        assert migrations.current_version(connection) == migrations.head()
+
+
+def test_add_columns_ignora_as_existentes(banco_original):
+    with banco_original.begin() as connection:
+        assert migrations.add_columns(connection, 'arvores', {'latitude_num': 'FLOAT'}) == ['latitude_num']
+        assert migrations.add_columns(connection, 'arvores', {'latitude_num': 'FLOAT'}) == []
+
+
+def test_upgrade_preenche_coordenadas_numericas(banco_original):
+    with banco_original.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO arvores (id, endereco, latitude, longitude) VALUES "
+            "(1, 'Rua A', '-23.5', '-46.6'), (2, 'Rua B', 'inválida', ''), (3, 'Rua C', NULL, NULL)"
+        )
+
+    migrations.upgrade(engine=banco_original, log=lambda *_: None)
+
+    with banco_original.connect() as connection:
+        coordenadas = dict(connection.exec_driver_sql(
+            "SELECT id, latitude_num || ',' || longitude_num FROM arvores"
+        ).all())
+        no_rtree = connection.exec_driver_sql("SELECT id FROM arvores_rtree").scalars().all()
+    assert coordenadas == {1: '-23.5,-46.6', 2: None, 3: None}
+    assert no_rtree == [1]
+
+
+def test_upgrade_preenche_tamanho_e_tipo_das_fotos_legadas(banco_original):
+    png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+    with banco_original.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO vistoria_foto (id, vistoria_id, arquivo_nome, arquivo) VALUES (1, 1, 'foto', ?)",
+            (png,)
+        )
+
+    migrations.upgrade(engine=banco_original, log=lambda *_: None)
+
+    with banco_original.connect() as connection:
+        linha = connection.exec_driver_sql(
+            "SELECT sha256, tamanho, mime_type FROM vistoria_foto WHERE id = 1"
+        ).one()
+    assert tuple(linha) == (None, len(png), 'image/png')
+
+
+def test_upgrade_preenche_colunas_de_busca_sem_acentos(banco_original):
+    with banco_original.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO especies (id, nome_popular, nome_cientifico, porte) VALUES "
+            "(1, 'Ipê-Amarelo', 'Handroanthus albus', 'médio')"
+        )
+
+    migrations.upgrade(engine=banco_original, log=lambda *_: None)
+
+    with banco_original.connect() as connection:
+        linha = connection.exec_driver_sql(
+            "SELECT nome_popular_busca, nome_cientifico_busca FROM especies WHERE id = 1"
+        ).one()
+    assert tuple(linha) == ('ipe-amarelo', 'handroanthus albus')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes da numeração sequencial com números já usados
+"""
+
+from datetime import datetime
+
+import pytest
+
+from core.database import db, unit_of_work
+from models.arvore_model import Arvore
+from models.requerente_model import Requerente
+from models.requerimento_model import Requerimento
+from models.sequence_model import Sequencia
+from services.requerimento_service import RequerimentoService
+
+
+@pytest.fixture
+def dados(admin):
+    """Requerente, árvore e o contador do ano atrás de um número já usado"""
+    ano = datetime.now().year
+    requerente = Requerente(nome='Fulano')
+    arvore = Arvore(endereco='Rua A')
+    db.session.add_all([requerente, arvore, Sequencia(prefixo='REQ', ano=ano, valor=0)])
+    db.session.flush()
+    # Digitado à mão: o próximo número do contador já existe
+    db.session.add(Requerimento(numero=f'REQ/{ano}/0001', tipo='poda', requerente_id=requerente.id,
+                                arvore_id=arvore.id, criado_por=admin.id))
+    db.session.commit()
+    return {'requerente_id': requerente.id, 'arvore_id': arvore.id, 'created_by': admin.id,
+            'tipo': 'poda', 'justificativa': 'Galhos sobre a rede'}
+
+
+def test_create_pula_numero_ja_usado(dados):
+    requerimento = RequerimentoService.create(dados)
+
+    assert requerimento.numero.endswith('/0002')
+
+
+def test_create_na_unidade_de_trabalho_pula_numero_e_preserva_o_resto(dados):
+    with unit_of_work():
+        anterior = Requerente(nome='Gravado antes na mesma unidade')
+        db.session.add(anterior)
+        db.session.commit()  # vira flush dentro da unidade
+        requerimento = RequerimentoService.create(dados)
+
+    assert requerimento.numero.endswith('/0002')
+    assert db.session.get(Requerente, anterior.id) is not None
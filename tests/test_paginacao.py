@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes da paginação por cursor nas listagens
+"""
+
+
+def test_cursor_invalido_volta_a_primeira_pagina(cliente):
+    response = cliente.get('/requerimentos/?cursor=lixo&status=aberto')
+
+    assert response.status_code == 302
+    assert 'cursor' not in response.headers['Location']
+    assert 'status=aberto' in response.headers['Location']
+
+    response = cliente.get(response.headers['Location'])
+    assert response.status_code == 200
+    assert 'Cursor de paginação inválido' in response.get_data(as_text=True)
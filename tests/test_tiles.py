@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes do cache de tiles do mapa
+"""
+
+import pytest
+from sqlalchemy import func, select
+
+from core.cache import get_cache
+from core.database import db, unit_of_work
+from models import Arvore
+from services.arvore_service import ArvoreService
+from utils.helpers import tile_do_ponto
+
+LAT, LNG, Z = -23.55, -46.63, 12
+
+
+def _total(tile):
+    return sum(f['properties']['total'] for f in tile['features'])
+
+
+def test_tile_acompanha_a_versao_compartilhada_de_arvores(app):
+    x, y = tile_do_ponto(LAT, LNG, Z)
+    db.session.add(Arvore(endereco='Rua A', latitude=str(LAT), longitude=str(LNG)))
+    db.session.commit()
+    assert _total(ArvoreService.get_tile(Z, x, y)) == 1
+
+    # Outro worker grava: só a versão de arvores no cache compartilhado muda aqui
+    db.session.execute(Arvore.__table__.insert().values(
+        endereco='Rua B', latitude=str(LAT), longitude=str(LNG), latitude_num=LAT, longitude_num=LNG
+    ))
+    db.session.commit()
+    assert _total(ArvoreService.get_tile(Z, x, y)) == 1  # ainda a versão em cache
+
+    get_cache().invalidate(Arvore.__tablename__)
+    assert _total(ArvoreService.get_tile(Z, x, y)) == 2
+
+
+def test_importacao_confirma_cada_lote_e_invalida_apos_o_commit(app):
+    x, y = tile_do_ponto(LAT, LNG, Z)
+    assert _total(ArvoreService.get_tile(Z, x, y)) == 0
+
+    def registros():
+        for linha in (1, 2):
+            yield linha, {'endereco': f'Rua {linha}', 'latitude': LAT, 'longitude': LNG}
+        raise ValueError('arquivo truncado')
+
+    # Como numa requisição: a unidade de trabalho aberta não engole os lotes
+    with pytest.raises(ValueError):
+        with unit_of_work():
+            ArvoreService.import_records(registros(), batch_size=1)
+
+    with db.engine.connect() as conexao:
+        assert conexao.execute(select(func.count()).select_from(Arvore.__table__)).scalar() == 2
+    assert _total(ArvoreService.get_tile(Z, x, y)) == 2
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Testes do envio de fotos de vistoria para o blob store
+"""
+
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from core.database import db
+from core.storage import BlobStore, get_blob_store
+from models.vistoria_foto_model import VistoriaFoto
+from models.vistoria_model import Vistoria
+from services.vistoria_service import VistoriaService
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+@pytest.fixture
+def vistoria(app, admin):
+    vistoria = Vistoria(requerimento_id=1, user_id=admin.id)
+    db.session.add(vistoria)
+    db.session.commit()
+    return vistoria
+
+
+def _arquivo(nome, conteudo):
+    return FileStorage(stream=io.BytesIO(conteudo), filename=nome)
+
+
+def test_add_fotos_grava_no_blob_store(vistoria):
+    fotos = VistoriaService.add_fotos(vistoria.id, [_arquivo('a.png', PNG), _arquivo('b.txt', b'texto')])
+
+    assert len(fotos) == 1
+    foto = db.session.get(VistoriaFoto, fotos[0].id)
+    assert foto.no_blob_store and foto.tamanho == len(PNG) and foto.mime_type == 'image/png'
+    assert get_blob_store().exists(foto.sha256)
+    with foto.open() as conteudo:
+        assert conteudo.read() == PNG
+
+
+def test_rota_de_fotos_usa_o_blob_store(cliente, vistoria):
+    response = cliente.post(f'/vistorias/{vistoria.id}/fotos',
+                            data={'fotos': (io.BytesIO(PNG), 'arvore.png')},
+                            content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    foto = VistoriaFoto.query.filter_by(vistoria_id=vistoria.id).one()
+    assert foto.sha256 and get_blob_store().exists(foto.sha256)
+
+
+def test_fotos_identicas_compartilham_o_blob(vistoria):
+    primeira, segunda = VistoriaService.add_fotos(
+        vistoria.id, [_arquivo('a.png', PNG), _arquivo('copia.png', PNG)]
+    )
+
+    assert primeira.sha256 == segunda.sha256
+    # Remover um blob apagaria a outra foto: a interface não oferece delete
+    assert not hasattr(get_blob_store(), 'delete')
+
+
+def test_blob_store_exige_a_interface_completa():
+    class SemExists(BlobStore):
+        def put(self, stream):
+            return None
+
+        def open(self, sha256):
+            return None
+
+    with pytest.raises(TypeError):
+        SemExists()
+
+
+@pytest.fixture
+def foto_legada(vistoria):
+    """Foto do esquema antigo: bytes na coluna arquivo, sem tamanho"""
+    conteudo = bytes(range(256)) * 4
+    resultado = db.session.execute(VistoriaFoto.__table__.insert().values(
+        vistoria_id=vistoria.id, arquivo=conteudo, arquivo_nome='../fotos/árvore\r\n"x".jpg'
+    ))
+    db.session.commit()
+    return resultado.inserted_primary_key[0], conteudo
+
+
+def test_foto_legada_le_so_a_fatia_pedida(foto_legada):
+    foto_id, conteudo = foto_legada
+    foto = db.session.get(VistoriaFoto, foto_id)
+
+    assert foto.tamanho_arquivo == len(conteudo)
+    assert 'arquivo' not in foto.__dict__  # length() no banco, coluna não carregada
+    with foto.open() as arquivo:
+        arquivo.seek(1000)
+        assert arquivo.read(100) == conteudo[1000:]
+        assert arquivo.read() == b''
+
+
+def test_rota_de_foto_legada_com_range(cliente, foto_legada):
+    foto_id, conteudo = foto_legada
+    response = cliente.get(f'/vistorias/fotos/{foto_id}', headers={'Range': 'bytes=10-19'})
+
+    assert response.status_code == 206
+    assert response.data == conteudo[10:20]
+    disposicao = response.headers['Content-Disposition']
+    assert '\r' not in disposicao and '\n' not in disposicao and '/' not in disposicao
+    assert "filename*=UTF-8''%C3%A1rvore" in disposicao
@@ -1,12 +1,18 @@
 import os
+import math
 from werkzeug.utils import secure_filename
+from utils.images import agendar_variantes_arquivo
+
+RAIO_TERRA_METROS = 6371008.8
 
 def handle_upload(files, entity_id, folder):
     upload_path = f'static/uploads/{folder}/{entity_id}/'
     os.makedirs(upload_path, exist_ok=True)
     for file in files:
         filename = secure_filename(file.filename)
-        file.save(os.path.join(upload_path, filename))
+        destino = os.path.join(upload_path, filename)
+        file.save(destino)
+        agendar_variantes_arquivo(destino)
 
 def paginate(query, page, per_page=10):
     return query.paginate(page=page, per_page=per_page, error_out=False)
@@ -19,7 +25,10 @@ def save_uploaded_file(file, folder):
         filename = secure_filename(file.filename)
         upload_path = os.path.join('static/uploads', folder)
         os.makedirs(upload_path, exist_ok=True)
-        file.save(os.path.join(upload_path, filename))
+        destino = os.path.join(upload_path, filename)
+        file.save(destino)
+        # Miniaturas/variantes são geradas em segundo plano
+        agendar_variantes_arquivo(destino)
         return filename
     return None
 
@@ -31,4 +40,36 @@ def format_document(document):
         return f"{document[:3]}.{document[3:6]}.{document[6:9]}-{document[9:]}"
     elif len(document) == 14:  # CNPJ
         return f"{document[:2]}.{document[2:5]}.{document[5:8]}/{document[8:12]}-{document[12:]}"
-    return document
\ No newline at end of file
+    return document
+
+def distancia_metros(lat1, lng1, lat2, lng2):
+    """Distância em metros entre dois pontos (fórmula de haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_METROS * math.asin(math.sqrt(a))
+
+def bbox_por_raio(lat, lng, metros):
+    """Retorna (min_lat, min_lng, max_lat, max_lng) que envolve o círculo dado"""
+    dlat = math.degrees(metros / RAIO_TERRA_METROS)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-12)
+    dlng = min(math.degrees(metros / (RAIO_TERRA_METROS * cos_lat)), 180.0)
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+def tile_bounds(z, x, y):
+    """Retorna (min_lat, min_lng, max_lat, max_lng) do tile XYZ (Web Mercator)"""
+    n = 2 ** z
+
+    def _lat(yy):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * yy / n))))
+
+    return _lat(y + 1), x / n * 360.0 - 180.0, _lat(y), (x + 1) / n * 360.0 - 180.0
+
+def tile_do_ponto(lat, lng, z):
+    """Retorna (x, y) do tile XYZ que contém o ponto no zoom dado"""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
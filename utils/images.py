@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+SEMAPA3 - Pipeline de imagens
+Gera miniaturas e variantes redimensionadas (WebP e JPEG) em segundo plano
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Nome da variante -> caixa máxima (largura, altura) em pixels
+VARIANTES = {
+    'thumb': (320, 320),
+    'medium': (1280, 1280),
+}
+FORMATOS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+EXTENSOES_IMAGEM = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers=2):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='semapa-img')
+        return _executor
+
+
+def _reset_executor():
+    """Após fork, o processo filho não herda as threads: recria sob demanda"""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _workers():
+    try:
+        from flask import current_app
+        return current_app.config.get('IMAGE_WORKERS', 2)
+    except RuntimeError:
+        return 2
+
+
+def _salvar(imagem, destino, formato):
+    """Grava a imagem de forma atômica (temporário + rename)"""
+    pil_formato, _, opcoes = FORMATOS[formato]
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(f'.{destino.name}.{threading.get_ident()}.tmp')
+    if pil_formato == 'JPEG' and imagem.mode != 'RGB':
+        imagem = imagem.convert('RGB')
+    imagem.save(tmp, pil_formato, **opcoes)
+    os.replace(tmp, destino)
+
+
+def gerar_variantes(origem, destino_base):
+    """Gera <destino_base>.<variante>.<formato> para todas as variantes e formatos.
+
+    `origem` é um caminho ou file-like binário. Retorna False se não for imagem.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(origem) as original:
+            imagem = ImageOps.exif_transpose(original)
+            if imagem.mode not in ('RGB', 'RGBA'):
+                imagem = imagem.convert('RGBA' if 'transparency' in imagem.info else 'RGB')
+            for variante, caixa in VARIANTES.items():
+                reduzida = imagem.copy()
+                reduzida.thumbnail(caixa, Image.LANCZOS)
+                for formato in FORMATOS:
+                    _salvar(reduzida, f'{destino_base}.{variante}.{formato}', formato)
+    except UnidentifiedImageError:
+        return False
+    return True
+
+
+# === Fotos no blob store (endereçadas por SHA-256) ===
+
+def caminho_variante_blob(raiz, sha256, variante, formato):
+    return Path(raiz) / sha256[:2] / f'{sha256}.{variante}.{formato}'
+
+
+def gerar_variantes_blob(store, raiz, sha256):
+    with store.open(sha256) as origem:
+        return gerar_variantes(origem, Path(raiz) / sha256[:2] / sha256)
+
+
+def agendar_variantes_blob(store, raiz, sha256):
+    """Agenda a geração das variantes de um blob no pool de workers"""
+    return _get_executor(_workers()).submit(_executar, gerar_variantes_blob, store, raiz, sha256)
+
+
+# === Arquivos gravados em static/uploads ===
+
+def caminho_variante_arquivo(caminho, variante, formato):
+    caminho = Path(caminho)
+    return caminho.parent / 'variantes' / f'{caminho.name}.{variante}.{formato}'
+
+
+def agendar_variantes_arquivo(caminho):
+    """Agenda a geração das variantes de um arquivo enviado, se for imagem"""
+    caminho = Path(caminho)
+    if caminho.suffix.lower().lstrip('.') not in EXTENSOES_IMAGEM:
+        return None
+    destino_base = caminho.parent / 'variantes' / caminho.name
+    return _get_executor(_workers()).submit(_executar, gerar_variantes, str(caminho), destino_base)
+
+
+def _executar(funcao, *args):
+    try:
+        return funcao(*args)
+    except Exception:
+        logger.exception("Falha ao gerar variantes de imagem (%s)", args[-1])
+        return False
+
+
+def imagem_variante(caminho_static, variante='thumb', formato='webp'):
+    """Uso em templates: URL da variante de um arquivo em static/, ou do original
+    enquanto a variante ainda não foi gerada.
+
+    A URL leva ?v=<mtime do arquivo>: um novo upload com o mesmo nome muda a
+    URL, e a resposta pode ser cacheada como imutável (ver cache_versionado).
+    """
+    from flask import current_app, url_for
+
+    for caminho in (caminho_variante_arquivo(caminho_static, variante, formato).as_posix(),
+                    caminho_static):
+        try:
+            versao = os.stat(os.path.join(current_app.static_folder, caminho)).st_mtime_ns
+        except OSError:
+            continue
+        return url_for('static', filename=caminho, v=f'{versao:x}')
+    return url_for('static', filename=caminho_static)
+
+
+def cache_versionado(response):
+    """after_request: arquivos de static/ pedidos com ?v= (URLs de
+    imagem_variante) não mudam nunca; o navegador nem revalida"""
+    from flask import current_app, request
+
+    if (request.endpoint == 'static' and 'v' in request.args
+            and response.status_code in (200, 206, 304)):
+        response.cache_control.max_age = current_app.config.get('IMAGE_CACHE_MAX_AGE', 31536000)
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
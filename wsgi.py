@@ -4,13 +4,14 @@ Ponto de entrada WSGI para a aplicação.
 Usado pelo comando 'flask' e por servidores de produção como Gunicorn.
 """
 import os
-from dotenv import load_dotenv
 
 # Carrega as variáveis de ambiente do arquivo .env
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-if os.path.exists(dotenv_path):
+if os.path.exists(dotenv_path):  # python-dotenv só é importado quando há .env
+    from dotenv import load_dotenv
     load_dotenv(dotenv_path)
 
 from app import create_app
+from config.settings import config
 
-app = create_app(os.getenv('FLASK_CONFIG') or 'default')
\ No newline at end of file
+app = create_app(config[os.getenv('FLASK_CONFIG') or 'default'])
\ No newline at end of file